@@ -1,68 +1,20 @@
 from flask import request
 from flask_restful import Resource, abort
 
+import json
 import uuid
 
-from src.util import logwrapper
-
-from src.util.dispatcher import send_ai_training_request, send_update_to_document_service, send_ai_prediction_request
-from src.util.serializer import serialize_project, serialize_document
-
-
-# calculate ai stats
-# could be moved to a utils file
-def get_ai_stats(ent_preds, ent_golden, rel_preds, rel_golden):
-    # no ai prediction, no ai stats
-    if len(ent_golden) == 0 and len(rel_golden) == 0:
-        return {
-            'ner_f1': -1,
-            'rel_f1': -1
-        }
+from functools import partial
 
-    # ent f1
-    ent_tp = 0
-
-    for _, pred in ent_preds.items():
-        for _, golden in ent_golden.items():
-            if (pred['sentenceIndex'] == golden['sentenceIndex'] and pred['type'] == golden['type'] and
-                    pred['start'] == golden['start'] and pred['end'] == golden['end']):
-                ent_tp +=1
-
-    ent_fp = len(ent_preds) - ent_tp
-    ent_fn = len(ent_golden) - ent_tp
-
-    if ent_fp == 0 and ent_tp == 0 and ent_fn == 0:
-        ent_f1_micro = 0
-    else:
-        ent_f1_micro = (2 * ent_tp) / (2 * ent_tp + ent_fp + ent_fn + 1e-6)
-
-    # rel f1 with ner
-    rel_tp = 0
-    for _, pred in rel_preds.items():
-        for _, golden in rel_golden.items():
-            if (pred['type'] == golden['type'] and
-                    ent_preds[pred['head']]['sentenceIndex'] == ent_golden[golden['head']]['sentenceIndex'] and
-                    ent_preds[pred['head']]['start'] == ent_golden[golden['head']]['start'] and
-                    ent_preds[pred['head']]['end'] == ent_golden[golden['head']]['end'] and
-                    ent_preds[pred['head']]['type'] == ent_golden[golden['head']]['type'] and
-                    ent_preds[pred['tail']]['sentenceIndex'] == ent_golden[golden['tail']]['sentenceIndex'] and
-                    ent_preds[pred['tail']]['start'] == ent_golden[golden['tail']]['start'] and
-                    ent_preds[pred['tail']]['end'] == ent_golden[golden['tail']]['end'] and
-                    ent_preds[pred['tail']]['type'] == ent_golden[golden['tail']]['type']):
-                rel_tp += 1
-
-    rel_fp = len(rel_preds) - rel_tp
-    rel_fn = len(rel_golden) - rel_tp
-
-    if rel_fp == 0 and rel_tp == 0 and rel_fn == 0:
-        rel_f1_micro = 0
-    else:
-        rel_f1_micro = (2 * rel_tp) / (2 * rel_tp + rel_fp + rel_fn + 1e-6)
+from src.application.DocumentApplication import DocumentVersionConflict
+from src.util import logwrapper
+from src.util.ai_stats import get_ai_stats
 
-    return {
-        'ner_f1': ent_f1_micro * 100,
-        'rel_f1': rel_f1_micro * 100
-    }
+from src.util.doc_register import get_or_create_entry
+from src.util.dispatcher import send_update_to_document_service
+from src.util.pagination import get_page, get_cursor_page, get_projection, get_fields, select_fields
+from src.util.serializer import serialize_project_row, serialize_document
+from src.util.train_data import build_train_request
 
 
 # Get a list of projects or create a new project.
@@ -74,7 +26,10 @@ class ProjectList(Resource):
 
     # Get a list of all existing projects.
     def get(self):
-        return [serialize_project(pro) for pro in self._event_service.get_all_projects()]
+        rows = self._event_service.get_project_rows()
+        doc_ids = self._event_service.get_project_document_ids([row['id'] for row in rows])
+
+        return [serialize_project_row(row, doc_ids[row['id']]) for row in rows]
     
     # Create a new project.
     def post(self):
@@ -108,7 +63,13 @@ class Project(Resource):
 
     # Get project.
     def get(self, project_id):
-        return (serialize_project(self._event_service.get_project(project_id)))
+        row = self._event_service.get_project_row(project_id)
+
+        if row is None:
+            abort(404, message=f'No project with id {project_id}')
+
+        doc_ids = self._event_service.get_project_document_ids([row['id']])
+        return serialize_project_row(row, doc_ids[row['id']])
 
 
 # Get a list of documents in a project.
@@ -118,31 +79,46 @@ class DocumentList(Resource):
     def __init__(self, event_service):
         self._event_service = event_service
 
-    # Get a list of all documents in the project.
+    # Get a page of the documents in the project (?cursor=0&limit=100).
+    # Filters: labelled=true|false, labelledBy=<user id>, maxNerF1=<f1>, maxRelF1=<f1>.
+    # Fields: fields=labelled,labelledBy,aiStats (id is always returned).
+    # The cursor of the next page is returned in the X-Next-Cursor header, if there is one.
     def get(self, project_id):
-        out = []
-        project = self._event_service.get_project(project_id)
+        if self._event_service.get_project_row(project_id) is None:
+            abort(404, message=f'No project with id {project_id}')
+
+        cursor, limit = get_cursor_page(request.args)
 
-        for _id in project.documents:
-            out.append({
-                'id': str(_id),
-                'labelled': project.labelled[_id],
-                'labelledBy': project.labelled_by[_id],
-                'aiStats': project.ai_stats[_id]
-            })
+        filters = {}
+        if 'labelled' in request.args:
+            filters['labelled'] = request.args['labelled'].lower() == 'true'
+        if 'labelledBy' in request.args:
+            filters['labelled_by'] = request.args['labelledBy']
+        try:
+            if 'maxNerF1' in request.args:
+                filters['max_ner_f1'] = float(request.args['maxNerF1'])
+            if 'maxRelF1' in request.args:
+                filters['max_rel_f1'] = float(request.args['maxRelF1'])
+        except ValueError:
+            abort(400, message='maxNerF1 and maxRelF1 have to be numbers.')
 
-        return out
+        rows, next_cursor = self._event_service.get_document_rows(project_id, cursor, limit, **filters)
+
+        fields = get_fields(request.args)
+        headers = {'X-Next-Cursor': str(next_cursor)} if next_cursor is not None else {}
+
+        return [select_fields(row, fields) for row in rows], 200, headers
 
     # Add a document to the project
     def post(self, project_id):
         data = request.json
 
-        if uuid.UUID(data['docId']) not in self._event_service.get_project(project_id).documents:
-            self._event_service.add_document(project_id, data['docId'])
-
+        # loads the project once, the membership check is part of the update
+        added, _ = self._event_service.add_documents(project_id, [data['docId']])
+        if added > 0:
             return data['docId']
 
-        return 400
+        abort(400, message=f'Document {data["docId"]} already in project {project_id}')
 
         # Remove a document from the project
     def delete(self, project_id):
@@ -153,15 +129,88 @@ class DocumentList(Resource):
         return 200
 
 
+# Add many documents to a project at once.
+class DocumentBatch(Resource):
+
+    # Init the resource
+    def __init__(self, event_service, chunk_size=1000):
+        self._event_service = event_service
+        self._chunk_size = chunk_size
+
+    # Add the documents of a JSON list (or {"docIds": [...]}) or of an NDJSON stream
+    # (Content-Type: application/x-ndjson, one id or {"docId": ...} per line).
+    # Every chunk of ids is recorded as one DocumentsAdded event.
+    # Returns the number of added ids and of duplicates (already in the project or repeated).
+    def post(self, project_id):
+        row = self._event_service.get_project_row(project_id)
+        if row is None or row['deleted']:
+            abort(404, message=f'No project with id {project_id}')
+
+        added, duplicates = 0, 0
+
+        def add(chunk):
+            nonlocal added, duplicates
+            try:
+                doc_ids = [str(uuid.UUID(doc_id)) for doc_id in chunk]
+            except (ValueError, TypeError, AttributeError):
+                abort(400, message=f'Invalid document id after {added + duplicates} ids '
+                                   f'({added} added, {duplicates} duplicates).')
+
+            chunk_added, chunk_duplicates = self._event_service.add_documents(project_id, doc_ids, self._chunk_size)
+            added += chunk_added
+            duplicates += chunk_duplicates
+
+        if request.mimetype == 'application/x-ndjson':
+            chunk = []
+            for line in request.stream:
+                if not line.strip():
+                    continue
+
+                try:
+                    ele = json.loads(line)
+                except ValueError:
+                    abort(400, message=f'Invalid JSON line after {added + duplicates + len(chunk)} ids.')
+
+                if isinstance(ele, dict):
+                    if 'docId' not in ele:
+                        abort(400, message=f'Missing docId after {added + duplicates + len(chunk)} ids.')
+                    ele = ele['docId']
+
+                chunk.append(ele)
+                if len(chunk) == self._chunk_size:
+                    add(chunk)
+                    chunk = []
+
+            if len(chunk) > 0:
+                add(chunk)
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                data = data.get('docIds')
+            if not isinstance(data, list):
+                abort(400, message='Expected a JSON list of document ids or {"docIds": [...]}.')
+
+            add(data)
+
+        logwrapper.info(f'Added {added} documents to project {project_id}, {duplicates} duplicates.')
+
+        return {
+            'added': added,
+            'duplicates': duplicates
+        }
+
+
 # Handle one document
 class Document(Resource):
 
     # Init the resource
-    def __init__(self, event_service, anno_db):
+    def __init__(self, event_service, anno_db, type_cache, dispatcher, training_scheduler, prediction_tracker):
         self._event_service = event_service
         self._doc_register = anno_db['doc_register']
-        self._label_set_col = anno_db['label_sets']
-        self._relation_set_col = anno_db['relation_sets']
+        self._type_cache = type_cache
+        self._dispatcher = dispatcher
+        self._training_scheduler = training_scheduler
+        self._prediction_tracker = prediction_tracker
 
     # Get document labels and relations.
     def get(self, project_id, doc_id, user_id):
@@ -170,28 +219,11 @@ class Document(Resource):
         if uuid.UUID(doc_id) not in project.documents:
             abort(400, message=f'Document {doc_id} not in project {project_id}')
 
-        db_result = self._doc_register.find_one({
-            'project_id': project_id,
-            'doc_id': doc_id,
-            'user_id': user_id
-        })
-
-        if(not db_result):
-            new_id = self._event_service.create_document()
-            self._doc_register.insert_one({
-                'project_id': project_id,
-                'doc_id': doc_id,
-                'user_id': user_id,
-                '_id': str(new_id),
-                'id': str(new_id)
-            })
-        else:
-            new_id = db_result['_id']
+        db_result = get_or_create_entry(self._doc_register, self._event_service, project_id, doc_id, user_id)
+        new_id = db_result['_id']
 
         doc = self._event_service.get_document(str(new_id))
 
-        db_result = self._doc_register.find_one({'_id': str(new_id)})
-
         # serialize document
         serialized_doc = serialize_document(doc, db_result, project)
 
@@ -207,33 +239,19 @@ class Document(Resource):
         if uuid.UUID(doc_id) not in project.documents:
             abort(400, message=f'No document with id {doc_id} in project {project_id}')
 
-        db_result = self._doc_register.find_one({
-            'project_id': project_id,
-            'doc_id': doc_id,
-            'user_id': user_id
-        })
-
-        if (not db_result):
-            new_id = self._event_service.create_document()
-            self._doc_register.insert_one({
-                'project_id': project_id,
-                'doc_id': doc_id,
-                'user_id': user_id,
-                '_id': str(new_id),
-                'id': str(new_id)
-            })
-        else:
-            new_id = db_result['_id']
+        db_result = get_or_create_entry(self._doc_register, self._event_service, project_id, doc_id, user_id)
+        new_id = db_result['_id']
 
         doc = self._event_service.get_document(str(new_id))
 
         # if no recommendation get some
-        if (not user_id in project.labelled_by[uuid.UUID(doc_id)] and len(doc.orig_entity_preds) == 0 and
+        record = project.documents[uuid.UUID(doc_id)]
+        if (not user_id in record.labelled_by and len(doc.orig_entity_preds) == 0 and
             len(doc.orig_relation_preds) == 0):
 
             # labelled => take user labels and recommend those
-            if project.labelled[uuid.UUID(doc_id)]:
-                lab_uid = project.labelled_by[uuid.UUID(doc_id)][0]
+            if record.labelled:
+                lab_uid = record.labelled_by[0]
                 lab_doc_id = db_result = self._doc_register.find_one({'project_id': project_id, 'doc_id': doc_id,
                                                                       'user_id': lab_uid})['_id']
                 lab_doc = self._event_service.get_document(str(lab_doc_id))
@@ -244,27 +262,22 @@ class Document(Resource):
 
             # else ask ai for predictions
             else:
-                # enitity types
-                label_set = self._label_set_col.find_one({'_id': str(project.labelSetId)})
-                labs = []
-                for ele in label_set['labels']:
-                    labs.append(ele['type'])
-
-                # relation types
-                relation_set = self._relation_set_col.find_one({'_id': str(project.relationSetId)})
-                rels = []
-                for ele in relation_set['relationTypes']:
-                    rels.append(ele['type'])
-
-                # send the train request
+                # entity and relation types
+                try:
+                    labs = self._type_cache.get_label_types(str(project.labelSetId))
+                    rels = self._type_cache.get_relation_types(str(project.relationSetId))
+                except KeyError as e:
+                    abort(400, message=str(e))
+
+                # send the prediction request, unless one for the document is in flight already
                 req = {
                     'project_id': str(project_id),
                     'document_id': str(doc_id),
-                    'entity_types': labs,
-                    'relation_types': rels
+                    'entity_types': list(labs),
+                    'relation_types': list(rels)
                 }
 
-                send_ai_prediction_request(req)
+                self._prediction_tracker.request(str(project_id), str(doc_id), req)
 
 
     # Update Labels and Relations
@@ -274,121 +287,155 @@ class Document(Resource):
         if uuid.UUID(doc_id) not in project.documents:
             abort(400, message=f'No document with id {doc_id} in project {project_id}')
 
-        data = request.json
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            abort(400, message='Expected a JSON object.')
 
-        db_result = self._doc_register.find_one({
-            'project_id': project_id,
-            'doc_id': doc_id,
-            'user_id': user_id
-        })
-
-        if not db_result:
-            new_id = self._event_service.create_document()
-            self._doc_register.insert_one({
-                'project_id': project_id,
-                'doc_id': doc_id,
-                'user_id': user_id,
-                '_id': str(new_id),
-                'id': str(new_id)
-            })
-        else:
-            new_id = db_result['_id']
+        # check all fields before anything is saved
+        if 'entities' in data:
+            check_fields(data, [('entities', dict), ('sentenceEntities', list), ('relations', dict)])
+        if 'recEntities' in data:
+            check_fields(data, [('recEntities', dict), ('recSentenceEntities', list), ('recRelations', dict)])
 
-        #todo do a proper check
-        try:
-            self._event_service.update_document(new_id, data['entities'], data['sentenceEntities'], data['relations'])
-        except:
-            pass
+        db_result = get_or_create_entry(self._doc_register, self._event_service, project_id, doc_id, user_id)
+        new_id = db_result['_id']
 
-        try:
+        if 'entities' in data:
+            self._event_service.update_document(new_id, data['entities'], data['sentenceEntities'],
+                                                data['relations'])
+        if 'recEntities' in data:
             self._event_service.update_document_rec(new_id, data['recEntities'], data['recSentenceEntities'],
                                                     data['recRelations'])
-        except:
-            pass
 
-        # Mark document as labelled by user if labelled and send update to document service.
-        # Send a train request to the ai service as well
         if 'labelled' in data and data['labelled']:
-            doc = self._event_service.get_document(new_id)
-
-            # calculate ai stats if first labelling and send train request
-            if not project.labelled[uuid.UUID(doc_id)]:
-                ai_stats = get_ai_stats(doc.orig_entity_preds, data['entities'], doc.orig_relation_preds,
-                                        data['relations'])
-
-                # send train request
-                train_data = []
-                test_data = []
-
-                # fill data lists
-                for pr_doc_id in project.documents:
-
-                    # not labelled => test => gets predicted
-                    if not project.labelled[pr_doc_id]:
-                        test_data.append(str(pr_doc_id))
-                    # else => train data
-                    else:
-                        lab_doc_result = self._doc_register.find_one({
-                            'project_id': project_id,
-                            'doc_id': str(pr_doc_id),
-                            'user_id': project.labelled_by[pr_doc_id][0]
-                        })
-                        lab_doc = self._event_service.get_document(lab_doc_result['_id'])
-                        train_data.append({
-                            'doc_id': str(pr_doc_id),
-                            'entities': lab_doc.entities,
-                            'sentence_entities': lab_doc.sentence_entities,
-                            'relations': lab_doc.relations
-                        })
-
-                # enitity types
-                label_set = self._label_set_col.find_one({'_id': str(project.labelSetId)})
-                labs = []
-                for ele in label_set['labels']:
-                    labs.append(ele['type'])
-
-                # relation types
-                relation_set = self._relation_set_col.find_one({'_id': str(project.relationSetId)})
-                rels = []
-                for ele in relation_set['relationTypes']:
-                    rels.append(ele['type'])
-
-                # send the train request
-                req = {
-                    'project_id': str(project_id),
-                    'train_data': train_data,
-                    'entity_types': labs,
-                    'relation_types': rels
+            mark_labelled(self._event_service, self._doc_register, self._type_cache, self._dispatcher,
+                          self._training_scheduler, project, doc_id, user_id, new_id)
 
-                }
-                send_ai_training_request(req)
-            else:
-                ai_stats = project.ai_stats[uuid.UUID(doc_id)]
+        return 200
 
-            # update document
-            self._event_service.mark_document(project_id, doc_id, user_id, ai_stats)
 
-            # send update to doc service
-            send_update_to_document_service(doc_id, user_id, doc.entities, doc.sentence_entities, doc.relations)
+# Apply JSON-patch style operations to the labels and relations of one document.
+class DocumentOperations(Resource):
+
+    # Init the resource
+    def __init__(self, event_service, anno_db, type_cache, dispatcher, training_scheduler):
+        self._event_service = event_service
+        self._doc_register = anno_db['doc_register']
+        self._type_cache = type_cache
+        self._dispatcher = dispatcher
+        self._training_scheduler = training_scheduler
+
+    # Apply {"version": 3, "operations": [{"op": "replace", "path": "/entities/e1", "value": {...}}, ...]}.
+    # The version is the one of the document the client has (see Document.get), the operations are
+    # applied only if the document is still at that version, otherwise 409 with the current version.
+    # See DocumentAggregate.apply_operations for the operations. Returns the new version.
+    def patch(self, project_id, doc_id, user_id):
+        project = self._event_service.get_project(project_id)
+
+        if uuid.UUID(doc_id) not in project.documents:
+            abort(400, message=f'No document with id {doc_id} in project {project_id}')
+
+        data = request.json
+        # bool is an int in Python, but true isn't a version
+        if not isinstance(data, dict) or not isinstance(data.get('version'), int) or \
+                isinstance(data['version'], bool) or not isinstance(data.get('operations'), list):
+            abort(400, message='version (int) and operations (list) are required.')
+
+        db_result = get_or_create_entry(self._doc_register, self._event_service, project_id, doc_id, user_id)
+        new_id = str(db_result['_id'])
+
+        try:
+            version = self._event_service.apply_document_operations(new_id, data['operations'], data['version'])
+        except ValueError as e:
+            abort(400, message=str(e))
+        except DocumentVersionConflict as e:
+            abort(409, message=str(e), version=e.version)
+
+        if data.get('labelled'):
+            mark_labelled(self._event_service, self._doc_register, self._type_cache, self._dispatcher,
+                          self._training_scheduler, project, doc_id, user_id, new_id)
+
+        return {
+            'version': version
+        }
+
+
+# Abort with 400 if one of the (name, type) fields is missing in the request data or has another type.
+def check_fields(data: dict, fields: list):
+    for name, field_type in fields:
+        if name not in data:
+            abort(400, message=f'Missing field {name}')
+        if not isinstance(data[name], field_type):
+            abort(400, message=f'Field {name} has to be {"a list" if field_type is list else "an object"}.')
 
-        return 200
+
+# Mark document as labelled by user and send update to document service.
+# Send a train request to the ai service as well, if it is the first labelling.
+def mark_labelled(event_service, doc_register, type_cache, dispatcher, training_scheduler, project, doc_id, user_id,
+                  doc_register_id):
+    project_id = str(project.id)
+    doc = event_service.get_document(str(doc_register_id))
+
+    # calculate ai stats if first labelling and send train request
+    if not project.documents[uuid.UUID(doc_id)].labelled:
+        ai_stats = get_ai_stats(doc.orig_entity_preds, doc.entities, doc.orig_relation_preds, doc.relations)
+
+        # schedule the train request, it is built with the latest project state when sent
+        training_scheduler.schedule(project_id, partial(build_train_request, event_service, doc_register, type_cache,
+                                                        project_id))
+    else:
+        ai_stats = project.documents[uuid.UUID(doc_id)].ai_stats
+
+    # update document
+    event_service.mark_document(project_id, doc_id, user_id, ai_stats)
+
+    # send update to doc service
+    send_update_to_document_service(dispatcher, doc_id, user_id, doc.entities, doc.sentence_entities, doc.relations)
+
+
+# Runtime statistics of the backend.
+class Stats(Resource):
+
+    # Init the resource.
+    def __init__(self, event_service, type_cache, dispatcher, training_scheduler, prediction_tracker):
+        self._event_service = event_service
+        self._type_cache = type_cache
+        self._dispatcher = dispatcher
+        self._training_scheduler = training_scheduler
+        self._prediction_tracker = prediction_tracker
+
+    # Get the counters.
+    def get(self):
+        return {
+            'aggregateCache': self._event_service.get_cache_stats(),
+            'aggregateLocks': {'waits': self._event_service.get_lock_waits()},
+            'projectWrites': self._event_service.get_project_write_stats(),
+            'typeCache': self._type_cache.stats(),
+            'dispatcher': self._dispatcher.stats(),
+            'training': self._training_scheduler.stats(),
+            'prediction': self._prediction_tracker.stats()
+        }
 
 
 # Get a list of label sets or create a new one.
 class EntitySetList(Resource):
 
     # Init the resource.
-    def __init__(self, anno_db):
-        self._label_set_col = anno_db['label_sets'] 
+    def __init__(self, anno_db, type_cache):
+        self._label_set_col = anno_db['label_sets']
+        self._type_cache = type_cache
 
-    # Get a list of all posible label sets.
+    # Get a page of the posible label sets (?offset=0&limit=100&fields=name).
+    # The total number of label sets is returned in the X-Total-Count header.
     def get(self):
-        label_sets = self._label_set_col.find()
+        offset, limit = get_page(request.args)
+
+        label_sets = self._label_set_col.find({}, get_projection(request.args)).sort('_id').skip(offset).limit(limit)
         label_sets = list(label_sets)
 
         logwrapper.debug(f'Label sets: {label_sets}')
 
-        return label_sets
+        return label_sets, 200, {'X-Total-Count': str(self._label_set_col.count_documents({}))}
 
     # Create a new label set
     def post(self):
@@ -399,6 +446,7 @@ class EntitySetList(Resource):
         data['id'] = new_id
 
         self._label_set_col.insert_one(data)
+        self._type_cache.invalidate_label_set(new_id)
 
         logwrapper.info(f'Inserted new label set with id {new_id}.')
 
@@ -426,17 +474,21 @@ class EnititySet(Resource):
 class RelationSetList(Resource):
 
     # Init the resource.
-    def __init__(self, anno_db):
-        self._relation_set_col = anno_db['relation_sets'] 
+    def __init__(self, anno_db, type_cache):
+        self._relation_set_col = anno_db['relation_sets']
+        self._type_cache = type_cache
 
-    # Get a list of all posible relation sets.
+    # Get a page of the posible relation sets (?offset=0&limit=100&fields=name).
+    # The total number of relation sets is returned in the X-Total-Count header.
     def get(self):
-        relation_sets = self._relation_set_col.find()
+        offset, limit = get_page(request.args)
+
+        relation_sets = self._relation_set_col.find({}, get_projection(request.args)).sort('_id').skip(offset).limit(limit)
         relation_sets = list(relation_sets)
 
         logwrapper.debug(f'Relation sets: {relation_sets}')
 
-        return relation_sets
+        return relation_sets, 200, {'X-Total-Count': str(self._relation_set_col.count_documents({}))}
 
     # Create a new relation set
     def post(self):
@@ -447,6 +499,7 @@ class RelationSetList(Resource):
         data['id'] = new_id
 
         self._relation_set_col.insert_one(data)
+        self._type_cache.invalidate_relation_set(new_id)
 
         logwrapper.info(f'Inserted new relation set with id {new_id}.')
 
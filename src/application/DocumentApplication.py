@@ -1,19 +1,30 @@
 from eventsourcing.application import Application
+from eventsourcing.persistence import IntegrityError
 
 from uuid import UUID
 
+from src.domain.AggregateSnapshot import AggregateSnapshot
 from src.domain.DocumentAggregate import DocumentAggregate
 from src.util import logwrapper
 
+# The document was changed since the version the client expected.
+class DocumentVersionConflict(Exception):
+
+    def __init__(self, doc_id, version):
+        super().__init__(f'Document {doc_id} is at version {version}.')
+        self.version = version
+
+
 class DocumentApplication(Application):
+    # Snapshot every n events. Can be overwritten in the config (see EventService).
+    snapshotting_intervals = {DocumentAggregate: 50}
+    snapshot_class = AggregateSnapshot
 
     # Register a document.
     def create_document(self):
         doc = DocumentAggregate()
         self.save(doc)
 
-        print(self.repository)
-
         return doc.id
 
     # Update entities and relations for the document.
@@ -34,6 +45,26 @@ class DocumentApplication(Application):
 
         self.save(doc)
 
+    # Apply JSON-patch style operations (see DocumentAggregate.apply_operations) to the document,
+    # if it is still at the expected version. Returns the new version.
+    # Raises DocumentVersionConflict if the document was changed, also by a concurrent save.
+    def apply_operations(self, doc_id, operations, expected_version):
+        assert isinstance(doc_id, UUID)
+        assert isinstance(expected_version, int)
+
+        doc = self.repository.get(doc_id)
+        if doc.version != expected_version:
+            raise DocumentVersionConflict(doc_id, doc.version)
+
+        doc.apply_operations(operations)
+
+        try:
+            self.save(doc)
+        except IntegrityError:
+            raise DocumentVersionConflict(doc_id, self.repository.get(doc_id).version)
+
+        return doc.version
+
     # Set recommended enitities and relations for the document.
     def set_rec(self, doc_id, rec_entities, rec_sentence_entities, rec_relations):
         assert isinstance(doc_id, UUID)
@@ -43,10 +74,21 @@ class DocumentApplication(Application):
 
         self.save(doc)
 
+    # Clear entities, relations and recommendations of several documents in one transaction.
+    def reset_documents(self, doc_ids):
+        docs = []
+        for doc_id in doc_ids:
+            assert isinstance(doc_id, UUID)
+
+            doc = self.repository.get(doc_id)
+            doc.update({}, [], {})
+            doc.update_rec({}, [], {})
+            docs.append(doc)
+
+        self.save(*docs)
+
     # Get a document
     def get(self, doc_id):
         assert isinstance(doc_id, UUID)
 
-        print(self.repository)
-
         return self.repository.get(doc_id)
\ No newline at end of file
@@ -0,0 +1,64 @@
+from eventsourcing.application import AggregateNotFound
+from eventsourcing.system import ProcessApplication
+from eventsourcing.dispatch import singledispatchmethod
+from eventsourcing.utils import get_topic
+
+from uuid import UUID
+
+from src.domain.DocumentIndexAggregate import DocumentIndexAggregate
+from src.domain.ProjectAggregate import ProjectAggregate
+from src.util.persistence import construct_process_recorder
+
+# Keeps track of the projects each document is part of.
+class DocumentIndexProcessApplication(ProcessApplication):
+    # Only pull the project events handled below, not the document events in the same table.
+    follow_topics = [get_topic(event_cls) for event_cls in [ProjectAggregate.DocumentAdded,
+                                                            ProjectAggregate.DocumentsAdded,
+                                                            ProjectAggregate.DocumentRemoved]]
+
+    # Follows the ProjectApplication like the ProjectIndexProcessApplication,
+    # so it needs its own tracking table.
+    def construct_recorder(self):
+        return construct_process_recorder(self, 'document_index_tracking')
+
+    @singledispatchmethod
+    def policy(self, domain_event, process_event):
+        pass
+
+    @policy.register(ProjectAggregate.DocumentAdded)
+    def _add_project_to_index(self, domain_event, process_event):
+        index = self._get_or_create(domain_event.doc_id)
+
+        index.add_project(domain_event.originator_id)
+        process_event.collect_events(index)
+
+    @policy.register(ProjectAggregate.DocumentsAdded)
+    def _add_project_to_indexes(self, domain_event, process_event):
+        for doc_id in domain_event.doc_ids:
+            index = self._get_or_create(doc_id)
+
+            index.add_project(domain_event.originator_id)
+            process_event.collect_events(index)
+
+    @policy.register(ProjectAggregate.DocumentRemoved)
+    def _remove_project_from_index(self, domain_event, process_event):
+        index = self._get_or_create(domain_event.doc_id)
+
+        index.remove_project(domain_event.originator_id)
+        process_event.collect_events(index)
+
+    def _get_or_create(self, doc_id):
+        try:
+            return self.repository.get(DocumentIndexAggregate.create_id(doc_id))
+        except AggregateNotFound:
+            return DocumentIndexAggregate.get(doc_id)
+
+    # Get the ids of the projects a document was added to.
+    def get_project_ids(self, doc_id):
+        assert isinstance(doc_id, UUID)
+
+        try:
+            index = self.repository.get(DocumentIndexAggregate.create_id(doc_id))
+            return list(index.projects)
+        except AggregateNotFound:
+            return []
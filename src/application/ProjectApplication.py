@@ -1,12 +1,38 @@
 from eventsourcing.application import Application
+from eventsourcing.persistence import IntegrityError
 
+import random
+import time
+
+from threading import Lock
 from uuid import UUID, uuid4
 
-from src.domain.ProjectAggregate import ProjectAggregate
+from src.domain.AggregateSnapshot import AggregateSnapshot
+from src.domain.ProjectAggregate import ProjectAggregate, DocumentRecordAsList
 from src.util import logwrapper
 
 
 class ProjectApplication(Application):
+    # Snapshot every n events. Can be overwritten in the config (see EventService).
+    snapshotting_intervals = {ProjectAggregate: 100}
+    snapshot_class = AggregateSnapshot
+
+    # Retries of a change after a version conflict, and the base of the randomized exponential
+    # backoff between them in seconds. Can be overwritten in the config (see EventService).
+    max_retries = 10
+    retry_backoff = 0.01
+
+    def __init__(self, env=None):
+        super().__init__(env)
+        self._stats_lock = Lock()
+        self.conflicts = 0
+        self.retries = 0
+        self.failures = 0
+
+    # Document records are part of the project snapshots.
+    def register_transcodings(self, transcoder):
+        super().register_transcodings(transcoder)
+        transcoder.register(DocumentRecordAsList())
 
     # Register a project.
     def create_project(self, name, date, creator, labelSetId, relationSetId):
@@ -25,39 +51,42 @@ class ProjectApplication(Application):
         assert isinstance(name, str)
         assert isinstance(creator, str)
 
-        project = self.repository.get(project_id)
-        project.update_metadata(name, creator)
-
-        self.save(project)
+        self._change_project(project_id, lambda project: project.update_metadata(name, creator))
 
     # Delete a project
     def delete_project(self, project_id):
         assert isinstance(project_id, UUID)
 
-        project = self.repository.get(project_id)
-        project.delete()
-
-        self.save(project)
+        self._change_project(project_id, lambda project: project.delete())
 
     # Add a document to the project.
     def add_document(self, project_id, doc_id):
         assert isinstance(project_id, UUID)
         assert isinstance(doc_id, UUID)
 
-        project = self.repository.get(project_id)
-        project.add_document(doc_id)
+        self._change_project(project_id, lambda project: project.add_document(doc_id))
 
-        self.save(project)
+    # Add several documents to the project, with one event per chunk.
+    # Returns the number of added documents and of skipped duplicates.
+    def add_documents(self, project_id, doc_ids, chunk_size=1000):
+        assert isinstance(project_id, UUID)
+
+        def add(project):
+            added = 0
+            for i in range(0, len(doc_ids), chunk_size):
+                added += len(project.add_documents(doc_ids[i:i + chunk_size]))
+            return added
+
+        added = self._change_project(project_id, add)
+
+        return added, len(doc_ids) - added
 
     # Remove a document from the project.
     def remove_document(self, project_id, doc_id):
         assert isinstance(project_id, UUID)
         assert isinstance(doc_id, UUID)
 
-        project = self.repository.get(project_id)
-        project.remove_document(doc_id)
-
-        self.save(project)
+        self._change_project(project_id, lambda project: project.remove_document(doc_id))
 
     # Get the project.
     def get_project(self, project_id):
@@ -72,10 +101,7 @@ class ProjectApplication(Application):
         assert isinstance(user_id, str)
         assert isinstance(ai_stats, dict)
 
-        project = self.repository.get(project_id)
-        project.mark_document(doc_id, user_id, ai_stats)
-
-        self.save(project)
+        self._change_project(project_id, lambda project: project.mark_document(doc_id, user_id, ai_stats))
 
 
     #Document not labelled any more
@@ -83,9 +109,52 @@ class ProjectApplication(Application):
         assert isinstance(project_id, UUID)
         assert isinstance(doc_id, UUID)
 
-        project = self.repository.get(project_id)
-        project.unmark_document(doc_id)
-
-        self.save(project)
+        self._change_project(project_id, lambda project: project.unmark_document(doc_id))
 
+    # Several documents not labelled any more, saved at once.
+    def unmark_documents(self, project_id, doc_ids):
+        assert isinstance(project_id, UUID)
 
+        def unmark(project):
+            for doc_id in dict.fromkeys(doc_ids):
+                assert isinstance(doc_id, UUID)
+
+                # not labelled => nothing to reset
+                if project.is_labelled(doc_id):
+                    project.unmark_document(doc_id)
+
+        self._change_project(project_id, unmark)
+
+    # Load the project, apply the change and save it. Returns the result of the change.
+    # If another writer saved the project in between, the save fails with a version conflict and
+    # the change is applied again to the newly loaded project, at most max_retries times.
+    def _change_project(self, project_id, change):
+        for attempt in range(self.max_retries + 1):
+            project = self.repository.get(project_id)
+            result = change(project)
+
+            try:
+                self.save(project)
+                return result
+            except IntegrityError:
+                with self._stats_lock:
+                    self.conflicts += 1
+                    if attempt == self.max_retries:
+                        self.failures += 1
+                    else:
+                        self.retries += 1
+
+                if attempt == self.max_retries:
+                    logwrapper.warning(f'Giving up changing project {project_id} after {attempt} retries.')
+                    raise
+
+                time.sleep(self.retry_backoff * 2 ** attempt * random.random())
+
+    # Version conflicts of project changes, retries and changes given up after max_retries.
+    def get_write_stats(self):
+        with self._stats_lock:
+            return {
+                'conflicts': self.conflicts,
+                'retries': self.retries,
+                'failures': self.failures
+            }
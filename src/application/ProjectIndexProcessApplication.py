@@ -1,13 +1,26 @@
 from eventsourcing.application import AggregateNotFound
 from eventsourcing.system import ProcessApplication
 from eventsourcing.dispatch import singledispatchmethod
+from eventsourcing.utils import get_topic
 
 from uuid import UUID
 
+from src.domain.AggregateSnapshot import AggregateSnapshot
 from src.domain.ProjectAggregate import ProjectAggregate
-from src.domain.ProjectIndexAggregate import ProjectIndexAggregate
+from src.domain.ProjectIndexAggregate import ProjectIndexAggregate, SetAsList
 
 class ProjectIndexProcessApplication(ProcessApplication):
+    # Only pull the project events handled below, not the document events in the same table.
+    follow_topics = [get_topic(ProjectAggregate.Created), get_topic(ProjectAggregate.Deleted)]
+
+    # Snapshot every n events. Can be overwritten in the config (see EventService).
+    snapshotting_intervals = {ProjectIndexAggregate: 100}
+    snapshot_class = AggregateSnapshot
+
+    def register_transcodings(self, transcoder):
+        super().register_transcodings(transcoder)
+        transcoder.register(SetAsList())
+
     @singledispatchmethod
     def policy(self, domain_event, process_event):
         pass
@@ -16,27 +29,34 @@ class ProjectIndexProcessApplication(ProcessApplication):
     def _add_project_to_index(self, domain_event, process_event):
         assert isinstance(domain_event, ProjectAggregate.Created)
 
-        index_id = ProjectIndexAggregate.create_id()
-        try:
-            index = self.repository.get(index_id)
-        except AggregateNotFound:
-            index = ProjectIndexAggregate.get()
+        index = self._get_or_create(ProjectIndexAggregate.shard_of(domain_event.originator_id))
 
         index.add_project_to_index(domain_event.originator_id)
-        process_event.save(index)
+        process_event.collect_events(index)
 
     @policy.register(ProjectAggregate.Deleted)
     def _remove_project_from_index(self, domain_event, process_event):
         assert isinstance(domain_event, ProjectAggregate.Deleted)
 
-        index_id = ProjectIndexAggregate.create_id()
+        index = self._get_or_create(ProjectIndexAggregate.shard_of(domain_event.originator_id))
+
+        index.remove_project_from_index(domain_event.originator_id)
+        process_event.collect_events(index)
+
+        # projects created before the sharding
         try:
-            index = self.repository.get(index_id)
+            unsharded = self.repository.get(ProjectIndexAggregate.create_id())
         except AggregateNotFound:
-            index = ProjectIndexAggregate.get()
+            return
+        if domain_event.originator_id in unsharded.projects:
+            unsharded.remove_project_from_index(domain_event.originator_id)
+            process_event.collect_events(unsharded)
 
-        index.remove_project_from_index(domain_event.originator_id)
-        process_event.save(index)
+    def _get_or_create(self, shard):
+        try:
+            return self.repository.get(ProjectIndexAggregate.create_id(shard))
+        except AggregateNotFound:
+            return ProjectIndexAggregate.get(shard)
 
     def create_index(self):
         index = ProjectIndexAggregate.get()
@@ -48,10 +68,13 @@ class ProjectIndexProcessApplication(ProcessApplication):
 
         return self.repository.get(index_id)
 
+    # Ids of all projects in the unsharded index and the shards.
     def get_all_project_ids(self):
-        index_id = ProjectIndexAggregate.create_id()
-        try:
-            index = self.repository.get(index_id)
-            return list(index.projects)
-        except AggregateNotFound:
-            return []
\ No newline at end of file
+        project_ids = []
+        for index_id in [ProjectIndexAggregate.create_id()] + [ProjectIndexAggregate.create_id(shard)
+                                                               for shard in range(ProjectIndexAggregate.shards)]:
+            try:
+                project_ids.extend(self.repository.get(index_id).projects)
+            except AggregateNotFound:
+                pass
+        return project_ids
@@ -0,0 +1,107 @@
+from eventsourcing.system import ProcessApplication
+from eventsourcing.dispatch import singledispatchmethod
+from eventsourcing.utils import get_topic
+
+from src.domain.ProjectAggregate import ProjectAggregate
+from src.util.read_model import construct_read_model_recorder
+
+# Keeps denormalized rows of the projects and their documents for the read endpoints,
+# so listing projects doesn't replay every project aggregate.
+# The rows are written with the tracking record of each processed event.
+class ProjectReadModelProcessApplication(ProcessApplication):
+    # Documents are ordered by notification id * position_stride + index in the event,
+    # so the documents of one DocumentsAdded event keep their order and distinct positions.
+    position_stride = 2 ** 20
+
+    # Only pull the project events handled below, not the document events in the same table.
+    follow_topics = [get_topic(event_cls) for event_cls in [ProjectAggregate.Created, ProjectAggregate.Updated,
+                                                            ProjectAggregate.Deleted, ProjectAggregate.DocumentAdded,
+                                                            ProjectAggregate.DocumentsAdded,
+                                                            ProjectAggregate.DocumentRemoved,
+                                                            ProjectAggregate.DocumentMarked,
+                                                            ProjectAggregate.DocumentUnmarked]]
+
+    def construct_recorder(self):
+        return construct_read_model_recorder(self, 'project_read_model_tracking')
+
+    @singledispatchmethod
+    def policy(self, domain_event, process_event):
+        pass
+
+    @policy.register(ProjectAggregate.Created)
+    def _create_project(self, domain_event, process_event):
+        process_event.collect_events(read_model_changes=[
+            ('create_project', str(domain_event.originator_id), process_event.tracking.notification_id,
+             domain_event.name, domain_event.date, domain_event.creator, str(domain_event.labelSetId),
+             str(domain_event.relationSetId))
+        ])
+
+    @policy.register(ProjectAggregate.Updated)
+    def _update_project(self, domain_event, process_event):
+        process_event.collect_events(read_model_changes=[
+            ('update_project', str(domain_event.originator_id), domain_event.name, domain_event.creator)
+        ])
+
+    @policy.register(ProjectAggregate.Deleted)
+    def _delete_project(self, domain_event, process_event):
+        process_event.collect_events(read_model_changes=[
+            ('delete_project', str(domain_event.originator_id))
+        ])
+
+    @policy.register(ProjectAggregate.DocumentAdded)
+    def _add_document(self, domain_event, process_event):
+        process_event.collect_events(read_model_changes=[
+            ('add_document', str(domain_event.originator_id), str(domain_event.doc_id),
+             process_event.tracking.notification_id * self.position_stride)
+        ])
+
+    @policy.register(ProjectAggregate.DocumentsAdded)
+    def _add_documents(self, domain_event, process_event):
+        assert len(domain_event.doc_ids) < self.position_stride
+
+        position = process_event.tracking.notification_id * self.position_stride
+        process_event.collect_events(read_model_changes=[
+            ('add_document', str(domain_event.originator_id), str(doc_id), position + i)
+            for i, doc_id in enumerate(domain_event.doc_ids)
+        ])
+
+    @policy.register(ProjectAggregate.DocumentRemoved)
+    def _remove_document(self, domain_event, process_event):
+        process_event.collect_events(read_model_changes=[
+            ('remove_document', str(domain_event.originator_id), str(domain_event.doc_id))
+        ])
+
+    @policy.register(ProjectAggregate.DocumentMarked)
+    def _mark_document(self, domain_event, process_event):
+        process_event.collect_events(read_model_changes=[
+            ('mark_document', str(domain_event.originator_id), str(domain_event.doc_id), domain_event.user_id,
+             domain_event.ai_stats)
+        ])
+
+    @policy.register(ProjectAggregate.DocumentUnmarked)
+    def _unmark_document(self, domain_event, process_event):
+        process_event.collect_events(read_model_changes=[
+            ('unmark_document', str(domain_event.originator_id), str(domain_event.doc_id))
+        ])
+
+    # Drop all rows and process all events of the leader again.
+    def rebuild(self, leader_name: str):
+        self.recorder.clear()
+        self.pull_and_process(leader_name, start=1)
+
+    # All projects that are not deleted.
+    def get_projects(self):
+        return self.recorder.select_projects()
+
+    # Project row or None if the project doesn't exist.
+    def get_project(self, project_id: str):
+        return self.recorder.select_project(project_id)
+
+    # Document rows of a project after the position `after`, as a list of (position, row).
+    # See the recorders for the filters.
+    def get_documents(self, project_id: str, after: int = 0, limit: int = None, **filters):
+        return self.recorder.select_documents(project_id, after, limit, **filters)
+
+    # Document ids of several projects, as a dict of project id to list of document ids.
+    def get_document_ids(self, project_ids: list):
+        return self.recorder.select_document_ids(project_ids)
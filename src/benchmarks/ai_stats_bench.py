@@ -0,0 +1,32 @@
+import random
+import time
+
+from src.tests.ai_stats_test import random_document, reference_ai_stats
+from src.util.ai_stats import get_ai_stats
+
+
+# Compare the hash based ai stats with the previous pairwise implementation.
+# Run with: python -m src.benchmarks.ai_stats_bench
+def main(sizes=(1000, 10000)):
+    rng = random.Random(0)
+
+    for num_entities in sizes:
+        doc = random_document(rng, num_entities, num_entities // 2)
+
+        start = time.perf_counter()
+        expected = reference_ai_stats(*doc)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = get_ai_stats(*doc)
+        after = time.perf_counter() - start
+
+        assert abs(result['ner_f1'] - expected['ner_f1']) < 1e-9
+        assert abs(result['rel_f1'] - expected['rel_f1']) < 1e-9
+
+        print(f'{num_entities} entities, {num_entities // 2} relations: pairwise {before * 1000:.1f} ms, '
+              f'hashed {after * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import logging
+import os
+import tempfile
+import time
+
+from uuid import UUID, uuid4
+
+from eventsourcing.application import project_aggregate
+
+from src.application.ProjectApplication import ProjectApplication
+from src.service.EventService import EventService
+
+
+# Import documents into a project one by one (like one DocumentList.post per document)
+# and with add_documents, then replay all events of the project (without snapshots).
+# Run with: python -m src.benchmarks.bulk_add_bench
+def main(size=2000):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['PERSISTENCE_MODULE'] = 'eventsourcing.sqlite'
+    os.environ['SQLITE_DBNAME'] = os.path.join(tmp_dir, 'bench.sqlite')
+
+    service = EventService()
+
+    def one_by_one(project_id, doc_ids):
+        for doc_id in doc_ids:
+            if UUID(doc_id) not in service.get_project(project_id).documents:
+                service.add_document(project_id, doc_id)
+
+    def bulk(project_id, doc_ids):
+        service.add_documents(project_id, doc_ids)
+
+    for add in [one_by_one, bulk]:
+        project_id = str(service.create_project('name', 'date', 'creator', str(uuid4()), str(uuid4())))
+        doc_ids = [str(uuid4()) for _ in range(size)]
+
+        start = time.perf_counter()
+        add(project_id, doc_ids)
+        elapsed = time.perf_counter() - start
+
+        projects = service._runner.get(ProjectApplication)
+        start = time.perf_counter()
+        project = project_aggregate(None, projects.events.get(UUID(project_id)))
+        replay = time.perf_counter() - start
+
+        print(f'{add.__name__:10}: {size} documents in {elapsed * 1000:.0f} ms, {project.version} events, '
+              f'replay {replay * 1000:.1f} ms')
+
+    service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import sys
+import time
+
+from threading import Barrier, Thread
+from uuid import uuid4
+
+import pymongo
+
+from pymongo.errors import ServerSelectionTimeoutError
+
+from src.util.doc_register import create_indexes, get_or_create_entry
+
+
+# Stand-in for the event service, the benchmark only measures the doc register.
+class DocumentCreator:
+
+    def create_document(self, project_id=None):
+        return uuid4()
+
+
+# The previous get-or-create of Document.get: find, insert if missing, find again by _id.
+def get_or_create_previous(doc_register, event_service, project_id, doc_id, user_id):
+    db_result = doc_register.find_one({
+        'project_id': project_id,
+        'doc_id': doc_id,
+        'user_id': user_id
+    })
+
+    if not db_result:
+        new_id = event_service.create_document()
+        doc_register.insert_one({
+            'project_id': project_id,
+            'doc_id': doc_id,
+            'user_id': user_id,
+            '_id': str(new_id),
+            'id': str(new_id)
+        })
+    else:
+        new_id = db_result['_id']
+
+    return doc_register.find_one({'_id': str(new_id)})
+
+
+# Connect to a local mongod, use mongomock if there is none and it is installed.
+# mongomock isn't in requirements.txt, it only serves for a quick run without a mongod.
+def connect(address):
+    try:
+        client = pymongo.MongoClient(address, serverSelectionTimeoutMS=1000)
+        client.admin.command('ping')
+        return client, 'mongod'
+    except ServerSelectionTimeoutError:
+        pass
+
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit(f'No mongod at {address}. Start a mongod (or pip install mongomock for a rough run).')
+    return mongomock.MongoClient(), 'mongomock'
+
+
+def fill(anno_db, num_projects, docs_per_project, users):
+    anno_db['doc_register'].insert_many([
+        {'project_id': f'p{p}', 'doc_id': f'd{d}', 'user_id': f'u{u}', '_id': f'{p}-{d}-{u}', 'id': f'{p}-{d}-{u}'}
+        for p in range(num_projects) for d in range(docs_per_project) for u in range(users)
+    ])
+
+
+def lookups(get_or_create, doc_register, n, num_projects, docs_per_project, users):
+    creator = DocumentCreator()
+    start = time.perf_counter()
+    for i in range(n):
+        get_or_create(doc_register, creator, f'p{i % num_projects}', f'd{(i * 7) % docs_per_project}',
+                      f'u{i % users}')
+    return (time.perf_counter() - start) / n
+
+
+# Entries created by 8 concurrent first requests for the same document.
+def race(get_or_create, doc_register, rounds=20):
+    creator = DocumentCreator()
+    created = 0
+
+    for r in range(rounds):
+        barrier = Barrier(8)
+
+        def run():
+            barrier.wait()
+            try:
+                get_or_create(doc_register, creator, 'race', f'd{r}', 'u')
+            except pymongo.errors.DuplicateKeyError:
+                pass
+
+        threads = [Thread(target=run) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        created += doc_register.count_documents({'project_id': 'race', 'doc_id': f'd{r}'})
+
+    return created / rounds
+
+
+# Lookups of existing entries with and without the indexes.
+# Run with: python -m src.benchmarks.doc_register_bench [mongo address]
+def main(address='mongodb://localhost:27017', num_projects=10, docs_per_project=200, users=5, n=500):
+    client, backend = connect(address)
+    print(f'backend: {backend}, {num_projects * docs_per_project * users} entries')
+
+    for name, get_or_create, indexed in [('previous', get_or_create_previous, False),
+                                         ('upsert + indexes', get_or_create_entry, True)]:
+        db_name = f'doc_register_bench_{uuid4().hex[:8]}'
+        anno_db = client[db_name]
+        fill(anno_db, num_projects, docs_per_project, users)
+        if indexed:
+            create_indexes(anno_db)
+
+        doc_register = anno_db['doc_register']
+        per_lookup = lookups(get_or_create, doc_register, n, num_projects, docs_per_project, users)
+
+        plan = ''
+        if backend == 'mongod':
+            winning = doc_register.find({'project_id': 'p1', 'doc_id': 'd1', 'user_id': 'u1'}).explain()
+            plan = f", plan {winning['queryPlanner']['winningPlan'].get('inputStage', {}).get('stage', 'COLLSCAN')}"
+
+        # mongomock is not thread safe, the race needs a mongod
+        if backend == 'mongod':
+            plan += f', {race(get_or_create, doc_register):.1f} entries per raced document'
+
+        print(f'{name:17}: {per_lookup * 1000:.3f} ms per lookup{plan}')
+
+        client.drop_database(db_name)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
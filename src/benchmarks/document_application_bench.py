@@ -0,0 +1,42 @@
+import os
+import tempfile
+import time
+
+from uuid import UUID
+
+from src.application.DocumentApplication import DocumentApplication
+from src.service.EventService import EventService
+
+
+# Compare building a DocumentApplication per call with the shared one
+# owned by the EventService runner.
+# Run with: python -m src.benchmarks.document_application_bench
+def main(calls: int = 500):
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['PERSISTENCE_MODULE'] = 'eventsourcing.sqlite'
+    os.environ['SQLITE_DBNAME'] = os.path.join(tmp_dir, 'bench.sqlite')
+
+    service = EventService()
+    doc_id = str(service.create_document())
+    service.update_document(doc_id, {'e1': {'type': 'PER', 'start': 0, 'end': 3, 'sentenceIndex': 0}}, [['e1']], {})
+
+    # before: one application, recorder and connection pool per call
+    start = time.perf_counter()
+    for _ in range(calls):
+        DocumentApplication().get(UUID(doc_id))
+    before = (time.perf_counter() - start) / calls
+
+    # after: the long-lived application
+    start = time.perf_counter()
+    for _ in range(calls):
+        service.get_document(doc_id)
+    after = (time.perf_counter() - start) / calls
+
+    print(f'new application per call: {before * 1000:.3f} ms/call')
+    print(f'shared application:       {after * 1000:.3f} ms/call')
+
+    service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
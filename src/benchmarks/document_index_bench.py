@@ -0,0 +1,60 @@
+import logging
+import os
+import random
+import tempfile
+import time
+
+from uuid import UUID, uuid4
+
+from src.service.EventService import EventService
+
+
+# The previous lookup of document_deleted: replay all projects and scan their document lists.
+def find_all_projects(event_service, doc_ids):
+    return [(project.id, doc_id) for project in event_service.get_all_projects() for doc_id in doc_ids
+            if UUID(doc_id) in project.documents]
+
+
+# Lookup with the document index.
+def find_indexed(event_service, doc_ids):
+    return [(project.id, doc_id) for doc_id in doc_ids for project in event_service.get_document_projects(doc_id)]
+
+
+# Find the projects affected by a document_deleted message with 10 documents.
+# Run with: python -m src.benchmarks.document_index_bench
+def main(num_projects=500, docs_per_project=20, deleted=10):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['PERSISTENCE_MODULE'] = 'eventsourcing.sqlite'
+    os.environ['SQLITE_DBNAME'] = os.path.join(tmp_dir, 'bench.sqlite')
+
+    service = EventService()
+    all_docs = [str(uuid4()) for _ in range(num_projects * docs_per_project // 2)]
+    rng = random.Random(0)
+
+    for i in range(num_projects):
+        project_id = str(service.create_project(f'project {i}', 'date', 'creator', str(uuid4()), str(uuid4())))
+        for doc_id in rng.sample(all_docs, docs_per_project):
+            service.add_document(project_id, doc_id)
+    service.shutdown()
+
+    doc_ids = rng.sample(all_docs, deleted)
+
+    for find in [find_all_projects, find_indexed]:
+        # cold: new service with an empty cache
+        service = EventService()
+        start = time.perf_counter()
+        result = find(service, doc_ids)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        find(service, doc_ids)
+        warm = time.perf_counter() - start
+        service.shutdown()
+
+        print(f'{find.__name__}: {len(result)} matches, cold {cold * 1000:.0f} ms, warm {warm * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import logging
+import os
+import tempfile
+import time
+
+from unittest.mock import patch
+from uuid import UUID
+
+from eventsourcing.application import project_aggregate
+
+from src.application.DocumentApplication import DocumentApplication
+from src.domain.DocumentAggregate import DocumentAggregate
+from src.service.EventService import EventService
+
+
+# Storage and replay time of a document after many autosaves, each adding or changing one entity.
+# checkpoint_interval 1 stores the full annotations with every update, like before the Patched events.
+# The stored size counts the events only, the replay applies all events without snapshots.
+# Run with: python -m src.benchmarks.document_patch_bench
+def main(edits=1000, initial_entities=200):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['PERSISTENCE_MODULE'] = 'eventsourcing.sqlite'
+    os.environ['SQLITE_DBNAME'] = os.path.join(tmp_dir, 'bench.sqlite')
+
+    service = EventService()
+    documents = service._runner.get(DocumentApplication)
+
+    for name, interval in [('full events', 1), ('patches', DocumentAggregate.checkpoint_interval)]:
+        doc_id = str(service.create_document())
+        entities = {f'e{i}': {'type': 'PER', 'start': i, 'end': i + 1, 'sentenceIndex': i // 10}
+                    for i in range(initial_entities)}
+        sentence_entities = [[f'e{i}' for i in range(j, j + 10)] for j in range(0, initial_entities, 10)]
+        relations = {}
+
+        with patch.object(DocumentAggregate, 'checkpoint_interval', interval):
+            start = time.perf_counter()
+            for i in range(edits):
+                entities = dict(entities)
+                if i % 2 == 0:
+                    key = f'n{i}'
+                    entities[key] = {'type': 'LOC', 'start': i, 'end': i + 2, 'sentenceIndex': 0}
+                    sentence_entities = [sentence_entities[0] + [key]] + sentence_entities[1:]
+                else:
+                    entities[f'e{i % initial_entities}'] = {'type': 'ORG', 'start': i, 'end': i + 1,
+                                                            'sentenceIndex': 0}
+                service.update_document(doc_id, entities, sentence_entities, relations)
+            elapsed = time.perf_counter() - start
+
+        stored = list(documents.recorder.select_events(UUID(doc_id)))
+        size = sum(len(event.state) for event in stored)
+
+        start = time.perf_counter()
+        doc = project_aggregate(None, documents.events.get(UUID(doc_id)))
+        replay = time.perf_counter() - start
+        assert doc.entities == entities and doc.sentence_entities == sentence_entities
+
+        print(f'{name:11}: {edits} edits in {elapsed * 1000:.0f} ms, {len(stored)} events, '
+              f'{size / 1024:.0f} KiB stored, replay {replay * 1000:.1f} ms')
+
+    service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
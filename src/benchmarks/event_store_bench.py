@@ -0,0 +1,69 @@
+import logging
+import os
+import tempfile
+import time
+
+from eventsourcing.application import project_aggregate
+from eventsourcing.utils import get_topic
+
+from src.application.DocumentApplication import DocumentApplication
+from src.util.persistence import Factory, compressors, transcoders
+
+
+def entities(n, offset=0):
+    return {f'e{i}': {'type': 'PER', 'start': i * 7 + offset, 'end': i * 7 + 5, 'sentenceIndex': i // 10,
+                      'text': f'token{i}'} for i in range(n)}
+
+
+# Database size, write and replay latency of annotated documents with the plain JSON event store
+# and with the faster codec and compression. Each document gets recommendations (set_rec),
+# autosaves and a snapshot at the end.
+# Run with: python -m src.benchmarks.event_store_bench
+def main(docs=100, saves=30, size=300):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    setups = [('json', None), ('orjson', None), ('orjson', 'zlib'), ('orjson', 'lz4')]
+    for codec, compression in setups:
+        db_name = os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+        env = {'PERSISTENCE_MODULE': get_topic(Factory), 'SQLITE_DBNAME': db_name,
+               'TRANSCODER_TOPIC': get_topic(transcoders[codec])}
+        if compression:
+            env['COMPRESSOR_TOPIC'] = get_topic(compressors[compression])
+
+        try:
+            documents = DocumentApplication(env=env)
+        except ImportError:
+            print(f'{codec} + {compression}: not installed')
+            continue
+        documents.snapshotting_intervals = {}
+
+        doc_ids = [documents.create_document() for _ in range(docs)]
+
+        writes = 0
+        start = time.perf_counter()
+        for doc_id in doc_ids:
+            documents.set_rec(doc_id, entities(size), [], {})
+            for i in range(saves):
+                documents.update(doc_id, entities(size // 2 + i, offset=i % 3), [], {})
+                writes += 1
+            documents.take_snapshot(doc_id)
+        write = (time.perf_counter() - start) / (writes + 2 * docs)
+
+        start = time.perf_counter()
+        for doc_id in doc_ids:
+            documents.get(doc_id)
+        snapshot_read = (time.perf_counter() - start) / docs
+
+        start = time.perf_counter()
+        for doc_id in doc_ids:
+            project_aggregate(None, documents.events.get(doc_id))
+        replay = (time.perf_counter() - start) / docs
+        documents.close()
+
+        print(f'{codec:6} + {compression or "none":4}: {os.path.getsize(db_name) / 1024 / 1024:.1f} MiB, '
+              f'load and save {write * 1000:.2f} ms, replay {replay * 1000:.2f} ms, '
+              f'from snapshot {snapshot_read * 1000:.2f} ms per document')
+
+
+if __name__ == '__main__':
+    main()
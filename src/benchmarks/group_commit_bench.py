@@ -0,0 +1,59 @@
+import logging
+import os
+import tempfile
+import time
+
+from threading import Barrier, Thread
+
+from eventsourcing.utils import get_topic
+
+from src.application.DocumentApplication import DocumentApplication
+from src.util.persistence import Factory, default_pragmas
+
+
+def pragmas(**changes):
+    return ';'.join(f'{name}={value}' for name, value in dict(default_pragmas, **changes).items())
+
+
+# Saves per second of concurrent document saves (like autosaves of many annotators, or ai_update
+# for many documents), each on its own document, with and without group commit.
+# Every save is acknowledged after its commit, with synchronous=FULL after its fsync.
+# Run with: python -m src.benchmarks.group_commit_bench
+def main(saves=200, threads=(1, 8, 32)):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    setups = [('commit per save, synchronous=FULL', pragmas(), 0),
+              ('group commit 2 ms, synchronous=FULL', pragmas(), 0.002),
+              ('commit per save, synchronous=NORMAL', pragmas(synchronous='NORMAL'), 0)]
+    for name, sqlite_pragmas, window in setups:
+        for num_threads in threads:
+            env = {'PERSISTENCE_MODULE': get_topic(Factory),
+                   'SQLITE_DBNAME': os.path.join(tempfile.mkdtemp(), 'bench.sqlite'),
+                   'SQLITE_PRAGMAS': sqlite_pragmas, 'GROUP_COMMIT_WINDOW': str(window)}
+            documents = DocumentApplication(env=env)
+            doc_ids = [documents.create_document() for _ in range(num_threads)]
+            barrier = Barrier(num_threads + 1)
+
+            def annotate(doc_id):
+                barrier.wait()
+                for i in range(saves // num_threads):
+                    documents.update(doc_id, {f'e{i}': {'type': 'PER', 'start': i, 'end': i + 5}}, [], {})
+
+            workers = [Thread(target=annotate, args=(doc_id,)) for doc_id in doc_ids]
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+
+            recorder = documents.recorder
+            grouped = f', {recorder.grouped_saves / max(recorder.group_commits, 1):.1f} saves per commit' if window else ''
+            print(f'{name}, {num_threads:2} threads: {num_threads * (saves // num_threads) / elapsed:.0f} saves/s'
+                  f'{grouped}')
+            documents.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import json
+import logging
+import time
+
+from src.tests.listener_test import InMemoryBroker
+from src.util.listener import ConcurrentConsumer
+
+
+# Throughput of the listener with an in-memory broker and a handler that
+# waits `io_latency` seconds per message, like the Mongo and event store I/O of ai_update.
+# Run with: python -m src.benchmarks.listener_bench
+def main(messages=500, io_latency=0.005, prefetch=50):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    batch = [('ai_update', {'document_id': f'doc{i % 100}'}) for i in range(messages)]
+
+    def handler(msg_type, body):
+        time.sleep(io_latency)
+
+    # serial, like the auto_ack consumer
+    broker = InMemoryBroker(prefetch=messages)
+
+    def serial(ch, method, properties, body):
+        handler(properties.headers['type'], json.loads(body))
+        broker.add_callback_threadsafe(lambda: broker.basic_ack(method.delivery_tag))
+
+    start = time.perf_counter()
+    broker.consume(serial, batch)
+    elapsed = time.perf_counter() - start
+    print(f'serial:                {messages / elapsed:8.0f} msg/s')
+
+    for workers in [1, 2, 4, 8, 16]:
+        broker = InMemoryBroker(prefetch=prefetch)
+        consumer = ConcurrentConsumer(broker, broker, handler, workers=workers, ack_batch=10)
+
+        start = time.perf_counter()
+        broker.consume(consumer.on_message, batch)
+        elapsed = time.perf_counter() - start
+        consumer.shutdown()
+
+        print(f'concurrent, {workers:2} workers: {messages / elapsed:8.0f} msg/s ({broker.ack_calls} acks)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import logging
+import os
+import random
+import tempfile
+import time
+
+from threading import Event, Thread
+from uuid import uuid4
+
+import requests
+import waitress
+
+from src.benchmarks.doc_register_bench import connect
+from src.server import create_app
+from src.service.EventService import EventService
+from src.util.dispatcher import Dispatcher
+from src.util.doc_register import create_indexes, get_or_create_entry
+from src.util.persistence import configure_persistence
+from src.util.prediction_tracker import PredictionTracker
+from src.util.training_scheduler import TrainingScheduler
+
+
+# One annotator: opens documents, saves operations on them and pages the document list.
+def annotate(base, project_id, doc_ids, user_id, stop, counts, seed):
+    rng = random.Random(seed)
+    session = requests.Session()
+    versions = {}
+
+    while not stop.is_set():
+        doc_id = rng.choice(doc_ids)
+        action = rng.random()
+
+        if action < 0.6 or doc_id not in versions:
+            response = session.get(f'{base}/projects/{project_id}/docs/{doc_id}/user/{user_id}')
+            if response.ok:
+                versions[doc_id] = response.json()['version']
+        elif action < 0.9:
+            key = f'e{rng.randrange(50)}'
+            response = session.patch(f'{base}/projects/{project_id}/docs/{doc_id}/user/{user_id}/ops', json={
+                'version': versions[doc_id],
+                'operations': [{'op': 'add', 'path': f'/entities/{key}',
+                                'value': {'type': 'PER', 'start': rng.randrange(1000), 'end': 5}}]
+            })
+            if response.ok:
+                versions[doc_id] = response.json()['version']
+        else:
+            response = session.get(f'{base}/projects/{project_id}/docs', params={'limit': 50})
+
+        counts['requests'] += 1
+        if not response.ok:
+            counts['errors'] += 1
+
+
+# Requests per second of concurrent annotators against the waitress server with 1 to 8 worker threads.
+# The event store is a SQLite file, Mongo a local mongod or mongomock.
+# mongomock scans the doc register in Python and holds the GIL, so with it the scaling is lower than with mongod.
+# Run with: python -m src.benchmarks.load_test
+def main(clients=16, duration=5.0, num_docs=10, port=11500):
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('waitress').setLevel(logging.ERROR)
+
+    configure_persistence({'sqlite_dbname': os.path.join(tempfile.mkdtemp(), 'load.sqlite')})
+    event_service = EventService()
+
+    client, mongo = connect('mongodb://localhost:27017')
+    anno_db = client[f'load_test_{uuid4().hex}']
+    create_indexes(anno_db)
+
+    project_id = str(event_service.create_project('name', 'date', 'creator', str(uuid4()), str(uuid4())))
+    doc_ids = [str(uuid4()) for _ in range(num_docs)]
+    event_service.add_documents(project_id, doc_ids)
+    users = [f'user{i}' for i in range(clients)]
+    for doc_id in doc_ids:
+        for user_id in users:
+            get_or_create_entry(anno_db['doc_register'], event_service, project_id, doc_id, user_id)
+
+    # the annotators don't label documents, so nothing is sent to the other services
+    dispatcher = Dispatcher({'doc_address': 'http://127.0.0.1:1', 'ai_address': 'http://127.0.0.1:1'})
+    training_scheduler = TrainingScheduler(dispatcher, 10)
+    app = create_app(event_service, anno_db, dispatcher, training_scheduler, PredictionTracker(dispatcher, 600))
+
+    for i, threads in enumerate([1, 2, 4, 8]):
+        server = waitress.create_server(app, host='127.0.0.1', port=port + i, threads=threads)
+        server_thread = Thread(target=server.run, daemon=True)
+        server_thread.start()
+
+        base = f'http://127.0.0.1:{port + i}/api/v1'
+        stop = Event()
+        counts = [{'requests': 0, 'errors': 0} for _ in users]
+        annotators = [Thread(target=annotate, args=(base, project_id, doc_ids, user_id, stop, count, j))
+                      for j, (user_id, count) in enumerate(zip(users, counts))]
+
+        start = time.perf_counter()
+        for annotator in annotators:
+            annotator.start()
+        time.sleep(duration)
+        stop.set()
+        for annotator in annotators:
+            annotator.join()
+        elapsed = time.perf_counter() - start
+
+        # let the workers finish writing the last responses
+        time.sleep(0.2)
+        server.close()
+
+        total = sum(count['requests'] for count in counts)
+        errors = sum(count['errors'] for count in counts)
+        print(f'{threads} worker threads, {clients} clients ({mongo}): {total / elapsed:.0f} requests/s, '
+              f'{errors} errors')
+
+    training_scheduler.shutdown()
+    dispatcher.shutdown()
+    event_service.shutdown()
+    client.drop_database(anno_db.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import logging
+import os
+import tempfile
+import time
+
+from threading import Barrier, Thread
+from uuid import uuid4
+
+from src.service.EventService import EventService
+from src.util.partitions import partition_of
+from src.util.persistence import configure_persistence
+
+
+# Concurrent annotators in different projects, each saving its own documents, with all documents
+# in one SQLite event store and with the documents partitioned by project.
+# Run with: python -m src.benchmarks.partition_bench
+def main(projects=8, docs_per_project=4, saves=100):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for partitions in [0, 2, 4, 8]:
+        config = {'sqlite_dbname': os.path.join(tempfile.mkdtemp(), 'bench.sqlite'),
+                  'event_store': {'partitions': partitions}}
+        configure_persistence(config)
+        service = EventService(config)
+
+        project_ids = [str(service.create_project(f'project {i}', 'date', 'creator', str(uuid4()), str(uuid4())))
+                       for i in range(projects)]
+        doc_ids = {project_id: [str(service.create_document(project_id)) for _ in range(docs_per_project)]
+                   for project_id in project_ids}
+        barrier = Barrier(projects + 1)
+        latencies = []
+
+        def annotate(project_id):
+            barrier.wait()
+            for i in range(saves):
+                doc_id = doc_ids[project_id][i % docs_per_project]
+                start = time.perf_counter()
+                service.update_document(doc_id, {f'e{i}': {'type': 'PER', 'start': i, 'end': i + 5}}, [], {})
+                latencies.append(time.perf_counter() - start)
+
+        workers = [Thread(target=annotate, args=(project_id,)) for project_id in project_ids]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        service.shutdown()
+
+        latencies.sort()
+        used = len({partition_of(project_id, partitions) for project_id in project_ids}) if partitions else 1
+        print(f'{partitions} partitions ({used} used by {projects} projects): {len(latencies) / elapsed:.0f} saves/s, '
+              f'median {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+              f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import random
+import time
+import tracemalloc
+
+from uuid import uuid4
+
+from src.domain.ProjectAggregate import ProjectAggregate
+
+
+# The previous document state of the project: a list and three dicts.
+class ListProject:
+
+    def __init__(self):
+        self.documents = []
+        self.labelled = {}
+        self.labelled_by = {}
+        self.ai_stats = {}
+
+    def add_document(self, doc_id):
+        self.documents.append(doc_id)
+        self.labelled[doc_id] = False
+        self.labelled_by[doc_id] = []
+        self.ai_stats[doc_id] = {
+            'ner_f1': -1,
+            'rel_f1': -1
+        }
+
+    def mark_document(self, doc_id, user_id, ai_stats):
+        self.labelled[doc_id] = True
+        self.labelled_by[doc_id].append(user_id)
+        self.ai_stats[doc_id] = ai_stats
+
+    def remove_document(self, doc_id):
+        self.documents.remove(doc_id)
+
+
+def fill(project, doc_ids, mark):
+    for i, doc_id in enumerate(doc_ids):
+        project.add_document(doc_id)
+        if i % 5 == 0:
+            mark(project, doc_id)
+
+
+# Memory and membership/removal time of projects with 50k documents, 20 percent labelled.
+# Run with: python -m src.benchmarks.project_documents_bench
+def main(size=50000, lookups=2000):
+    doc_ids = [uuid4() for _ in range(size)]
+    rng = random.Random(0)
+    checked = rng.sample(doc_ids, lookups)
+
+    def list_project():
+        return ListProject()
+
+    def aggregate():
+        project = ProjectAggregate('name', 'date', 'creator', uuid4(), uuid4())
+        project.collect_events()
+        return project
+
+    def mark_list(project, doc_id):
+        project.mark_document(doc_id, 'user', {'ner_f1': 50, 'rel_f1': 50})
+
+    def mark_aggregate(project, doc_id):
+        project.mark_document(doc_id, 'user', {'ner_f1': 50, 'rel_f1': 50})
+        project.collect_events()
+
+    for name, create, mark in [('list + dicts', list_project, mark_list),
+                               ('records', aggregate, mark_aggregate)]:
+        tracemalloc.start()
+        project = create()
+        fill(project, doc_ids, mark)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        found = sum(1 for doc_id in checked if doc_id in project.documents)
+        membership = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for doc_id in checked:
+            project.remove_document(doc_id)
+        if hasattr(project, 'collect_events'):
+            project.collect_events()
+        removal = time.perf_counter() - start
+
+        print(f'{name:13}: {memory / size:.0f} bytes per document, {lookups} lookups ({found} found) '
+              f'{membership * 1000:.1f} ms, {lookups} removals {removal * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import logging
+import os
+import tempfile
+import time
+
+from uuid import uuid4
+
+from src.application.ProjectApplication import ProjectApplication
+from src.application.ProjectIndexProcessApplication import ProjectIndexProcessApplication
+from src.domain.ProjectIndexAggregate import ProjectIndexAggregate
+from src.service.EventService import EventService
+
+
+# The previous index: one aggregate with every create and delete, replayed on each read.
+def unsharded_index(project_ids, deleted_ids):
+    env = {'PERSISTENCE_MODULE': 'eventsourcing.sqlite',
+           'SQLITE_DBNAME': os.path.join(tempfile.mkdtemp(), 'unsharded.sqlite')}
+    indices = ProjectIndexProcessApplication(env=env)
+    indices.snapshotting_intervals = {}
+
+    index = ProjectIndexAggregate.get()
+    for i, project_id in enumerate(project_ids + deleted_ids):
+        if i < len(project_ids):
+            index.add_project_to_index(project_id)
+        else:
+            index.remove_project_from_index(project_id)
+        if i % 500 == 0:
+            indices.save(index)
+    indices.save(index)
+    return indices
+
+
+# Listing projects after years of churn: create projects, delete most of them again.
+# Run with: python -m src.benchmarks.project_index_bench
+def main(num_projects=3000, num_deleted=2700):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['PERSISTENCE_MODULE'] = 'eventsourcing.sqlite'
+    os.environ['SQLITE_DBNAME'] = os.path.join(tmp_dir, 'bench.sqlite')
+
+    service = EventService()
+    project_ids = [service.create_project(f'project {i}', 'date', 'creator', str(uuid4()), str(uuid4()))
+                   for i in range(num_projects)]
+    for project_id in project_ids[:num_deleted]:
+        service.delete_project(str(project_id))
+    service.shutdown()
+
+    indices = unsharded_index(project_ids, project_ids[:num_deleted])
+    start = time.perf_counter()
+    listed = indices.get_index(ProjectIndexAggregate.create_id()).projects
+    unsharded = time.perf_counter() - start
+    print(f'unsharded index: {len(listed)} projects, {num_projects + num_deleted} events, '
+          f'read {unsharded * 1000:.1f} ms')
+
+    service = EventService()
+    indices = service._runner.get(ProjectIndexProcessApplication)
+    start = time.perf_counter()
+    listed = indices.get_all_project_ids()
+    sharded = time.perf_counter() - start
+    print(f'{ProjectIndexAggregate.shards} snapshotted shards: {len(listed)} projects, read {sharded * 1000:.1f} ms')
+    service.shutdown()
+
+    # cold: new services with empty caches
+    service = EventService()
+    indices = service._runner.get(ProjectIndexProcessApplication)
+    projects = service._runner.get(ProjectApplication)
+    start = time.perf_counter()
+    for project_id in indices.get_all_project_ids():
+        service._cache.get(projects, project_id)
+    one_by_one = time.perf_counter() - start
+    service.shutdown()
+
+    service = EventService()
+    start = time.perf_counter()
+    service.get_all_projects()
+    parallel = time.perf_counter() - start
+    service.shutdown()
+
+    print(f'get all projects: one by one {one_by_one * 1000:.0f} ms, '
+          f'with the loader workers {parallel * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import logging
+import os
+import tempfile
+import time
+
+from uuid import uuid4
+
+from src.service.EventService import EventService
+from src.util.serializer import serialize_project, serialize_project_row
+
+
+# The previous ProjectList.get: replay every project aggregate.
+def list_from_aggregates(event_service):
+    return [serialize_project(project) for project in event_service.get_all_projects()]
+
+
+# ProjectList.get with the read model.
+def list_from_read_model(event_service):
+    rows = event_service.get_project_rows()
+    doc_ids = event_service.get_project_document_ids([row['id'] for row in rows])
+    return [serialize_project_row(row, doc_ids[row['id']]) for row in rows]
+
+
+# List 300 projects with 20 documents each, half of them labelled.
+# Run with: python -m src.benchmarks.read_model_bench
+def main(num_projects=300, docs_per_project=20):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['PERSISTENCE_MODULE'] = 'eventsourcing.sqlite'
+    os.environ['SQLITE_DBNAME'] = os.path.join(tmp_dir, 'bench.sqlite')
+
+    service = EventService()
+    for i in range(num_projects):
+        project_id = str(service.create_project(f'project {i}', 'date', 'creator', str(uuid4()), str(uuid4())))
+        for j in range(docs_per_project):
+            doc_id = str(uuid4())
+            service.add_document(project_id, doc_id)
+            if j % 2 == 0:
+                service.mark_document(project_id, doc_id, 'user', {'ner_f1': 50, 'rel_f1': 50})
+    service.shutdown()
+
+    for list_projects in [list_from_aggregates, list_from_read_model]:
+        # cold: new service with an empty cache
+        service = EventService()
+        start = time.perf_counter()
+        result = list_projects(service)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        list_projects(service)
+        warm = time.perf_counter() - start
+        service.shutdown()
+
+        print(f'{list_projects.__name__:21}: {len(result)} projects, cold {cold * 1000:.0f} ms, '
+              f'warm {warm * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
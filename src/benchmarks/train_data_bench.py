@@ -0,0 +1,110 @@
+import logging
+import time
+
+from uuid import UUID, uuid4
+
+from src.application.ProjectApplication import ProjectApplication
+from src.service.EventService import EventService
+from src.util.train_data import build_train_data
+
+
+# In-memory stand-in for the doc_register collection that simulates
+# a network round trip per query.
+class RoundTripCollection:
+
+    def __init__(self, rows, latency):
+        self._rows = {}
+        for row in rows:
+            self._rows.setdefault(row['doc_id'], []).append(row)
+        self._latency = latency
+        self.round_trips = 0
+
+    def _match(self, row, query):
+        for key, val in query.items():
+            if isinstance(val, dict) and '$in' in val:
+                if row[key] not in val['$in']:
+                    return False
+            elif row[key] != val:
+                return False
+        return True
+
+    # rows are indexed by doc_id like the real collection
+    def find(self, query, projection=None):
+        self.round_trips += 1
+        time.sleep(self._latency)
+
+        doc_ids = query['doc_id']['$in'] if isinstance(query['doc_id'], dict) else [query['doc_id']]
+        return [row for doc_id in doc_ids for row in self._rows.get(doc_id, []) if self._match(row, query)]
+
+    def find_one(self, query, projection=None):
+        results = self.find(query)
+        return results[0] if results else None
+
+
+# The previous train data loop, one find_one and one get_document per labelled document.
+def build_train_data_per_document(event_service, doc_register, project_id, project):
+    train_data = []
+    for pr_doc_id, record in project.documents.items():
+        if record.labelled:
+            lab_doc_result = doc_register.find_one({
+                'project_id': project_id,
+                'doc_id': str(pr_doc_id),
+                'user_id': record.labelled_by[0]
+            })
+            lab_doc = event_service.get_document(lab_doc_result['_id'])
+            train_data.append({
+                'doc_id': str(pr_doc_id),
+                'entities': lab_doc.entities,
+                'sentence_entities': lab_doc.sentence_entities,
+                'relations': lab_doc.relations
+            })
+    return train_data
+
+
+# Latency of building the train data for growing projects.
+# Run with: python -m src.benchmarks.train_data_bench
+def main(sizes=(500, 1000, 2500, 5000), latency=0.0005):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for size in sizes:
+        service = EventService()
+        project_id = str(service.create_project('bench', 'date', 'creator', str(uuid4()), str(uuid4())))
+
+        # build the project in one go, the service would replay it for every document
+        projects = service._runner.get(ProjectApplication)
+        project = projects.get_project(UUID(project_id))
+
+        rows = []
+        for i in range(size):
+            doc_id = str(uuid4())
+            project.add_document(UUID(doc_id))
+
+            register_id = str(service.create_document())
+            service.update_document(register_id, {'e': {'sentenceIndex': 0, 'type': 'PER', 'start': i, 'end': i + 1}},
+                                    [['e']], {})
+            rows.append({'_id': register_id, 'project_id': project_id, 'doc_id': doc_id, 'user_id': 'user'})
+
+            # 80 percent labelled
+            if i % 5 != 0:
+                project.mark_document(UUID(doc_id), 'user', {'ner_f1': -1, 'rel_f1': -1})
+
+        projects.save(project)
+        project = service.get_project(project_id)
+
+        # batched first, so it doesn't profit from documents cached by the per document loop
+        results = []
+        for build in [build_train_data, build_train_data_per_document]:
+            doc_register = RoundTripCollection(rows, latency)
+            start = time.perf_counter()
+            train_data = build(service, doc_register, project_id, project)
+            results.append((time.perf_counter() - start, doc_register.round_trips, len(train_data)))
+
+        (after, after_trips, n), (before, before_trips, _) = results
+        print(f'{size} documents ({n} labelled): per document {before * 1000:.0f} ms / {before_trips} queries, '
+              f'batched {after * 1000:.0f} ms / {after_trips} queries')
+
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
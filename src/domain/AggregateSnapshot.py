@@ -0,0 +1,48 @@
+from eventsourcing.domain import Snapshot
+
+from dataclasses import replace
+from uuid import UUID
+
+
+class AggregateSnapshot(Snapshot):
+
+    # Take a snapshot of the aggregate.
+    # JSON only allows str keys, so dicts keyed by UUIDs (e.g. ProjectAggregate.documents)
+    # are stored as lists of [key, value] pairs and restored on mutate.
+    # Attributes referencing the same dict or list (e.g. DocumentAggregate.rec_entities and
+    # orig_entity_preds after set_rec) are stored once and share it again on mutate.
+    @classmethod
+    def take(cls, aggregate):
+        snapshot = super().take(aggregate)
+
+        shared = {}
+        names = {}
+        for name, value in list(snapshot.state.items()):
+            if isinstance(value, (dict, list)) and len(value) > 0:
+                if id(value) in names:
+                    shared[name] = names[id(value)]
+                    del snapshot.state[name]
+                else:
+                    names[id(value)] = name
+
+        uuid_keyed = []
+        for name, value in list(snapshot.state.items()):
+            if isinstance(value, dict) and len(value) > 0 and all(isinstance(key, UUID) for key in value):
+                snapshot.state[name] = [[key, val] for key, val in value.items()]
+                uuid_keyed.append(name)
+
+        snapshot.state['_uuid_keyed'] = uuid_keyed
+        snapshot.state['_shared'] = shared
+        return snapshot
+
+    # Reconstruct the aggregate from the snapshot.
+    def mutate(self, _):
+        state = dict(self.state)
+
+        for name in state.pop('_uuid_keyed', []):
+            state[name] = {key: val for key, val in state[name]}
+
+        for name, other in state.pop('_shared', {}).items():
+            state[name] = state[other]
+
+        return super(AggregateSnapshot, replace(self, state=state)).mutate(_)
@@ -2,7 +2,98 @@ from eventsourcing.domain import Aggregate, event
 
 from uuid import UUID
 
+
+# Changes from old to new of a dict: the added or changed items and the removed keys.
+def dict_delta(old: dict, new: dict):
+    changed = {key: val for key, val in new.items() if key not in old or old[key] != val}
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+# Changes from old to new of a list: [index, value] of the added or changed items and the new length.
+def list_delta(old: list, new: list):
+    changed = [[i, val] for i, val in enumerate(new) if i >= len(old) or old[i] != val]
+    return changed, len(new)
+
+
+# Apply dict_delta to a copy of the dict.
+# Events share their payloads with the aggregate state, so the state is never changed in place.
+def apply_dict_delta(old: dict, changed: dict, removed: list):
+    new = {**old, **changed}
+    for key in removed:
+        new.pop(key, None)
+    return new
+
+
+# Apply list_delta to a copy of the list.
+def apply_list_delta(old: list, changed: list, length: int):
+    new = old[:length] + [None] * (length - len(old))
+    for i, val in changed:
+        new[i] = val
+    return new
+
+
+# Attributes of the paths of the operations (see DocumentAggregate.apply_operations).
+operation_fields = {
+    'entities': 'entities',
+    'sentenceEntities': 'sentence_entities',
+    'relations': 'relations',
+    'recEntities': 'rec_entities',
+    'recSentenceEntities': 'rec_sentence_entities',
+    'recRelations': 'rec_relations'
+}
+
+
+# Apply one operation to the dict of entities or relations (keyed by id)
+# or to the list of sentence entities (indexed by sentence, "-" appends).
+def apply_operation(target, key, op, operation):
+    if op not in ('add', 'replace', 'remove'):
+        raise ValueError(f'Unknown op {op}.')
+    if op != 'remove' and 'value' not in operation:
+        raise ValueError(f'{op} needs a value.')
+
+    if isinstance(target, dict):
+        if op != 'remove' and not isinstance(operation['value'], dict):
+            raise ValueError(f'Value of {key} has to be an object.')
+        if op != 'add' and key not in target:
+            raise ValueError(f'No {key} to {op}.')
+
+        if op == 'remove':
+            del target[key]
+        else:
+            target[key] = operation['value']
+        return
+
+    if op != 'remove' and not isinstance(operation['value'], list):
+        raise ValueError(f'Value of sentence {key} has to be a list.')
+
+    if op == 'add' and key == '-':
+        index = len(target)
+    else:
+        try:
+            index = int(key)
+        except ValueError:
+            raise ValueError(f'Invalid sentence index {key}.')
+
+    size = len(target) + 1 if op == 'add' else len(target)
+    if not 0 <= index < size:
+        raise ValueError(f'Sentence index {key} out of range.')
+
+    if op == 'add':
+        target.insert(index, operation['value'])
+    elif op == 'replace':
+        target[index] = operation['value']
+    else:
+        del target[index]
+
+
 class DocumentAggregate(Aggregate):
+    # Version 2 counts the patches since the last full update (checkpoint).
+    class_version = 2
+
+    # Every n-th update of the annotations or recommendations stores the full state again,
+    # the updates in between only store the changes (Patched events).
+    checkpoint_interval = 20
 
     # Init a document.
     @event('Created')
@@ -15,20 +106,85 @@ class DocumentAggregate(Aggregate):
         self.rec_relations = {}
         self.orig_entity_preds = {}
         self.orig_relation_preds = {}
+        self.patches = 0
+        self.rec_patches = 0
+
+    # Upcast the state of version 1 snapshots.
+    @staticmethod
+    def upcast_v1_v2(state):
+        state['patches'] = 0
+        state['rec_patches'] = 0
 
     # Update relations and labels for user.
+    # Unchanged annotations record no event.
     def update(self, entities, sentence_entities, relations):
         assert isinstance(entities, dict)
         assert isinstance(sentence_entities, list)
         assert isinstance(relations, dict)
 
-        self._update(entities, sentence_entities, relations)
+        entities_changed, entities_removed = dict_delta(self.entities, entities)
+        sentence_entities_changed, sentence_entities_length = list_delta(self.sentence_entities, sentence_entities)
+        relations_changed, relations_removed = dict_delta(self.relations, relations)
 
+        if not (entities_changed or entities_removed or sentence_entities_changed or relations_changed or
+                relations_removed or sentence_entities_length != len(self.sentence_entities)):
+            return
+
+        if self.patches + 1 >= self.checkpoint_interval:
+            self._update(entities, sentence_entities, relations)
+        else:
+            self._patch(entities_changed, entities_removed, sentence_entities_changed, sentence_entities_length,
+                        relations_changed, relations_removed)
+
+    # Full update, also written by older versions for every update.
     @event('UpdatedDocument')
     def _update(self, entities, sentence_entities, relations):
         self.entities = entities
         self.sentence_entities = sentence_entities
         self.relations = relations
+        self.patches = 0
+
+    @event('PatchedDocument')
+    def _patch(self, entities_changed, entities_removed, sentence_entities_changed, sentence_entities_length,
+               relations_changed, relations_removed):
+        self.entities = apply_dict_delta(self.entities, entities_changed, entities_removed)
+        self.sentence_entities = apply_list_delta(self.sentence_entities, sentence_entities_changed,
+                                                  sentence_entities_length)
+        self.relations = apply_dict_delta(self.relations, relations_changed, relations_removed)
+        self.patches += 1
+
+    # Apply JSON-patch style operations to the annotations and recommendations, e.g.
+    # {"op": "add", "path": "/entities/e1", "value": {...}} or {"op": "remove", "path": "/relations/r1"}.
+    # The paths are /<field>/<id> for the entity and relation dicts and /<field>/<index> for the sentence
+    # entities lists, "~1" and "~0" in ids stand for "/" and "~".
+    # Raises ValueError for invalid operations, the document is not changed then.
+    def apply_operations(self, operations):
+        if not isinstance(operations, list):
+            raise ValueError('Operations have to be a list.')
+
+        state = {}
+        for operation in operations:
+            if not isinstance(operation, dict) or not isinstance(operation.get('path'), str):
+                raise ValueError(f'Invalid operation {operation}.')
+
+            path = operation['path'].split('/')
+            if len(path) != 3 or path[0] != '' or path[1] not in operation_fields:
+                raise ValueError(f'Invalid path {operation["path"]}.')
+
+            name = operation_fields[path[1]]
+            if name not in state:
+                state[name] = type(getattr(self, name))(getattr(self, name))
+
+            key = path[2].replace('~1', '/').replace('~0', '~')
+            apply_operation(state[name], key, operation.get('op'), operation)
+
+        if any(name in state for name in ('entities', 'sentence_entities', 'relations')):
+            self.update(state.get('entities', self.entities), state.get('sentence_entities', self.sentence_entities),
+                        state.get('relations', self.relations))
+        if any(name in state for name in ('rec_entities', 'rec_sentence_entities', 'rec_relations')):
+            self.update_rec(state.get('rec_entities', self.rec_entities),
+                            state.get('rec_sentence_entities', self.rec_sentence_entities),
+                            state.get('rec_relations', self.rec_relations))
 
     # update recommendations for doc
     def update_rec(self, rec_entities, rec_sentence_entities, rec_relations):
@@ -36,13 +192,37 @@ class DocumentAggregate(Aggregate):
         assert isinstance(rec_sentence_entities, list)
         assert isinstance(rec_relations, dict)
 
-        self._update_rec(rec_entities, rec_sentence_entities, rec_relations)
+        entities_changed, entities_removed = dict_delta(self.rec_entities, rec_entities)
+        sentence_entities_changed, sentence_entities_length = list_delta(self.rec_sentence_entities,
+                                                                         rec_sentence_entities)
+        relations_changed, relations_removed = dict_delta(self.rec_relations, rec_relations)
+
+        if not (entities_changed or entities_removed or sentence_entities_changed or relations_changed or
+                relations_removed or sentence_entities_length != len(self.rec_sentence_entities)):
+            return
 
+        if self.rec_patches + 1 >= self.checkpoint_interval:
+            self._update_rec(rec_entities, rec_sentence_entities, rec_relations)
+        else:
+            self._patch_rec(entities_changed, entities_removed, sentence_entities_changed, sentence_entities_length,
+                            relations_changed, relations_removed)
+
+    # Full update, also written by older versions for every update.
     @event('UpdatedDocumentRecommendations')
     def _update_rec(self, rec_entities, rec_sentence_entities, rec_relations):
         self.rec_entities = rec_entities
         self.rec_sentence_entities = rec_sentence_entities
         self.rec_relations = rec_relations
+        self.rec_patches = 0
+
+    @event('PatchedDocumentRecommendations')
+    def _patch_rec(self, entities_changed, entities_removed, sentence_entities_changed, sentence_entities_length,
+                   relations_changed, relations_removed):
+        self.rec_entities = apply_dict_delta(self.rec_entities, entities_changed, entities_removed)
+        self.rec_sentence_entities = apply_list_delta(self.rec_sentence_entities, sentence_entities_changed,
+                                                      sentence_entities_length)
+        self.rec_relations = apply_dict_delta(self.rec_relations, relations_changed, relations_removed)
+        self.rec_patches += 1
 
     # set recommendations for docuemnets aka first update
     def set_rec(self, rec_entities, rec_sentence_entities, rec_relations):
@@ -60,3 +240,4 @@ class DocumentAggregate(Aggregate):
         self.rec_relations = rec_relations
         self.orig_entity_preds = rec_entities
         self.orig_relation_preds = rec_relations
+        self.rec_patches = 0
@@ -0,0 +1,45 @@
+from eventsourcing.domain import Aggregate, AggregateEvent, AggregateCreated
+
+from typing import Set
+from uuid import uuid5, NAMESPACE_URL, UUID
+
+# Reverse index: the projects a document belongs to.
+class DocumentIndexAggregate(Aggregate):
+
+    def __init__(self):
+        self.projects: Set[UUID] = set()
+
+    @classmethod
+    def create_id(cls, doc_id):
+        return uuid5(NAMESPACE_URL, f'/documents/{doc_id}')
+
+    @classmethod
+    def get(cls, doc_id):
+        index_id = cls.create_id(doc_id)
+        return cls._create(cls.Created, id=index_id)
+
+    def add_project(self, project_id):
+        self.trigger_event(self.ProjectAddedEvent, project_id=project_id)
+
+    def remove_project(self, project_id):
+        self.trigger_event(self.ProjectRemovedEvent, project_id=project_id)
+
+    class Created(AggregateCreated):
+        pass
+
+    class ProjectAddedEvent(AggregateEvent):
+        project_id: UUID
+
+        def apply(self, index):
+            assert isinstance(index, DocumentIndexAggregate)
+
+            index.projects.add(self.project_id)
+
+    class ProjectRemovedEvent(AggregateEvent):
+        project_id: UUID
+
+        def apply(self, index):
+            assert isinstance(index, DocumentIndexAggregate)
+
+            if self.project_id in index.projects:
+                index.projects.remove(self.project_id)
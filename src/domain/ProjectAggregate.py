@@ -1,8 +1,58 @@
 from eventsourcing.domain import Aggregate, event
+from eventsourcing.persistence import Transcoding
 
+from copy import copy
 from uuid import UUID
 
+
+# State of one document in a project.
+# Unlabelled documents share the empty labelled_by tuple and have no ai stats dict of their own.
+class DocumentRecord:
+    __slots__ = ('labelled', 'labelled_by', '_ai_stats')
+
+    def __init__(self, labelled=False, labelled_by=(), ai_stats=None):
+        self.labelled = labelled
+        self.labelled_by = labelled_by
+        self._ai_stats = ai_stats
+
+    @property
+    def ai_stats(self):
+        if self._ai_stats is None:
+            return {
+                'ner_f1': -1,
+                'rel_f1': -1
+            }
+        return self._ai_stats
+
+    @ai_stats.setter
+    def ai_stats(self, ai_stats):
+        self._ai_stats = ai_stats
+
+    def __eq__(self, other):
+        return (isinstance(other, DocumentRecord) and self.labelled == other.labelled and
+                self.labelled_by == other.labelled_by and self.ai_stats == other.ai_stats)
+
+    def __repr__(self):
+        return f'DocumentRecord({self.labelled}, {self.labelled_by}, {self.ai_stats})'
+
+
+# Stores document records in snapshots.
+class DocumentRecordAsList(Transcoding):
+    type = DocumentRecord
+    name = 'document_record'
+
+    def encode(self, obj):
+        return [obj.labelled, list(obj.labelled_by), obj._ai_stats]
+
+    def decode(self, data):
+        labelled, labelled_by, ai_stats = data
+        return DocumentRecord(labelled, tuple(labelled_by), ai_stats)
+
+
 class ProjectAggregate(Aggregate):
+    # Version 2 keeps the documents in an insertion ordered dict of document records,
+    # version 1 in a list and the labelled, labelled_by and ai_stats dicts.
+    class_version = 2
 
     # Init a new project.
     @event('Created')
@@ -13,17 +63,39 @@ class ProjectAggregate(Aggregate):
         assert isinstance(labelSetId, UUID)
         assert isinstance(relationSetId, UUID)
 
-        self.documents = []
-        self.labelled = {}
-        self.labelled_by = {}
-        self.ai_stats = {}
+        self.documents = {}
         self.deleted = False
         self.name = name
-        self.date = date  
-        self.creator = creator 
+        self.date = date
+        self.creator = creator
         self.labelSetId = labelSetId
         self.relationSetId = relationSetId
 
+    # Upcast the state of version 1 snapshots.
+    # Removed documents were kept in the dicts, only documents in the list are kept.
+    @staticmethod
+    def upcast_v1_v2(state):
+        state['documents'] = {
+            doc_id: DocumentRecord(state['labelled'][doc_id], tuple(state['labelled_by'][doc_id]),
+                                   state['ai_stats'][doc_id] if state['labelled_by'][doc_id] else None)
+            for doc_id in state['documents']
+        }
+        del state['labelled']
+        del state['labelled_by']
+        del state['ai_stats']
+
+    # Copy to apply new events to, for the AggregateCache. The events replace document records instead of
+    # changing them, so the copy shares the records with this project and only the dict is copied.
+    def copy_for_events(self):
+        project = copy(self)
+        project.documents = dict(self.documents)
+        return project
+
+    # Is the document in the project and labelled.
+    def is_labelled(self, doc_id):
+        record = self.documents.get(doc_id)
+        return record is not None and record.labelled
+
     # Remove a project.
     @event('Deleted')
     def delete(self):
@@ -38,7 +110,7 @@ class ProjectAggregate(Aggregate):
     @event('Updated')
     def _update_metadata(self, name, creator):
         self.name = name
-        self.creator = creator 
+        self.creator = creator
 
     # Add mulitple documents to the list.
     def add_document(self, doc_id):
@@ -49,13 +121,28 @@ class ProjectAggregate(Aggregate):
     # Add single document to the list
     @event('DocumentAdded')
     def _add_document(self, doc_id):
-        self.documents.append(doc_id)
-        self.labelled[doc_id] = False
-        self.labelled_by[doc_id] = []
-        self.ai_stats[doc_id] = {
-            'ner_f1': -1,
-            'rel_f1': -1
-        }
+        # a document added again starts over at the end, like the list did
+        self.documents.pop(doc_id, None)
+        self.documents[doc_id] = DocumentRecord()
+
+    # Add several documents with one event. Documents already in the project
+    # and repeated ids are skipped. Returns the ids that were added.
+    def add_documents(self, doc_ids):
+        new_ids = []
+        for doc_id in dict.fromkeys(doc_ids):
+            assert isinstance(doc_id, UUID)
+
+            if doc_id not in self.documents:
+                new_ids.append(doc_id)
+
+        if len(new_ids) > 0:
+            self._add_documents(new_ids)
+        return new_ids
+
+    @event('DocumentsAdded')
+    def _add_documents(self, doc_ids):
+        for doc_id in doc_ids:
+            self.documents[doc_id] = DocumentRecord()
 
     # Remove a document from the list
     def remove_document(self, doc_id):
@@ -65,7 +152,7 @@ class ProjectAggregate(Aggregate):
 
     @event('DocumentRemoved')
     def _delete_document(self, doc_id):
-        self.documents.remove(doc_id)
+        del self.documents[doc_id]
 
     # Mark a document as labelled
     def mark_document(self, doc_id, user_id, ai_stats):
@@ -73,29 +160,31 @@ class ProjectAggregate(Aggregate):
         assert isinstance(doc_id, UUID)
         assert isinstance(ai_stats, dict)
 
-        if user_id not in self.labelled_by[doc_id]:
+        if user_id not in self.documents[doc_id].labelled_by:
             self._mark_document(doc_id, user_id, ai_stats)
 
     @event('DocumentMarked')
     def _mark_document(self, doc_id, user_id, ai_stats):
-        self.labelled[doc_id] = True
-        if user_id not in self.labelled_by[doc_id]:
-            self.labelled_by[doc_id].append(user_id)
-            self.ai_stats[doc_id] = ai_stats
+        # old histories can mark documents that were removed before
+        record = self.documents.get(doc_id)
+        if record is None:
+            return
+
+        # the record is replaced, not changed, see copy_for_events
+        if user_id in record.labelled_by:
+            self.documents[doc_id] = DocumentRecord(True, record.labelled_by, record._ai_stats)
+        else:
+            self.documents[doc_id] = DocumentRecord(True, record.labelled_by + (user_id,), ai_stats)
 
     # Unlabel doc
     def unmark_document(self, doc_id):
         assert isinstance(doc_id, UUID)
 
-        if doc_id in self.labelled:
+        if doc_id in self.documents:
             self._unmark_document(doc_id)
 
     @event('DocumentUnmarked')
     def _unmark_document(self, doc_id):
-        self.labelled[doc_id] = False
-        self.labelled_by[doc_id] = []
-        self.ai_stats[doc_id] = {
-            'ner_f1': -1,
-            'rel_f1': -1
-        }
-
+        # old histories can unmark documents that were removed before
+        if doc_id in self.documents:
+            self.documents[doc_id] = DocumentRecord()
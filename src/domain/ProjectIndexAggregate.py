@@ -1,27 +1,52 @@
 from eventsourcing.domain import Aggregate, AggregateEvent, AggregateCreated
+from eventsourcing.persistence import Transcoding
 
 from typing import Set
 from uuid import uuid5, NAMESPACE_URL, UUID
 
+
+# Stores the project id sets in snapshots.
+class SetAsList(Transcoding):
+    type = set
+    name = 'set'
+
+    def encode(self, obj):
+        return list(obj)
+
+    def decode(self, data):
+        return set(data)
+
+
+# Index of all projects, split into shards by project id, so creating and deleting
+# projects doesn't append to one aggregate and every shard stays short (and is snapshotted).
+# Projects created before the sharding are in the unsharded index (create_id() without shard).
 class ProjectIndexAggregate(Aggregate):
+    # Changing the number of shards moves projects to other shards, the index has to be rebuilt then.
+    shards = 16
 
     def __init__(self):
         self.projects: Set[UUID] = set()
 
     @classmethod
-    def create_id(cls):
-        return uuid5(NAMESPACE_URL, f'/projects')
+    def create_id(cls, shard=None):
+        if shard is None:
+            return uuid5(NAMESPACE_URL, f'/projects')
+        return uuid5(NAMESPACE_URL, f'/projects/{shard}')
+
+    @classmethod
+    def shard_of(cls, project_id):
+        return project_id.int % cls.shards
 
     @classmethod
-    def get(cls):
-        index_id = cls.create_id()
+    def get(cls, shard=None):
+        index_id = cls.create_id(shard)
         return cls._create(cls.Created, id=index_id)
 
     def add_project_to_index(self, project_id):
         self.trigger_event(self.ProjectAddedEvent, project_id= project_id)
 
     def remove_project_from_index(self, project_id):
-        self.trigger_event(self.ProjectRemovedEvent, project_id = project_id) 
+        self.trigger_event(self.ProjectRemovedEvent, project_id = project_id)
 
     class Created(AggregateCreated):
         pass
@@ -31,7 +56,7 @@ class ProjectIndexAggregate(Aggregate):
 
         def apply(self, index):
             assert isinstance(index, ProjectIndexAggregate)
-            
+
             index.projects.add(self.project_id)
 
     class ProjectRemovedEvent(AggregateEvent):
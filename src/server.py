@@ -8,40 +8,22 @@ from flask_cors import CORS
 
 import pymongo
 import os
+import waitress
 
-from src.api.resources import Project, ProjectList, Document, DocumentList, EntitySetList, EnititySet, RelationSetList, RelationSet
+from src.api.resources import Project, ProjectList, Document, DocumentList, DocumentBatch, DocumentOperations, EntitySetList, EnititySet, RelationSetList, RelationSet, Stats
 from src.service.EventService import EventService
 from src.util import logwrapper
+from src.util.dispatcher import Dispatcher
+from src.util.doc_register import create_indexes
 from src.util.listener import listening_thread
+from src.util.prediction_tracker import PredictionTracker
+from src.util.training_scheduler import TrainingScheduler
+from src.util.type_cache import TypeCache
+from src.util.persistence import configure_persistence
 
 
-def main():
-    # read config
-    if not os.path.exists('./config.json'):
-        logwrapper.error('No Config File. Shutting down.')
-        sys.exit()
-
-    with open('./config.json', 'r') as f:
-        config = json.load(f)
-
-    # Event sourcing configuration.
-    #os.environ["PERSISTENCE_MODULE"] = "eventsourcing.postgres"
-    #os.environ['INFRASTRUCTURE_FACTORY'] = 'eventsourcing.postgres:Factory'
-    #os.environ['POSTGRES_DBNAME'] = 'anno_events'
-    #os.environ['POSTGRES_HOST'] = '127.0.0.1'
-    #os.environ['POSTGRES_PORT'] = '27017'
-    #os.environ['POSTGRES_USER'] = 'gnuma'
-    #os.environ['POSTGRES_PASSWORD'] = 'gnuma'
-    #os.environ['POSTGRES_CONN_MAX_AGE'] = '10'
-    #os.environ['POSTGRES_PRE_PING'] = 'y'
-    #os.environ['POSTGRES_LOCK_TIMEOUT'] = '5'
-    #os.environ['POSTGRES_IDLE_IN_TRANSACTION_SESSION_TIMEOUT'] = '5'
-
-    os.environ["PERSISTENCE_MODULE"] = "eventsourcing.sqlite"
-    os.environ["SQLITE_DBNAME"] = "./anno_db.sqlite"
-    os.environ["SQLITE_LOCK_TIMEOUT"] = "10"
-
-
+# Flask app with the resources of the Rest API.
+def create_app(event_service, anno_db, dispatcher, training_scheduler, prediction_tracker):
     # Set up Flask and the Rest API.
     app = Flask(__name__)
     api = Api(app)
@@ -53,31 +35,90 @@ def main():
         }
     })
 
-    # Connect to MongoDB
-    mongo_client = pymongo.MongoClient(config['mongo_db_address'])
-    anno_db = mongo_client['anno_db']
-
-    # Set up event sourcing service
-    event_service = EventService()
+    # Entity and relation types of the label and relation sets, shared by the resources
+    type_cache = TypeCache(anno_db)
 
     # Add resources to the API.
     pre = '/api/v1'
     api.add_resource(ProjectList, f'{pre}/projects', resource_class_kwargs={'event_service': event_service})
     api.add_resource(Project, f'{pre}/projects/<project_id>', resource_class_kwargs={'event_service': event_service})
     api.add_resource(DocumentList, f'{pre}/projects/<project_id>/docs', resource_class_kwargs={'event_service': event_service})
+    api.add_resource(DocumentBatch, f'{pre}/projects/<project_id>/docs/batch',
+                     resource_class_kwargs={'event_service': event_service})
     api.add_resource(Document, f'{pre}/projects/<project_id>/docs/<doc_id>/user/<user_id>',
-                     resource_class_kwargs={'event_service': event_service, 'anno_db': anno_db})
-    api.add_resource(EntitySetList, f'{pre}/entities', resource_class_kwargs={'anno_db': anno_db})
+                     resource_class_kwargs={'event_service': event_service, 'anno_db': anno_db,
+                                            'type_cache': type_cache, 'dispatcher': dispatcher,
+                                            'training_scheduler': training_scheduler,
+                                            'prediction_tracker': prediction_tracker})
+    api.add_resource(DocumentOperations, f'{pre}/projects/<project_id>/docs/<doc_id>/user/<user_id>/ops',
+                     resource_class_kwargs={'event_service': event_service, 'anno_db': anno_db,
+                                            'type_cache': type_cache, 'dispatcher': dispatcher,
+                                            'training_scheduler': training_scheduler})
+    api.add_resource(EntitySetList, f'{pre}/entities', resource_class_kwargs={'anno_db': anno_db,
+                                                                              'type_cache': type_cache})
     api.add_resource(EnititySet, f'{pre}/entities/<entity_id>', resource_class_kwargs={'anno_db': anno_db})
-    api.add_resource(RelationSetList, f'{pre}/relations', resource_class_kwargs={'anno_db': anno_db})
+    api.add_resource(RelationSetList, f'{pre}/relations', resource_class_kwargs={'anno_db': anno_db,
+                                                                                 'type_cache': type_cache})
     api.add_resource(RelationSet, f'{pre}/relations/<relation_id>', resource_class_kwargs={'anno_db': anno_db})
+    api.add_resource(Stats, f'{pre}/stats', resource_class_kwargs={'event_service': event_service,
+                                                                   'type_cache': type_cache,
+                                                                   'dispatcher': dispatcher,
+                                                                   'training_scheduler': training_scheduler,
+                                                                   'prediction_tracker': prediction_tracker})
+
+    return app
+
+
+# Serve the app. By default with the multi-threaded waitress server, with the number of worker
+# threads of the "server" config. The threads share the EventService, which serializes the changes
+# of each aggregate, so the server runs as a single process.
+# "mode": "development" starts Flask's development server instead.
+def serve(app, config):
+    server_config = config.get('server', {})
+
+    if server_config.get('mode', 'production') == 'development':
+        app.run(debug=False, port=config['port'], host='0.0.0.0')
+        return
+
+    threads = int(server_config.get('threads', 8))
+    logwrapper.info(f'Serving on port {config["port"]} with {threads} threads.')
+    waitress.serve(app, host='0.0.0.0', port=config['port'], threads=threads,
+                   connection_limit=int(server_config.get('connection_limit', 100)))
+
+
+def main():
+    # read config
+    if not os.path.exists('./config.json'):
+        logwrapper.error('No Config File. Shutting down.')
+        sys.exit()
+
+    with open('./config.json', 'r') as f:
+        config = json.load(f)
+
+    # Event sourcing configuration.
+    configure_persistence(config)
+
+
+    # Connect to MongoDB
+    mongo_client = pymongo.MongoClient(config['mongo_db_address'])
+    anno_db = mongo_client['anno_db']
+    create_indexes(anno_db)
+
+    # Start the workers sending requests to the other services
+    dispatcher = Dispatcher(config)
+    training_scheduler = TrainingScheduler(dispatcher, float(config.get('training', {}).get('window', 10)))
+    prediction_tracker = PredictionTracker(dispatcher, float(config.get('prediction', {}).get('ttl', 600)))
+
+    # Set up event sourcing service
+    event_service = EventService(config)
 
     # Start the thread listening to rabbbit mq
-    t = Thread(target=listening_thread, args=(event_service, anno_db, config,))
+    t = Thread(target=listening_thread, args=(event_service, anno_db, prediction_tracker, config,))
     t.start()
 
     # Start the server.
-    app.run(debug=False, port=config['port'], host='0.0.0.0')
+    app = create_app(event_service, anno_db, dispatcher, training_scheduler, prediction_tracker)
+    serve(app, config)
 
 
 if __name__ == '__main__':
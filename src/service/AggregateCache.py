@@ -0,0 +1,158 @@
+import sys
+
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Lock
+from uuid import UUID
+
+from eventsourcing.application import AggregateNotFound, project_aggregate
+
+
+# Rough size of an object graph in bytes.
+def estimate_size(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(key, seen) + estimate_size(val, seen) for key, val in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(ele, seen) for ele in obj)
+    elif hasattr(obj, '__dict__'):
+        size += estimate_size(obj.__dict__, seen)
+    return size
+
+
+class _Entry:
+    __slots__ = ('aggregate', 'size', 'stale')
+
+    def __init__(self, aggregate, size):
+        self.aggregate = aggregate
+        self.size = size
+        self.stale = False
+
+
+# LRU cache of reconstructed aggregates, bounded by an estimated memory budget.
+# Cached aggregates are shared between callers and must be treated as read only.
+# New events are applied to a copy, so aggregates handed out earlier never change.
+# Aggregates with a copy_for_events method (ProjectAggregate) make the copy themselves and share
+# the state the events don't change. Their size is then advanced by the size of the events instead
+# of walking the whole aggregate again, it is measured again when the aggregate is loaded again.
+class AggregateCache:
+
+    def __init__(self, max_bytes: int, check_versions: bool = True):
+        self._max_bytes = max_bytes
+        self._check_versions = check_versions
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.advances = 0
+        self.evictions = 0
+
+    # Get an aggregate from the cache or load it with the application's repository.
+    # A cached aggregate is brought up to date with the events after its version,
+    # which is a single indexed query that usually returns nothing.
+    def get(self, app, aggregate_id: UUID):
+        with self._lock:
+            entry = self._entries.get(aggregate_id)
+            if entry is not None:
+                self._entries.move_to_end(aggregate_id)
+                stale = entry.stale
+                aggregate = entry.aggregate
+                size = entry.size
+
+        if entry is None:
+            aggregate = app.repository.get(aggregate_id)
+            with self._lock:
+                self.misses += 1
+            self._put(aggregate_id, aggregate)
+            return aggregate
+
+        if stale or self._check_versions:
+            new_events = list(app.events.get(originator_id=aggregate_id, gt=aggregate.version))
+
+            if len(new_events) > 0:
+                if hasattr(aggregate, 'copy_for_events'):
+                    aggregate = project_aggregate(aggregate.copy_for_events(), new_events)
+                    size += sum(estimate_size(domain_event) for domain_event in new_events)
+                else:
+                    aggregate = project_aggregate(deepcopy(aggregate), new_events)
+                    size = None
+                if aggregate is None:
+                    self.discard(aggregate_id)
+                    raise AggregateNotFound(aggregate_id)
+
+                with self._lock:
+                    self.advances += 1
+                self._put(aggregate_id, aggregate, size)
+            elif stale:
+                with self._lock:
+                    if self._entries.get(aggregate_id) is entry:
+                        entry.stale = False
+
+        with self._lock:
+            self.hits += 1
+        return aggregate
+
+    # Mark an aggregate as changed, the next get applies the new events.
+    def mark_stale(self, aggregate_id: UUID):
+        with self._lock:
+            entry = self._entries.get(aggregate_id)
+            if entry is not None:
+                entry.stale = True
+
+    # Remove an aggregate from the cache.
+    def discard(self, aggregate_id: UUID):
+        with self._lock:
+            entry = self._entries.pop(aggregate_id, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'advances': self.advances,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self._max_bytes
+            }
+
+    def _put(self, aggregate_id: UUID, aggregate, size: int = None):
+        if size is None:
+            size = estimate_size(aggregate)
+
+        with self._lock:
+            old = self._entries.pop(aggregate_id, None)
+            if old is not None:
+                # never replace with an older version (concurrent loads)
+                if old.aggregate.version > aggregate.version:
+                    self._entries[aggregate_id] = old
+                    return
+                self._bytes -= old.size
+
+            # too big for the cache at all
+            if size > self._max_bytes:
+                return
+
+            self._entries[aggregate_id] = _Entry(aggregate, size)
+            self._bytes += size
+
+            # evict least recently used
+            while self._bytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from threading import Lock
+from uuid import UUID
+
+
+# Striped locks serializing the changes of one aggregate (load, change, save) between threads.
+# Aggregates share a lock if their ids fall into the same stripe, which only costs some waiting.
+# Several aggregates are locked in stripe order, so two threads locking the same aggregates never deadlock.
+class AggregateLocks:
+
+    def __init__(self, stripes: int = 256):
+        self._locks = [Lock() for _ in range(stripes)]
+        self._stats_lock = Lock()
+
+        self.waits = 0
+
+    def _stripe(self, aggregate_id) -> int:
+        return UUID(str(aggregate_id)).int % len(self._locks)
+
+    # with locks(project_id, doc_id): ...
+    @contextmanager
+    def __call__(self, *aggregate_ids):
+        locks = [self._locks[i] for i in sorted({self._stripe(aggregate_id) for aggregate_id in aggregate_ids})]
+        for lock in locks:
+            if not lock.acquire(blocking=False):
+                with self._stats_lock:
+                    self.waits += 1
+                lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    # Split many aggregate ids into batches of at most batch_size ids in at most max_stripes stripes,
+    # so locking a batch only blocks the other threads on a few stripes.
+    def batches(self, aggregate_ids, batch_size: int, max_stripes: int = 4):
+        by_stripe = {}
+        for aggregate_id in aggregate_ids:
+            by_stripe.setdefault(self._stripe(aggregate_id), []).append(aggregate_id)
+
+        batch, stripes = [], set()
+        for stripe in sorted(by_stripe):
+            for aggregate_id in by_stripe[stripe]:
+                if len(batch) == batch_size or (stripe not in stripes and len(stripes) == max_stripes):
+                    yield batch
+                    batch, stripes = [], set()
+                batch.append(aggregate_id)
+                stripes.add(stripe)
+
+        if batch:
+            yield batch
@@ -0,0 +1,63 @@
+from eventsourcing.sqlite import Factory as SQLiteFactory
+
+from uuid import UUID
+
+from src.application.DocumentApplication import DocumentApplication
+from src.util.partitions import DocumentRoutes, partition_db_name, partition_of
+
+
+# Document applications of the partitioned event store.
+# New documents of a project are stored in partition partition_of(project_id), each partition
+# in its own SQLite file with its own writer, so saves in different partitions don't wait for
+# each other. The routing table maps the document ids to their partition. Documents without
+# a route (created before the partitioning or without a project) are in the main store.
+# With 0 partitions every document is in the main store.
+class DocumentPartitions:
+
+    def __init__(self, main: DocumentApplication, partitions: int = 0):
+        self.main = main
+        self.partitions = []
+        self.routes = None
+
+        if partitions > 0:
+            db_name = main.factory.datastore.pool.db_name if isinstance(main.factory, SQLiteFactory) else None
+            for partition in range(partitions):
+                env = {'SQLITE_DBNAME': partition_db_name(db_name, partition)} if db_name else {}
+                self.partitions.append(DocumentApplication(env=env))
+            self.routes = DocumentRoutes(db_name)
+
+    # The main application and the ones of the partitions.
+    def apps(self):
+        return [self.main] + self.partitions
+
+    # The application storing a document.
+    def app(self, doc_id):
+        if self.routes is None:
+            return self.main
+
+        partition = self.routes.get(UUID(str(doc_id)))
+        return self.main if partition is None else self.partitions[partition]
+
+    # Create a document in the partition of its project.
+    def create_document(self, project_id=None):
+        if self.routes is None or project_id is None:
+            return self.main.create_document()
+
+        partition = partition_of(project_id, len(self.partitions))
+        doc_id = self.partitions[partition].create_document()
+        self.routes.add(doc_id, partition)
+        return doc_id
+
+    # Group document ids by the application storing them.
+    def group(self, doc_ids):
+        groups = {}
+        for doc_id in doc_ids:
+            app = self.app(doc_id)
+            groups.setdefault(id(app), (app, []))[1].append(doc_id)
+        return list(groups.values())
+
+    def close(self):
+        for app in self.partitions:
+            app.close()
+        if self.routes is not None:
+            self.routes.close()
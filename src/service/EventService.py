@@ -1,28 +1,108 @@
-from eventsourcing.system import SingleThreadedRunner, System
+from eventsourcing.system import System
 
+from concurrent.futures import ThreadPoolExecutor
 from uuid import UUID
 
 from src.application.ProjectApplication import ProjectApplication
 from src.application.ProjectIndexProcessApplication import ProjectIndexProcessApplication
+from src.application.DocumentIndexProcessApplication import DocumentIndexProcessApplication
+from src.application.ProjectReadModelProcessApplication import ProjectReadModelProcessApplication
 from src.application.DocumentApplication import DocumentApplication
+from src.domain.DocumentAggregate import DocumentAggregate
+from src.domain.ProjectAggregate import ProjectAggregate
+from src.domain.ProjectIndexAggregate import ProjectIndexAggregate
+from src.service.AggregateCache import AggregateCache
+from src.service.AggregateLocks import AggregateLocks
+from src.service.DocumentPartitions import DocumentPartitions
+from src.service.ThreadSafeRunner import ThreadSafeRunner
 from src.util import logwrapper
 
 class EventService:
 
-    def __init__(self):
+    def __init__(self, config: dict = None):
         logwrapper.info(f'Initializing EventService[{hex(id(self))}]...')
 
         self._system = System(pipes = [
             [ProjectApplication, ProjectIndexProcessApplication],
+            [ProjectApplication, DocumentIndexProcessApplication],
+            [ProjectApplication, ProjectReadModelProcessApplication],
             [DocumentApplication]
         ])
-        self._runner = SingleThreadedRunner(self._system)
+        # The service is shared by the request threads and the listener thread.
+        # Changes of one aggregate are serialized with the aggregate locks.
+        self._runner = ThreadSafeRunner(self._system)
         self._runner.start()
+        self._locks = AggregateLocks()
+
+        # The runner owns one long-lived DocumentApplication with its own
+        # recorder and connection pool, so every call below shares it.
+        self._documents = self._runner.get(DocumentApplication)
+
+        # Documents of projects in the partitions of the event store, if configured.
+        partitions = int((config or {}).get('event_store', {}).get('partitions', 0))
+        self._partitions = DocumentPartitions(self._documents, partitions)
+
+        # Configured before the catch-up below, so the replay already uses the snapshot intervals.
+        if config is not None:
+            self._configure_snapshotting(config.get('snapshot_intervals', {}))
+
+            # Retries of project changes after version conflicts with other writers.
+            writes_config = config.get('project_writes', {})
+            projects = self._runner.get(ProjectApplication)
+            projects.max_retries = int(writes_config.get('max_retries', projects.max_retries))
+            projects.retry_backoff = float(writes_config.get('retry_backoff', projects.retry_backoff))
+
+        # Rows for the read endpoints. Catch up with events recorded before
+        # the read model existed or while it wasn't running.
+        self._read_model = self._runner.get(ProjectReadModelProcessApplication)
+        self._read_model.pull_and_process(ProjectApplication.name)
+
+        # The same for the project index and the document index, the runner only
+        # processes the events recorded while it runs.
+        for index_cls in [ProjectIndexProcessApplication, DocumentIndexProcessApplication]:
+            self._runner.get(index_cls).pull_and_process(ProjectApplication.name)
+
+        # Cache for reconstructed project and document aggregates.
+        cache_config = (config or {}).get('aggregate_cache', {})
+        self._cache = AggregateCache(max_bytes=int(cache_config.get('max_bytes', 256 * 1024 * 1024)),
+                                     check_versions=cache_config.get('check_versions', True))
+
+        # Workers for loading many aggregates at once.
+        self._loader = ThreadPoolExecutor(max_workers=int((config or {}).get('load_workers', 8)))
+
+    # Set the snapshot interval per aggregate type, e.g. {"ProjectAggregate": 100, "DocumentAggregate": 50}.
+    # An interval of 0 disables automatic snapshots for that aggregate type.
+    def _configure_snapshotting(self, intervals: dict):
+        apps = [(self._runner.get(ProjectApplication), ProjectAggregate),
+                (self._runner.get(ProjectIndexProcessApplication), ProjectIndexAggregate)]
+        apps += [(documents, DocumentAggregate) for documents in self._partitions.apps()]
+        for app, aggregate_cls in apps:
+            if aggregate_cls.__name__ not in intervals:
+                continue
+
+            interval = int(intervals[aggregate_cls.__name__])
+            app.snapshotting_intervals = {aggregate_cls: interval} if interval > 0 else {}
+
+            logwrapper.info(f'EventService[{hex(id(self))}]: Snapshot interval for {aggregate_cls.__name__} is {interval}.')
 
     def shutdown(self):
         logwrapper.info(f'Shutting down EventService[{hex(id(self))}]...')
+        self._loader.shutdown()
+        self._partitions.close()
         self._runner.stop()
 
+    # Hit, miss and eviction counters of the aggregate cache.
+    def get_cache_stats(self):
+        return self._cache.stats()
+
+    # Number of changes that had to wait for another change of the same aggregate (lock stripe).
+    def get_lock_waits(self):
+        return self._locks.waits
+
+    # Version conflicts and retries of project changes.
+    def get_project_write_stats(self):
+        return self._runner.get(ProjectApplication).get_write_stats()
+
     # Get a project
     def get_project(self, project_id: str):
         logwrapper.info(f'EventService[{hex(id(self))}]: Loading project {project_id}.')
@@ -30,9 +110,9 @@ class EventService:
         project_id = UUID(project_id)
         projects = self._runner.get(ProjectApplication)
 
-        return projects.get_project(project_id)
+        return self._cache.get(projects, project_id)
 
-    # Get all projects
+    # Get all projects, loaded in parallel by the loader workers
     def get_all_projects(self):
         logwrapper.info(f'EventService[{hex(id(self))}]: Loading all projects.')
 
@@ -40,7 +120,39 @@ class EventService:
         projects = self._runner.get(ProjectApplication)
 
         project_ids = indices.get_all_project_ids()
-        return [projects.get_project(project_id) for project_id in project_ids]
+        return list(self._loader.map(lambda project_id: self._cache.get(projects, project_id), project_ids))
+
+    # Get the read model row of a project, None if it doesn't exist.
+    def get_project_row(self, project_id: str):
+        return self._read_model.get_project(str(UUID(project_id)))
+
+    # Get the read model rows of all (not deleted) projects.
+    def get_project_rows(self):
+        return self._read_model.get_projects()
+
+    # Get the document ids of several projects from the read model.
+    def get_project_document_ids(self, project_ids: list):
+        return self._read_model.get_document_ids(project_ids)
+
+    # Get a page of the read model rows of the documents of a project, after the cursor of the previous page.
+    # Filters: labelled (bool), labelled_by (user id), max_ner_f1 and max_rel_f1 (aiStats below the value).
+    # Returns the rows and the cursor of the next page, None if there are no more rows.
+    def get_document_rows(self, project_id: str, cursor: int = 0, limit: int = None, **filters):
+        documents = self._read_model.get_documents(str(UUID(project_id)), cursor, limit, **filters)
+
+        next_cursor = documents[-1][0] if limit is not None and len(documents) == limit else None
+        return [row for _, row in documents], next_cursor
+
+    # Get all (not deleted) projects a document is part of
+    def get_document_projects(self, doc_id: str):
+        logwrapper.info(f'EventService[{hex(id(self))}]: Loading projects of document {doc_id}.')
+
+        indices = self._runner.get(DocumentIndexProcessApplication)
+        projects = self._runner.get(ProjectApplication)
+
+        project_ids = indices.get_project_ids(UUID(doc_id))
+        return [project for project in (self._cache.get(projects, project_id) for project_id in project_ids)
+                if not project.deleted]
 
     # Create a project
     def create_project(self, name: str, date: str, creator: str, labelSetId: str, relationSetId: str):
@@ -55,35 +167,58 @@ class EventService:
         logwrapper.info(f'EventService[{hex(id(self))}]: Deleting project {project_id}.')
 
         projects = self._runner.get(ProjectApplication)
-        projects.delete_project(UUID(project_id))
+        with self._locks(project_id):
+            projects.delete_project(UUID(project_id))
+        self._cache.mark_stale(UUID(project_id))
 
     # Update a project
     def update_project(self, project_id: str, name: str, creator: str):
         logwrapper.info(f'EventService[{hex(id(self))}]: Update project {project_id}.')
 
         projects = self._runner.get(ProjectApplication)
-        projects.update_project(UUID(project_id), name, creator)
+        with self._locks(project_id):
+            projects.update_project(UUID(project_id), name, creator)
+        self._cache.mark_stale(UUID(project_id))
 
     # Add documents to project
     def add_document(self, project_id: str, doc_id: str):
         logwrapper.info(f'EventService[{hex(id(self))}]: Adding document {doc_id} to project {project_id}.')
 
         projects = self._runner.get(ProjectApplication)
-        projects.add_document(UUID(project_id), UUID(doc_id))
+        with self._locks(project_id):
+            projects.add_document(UUID(project_id), UUID(doc_id))
+        self._cache.mark_stale(UUID(project_id))
+
+    # Add many documents to a project, one DocumentsAdded event per chunk.
+    # Returns the number of added documents and of duplicates.
+    def add_documents(self, project_id: str, doc_ids: list, chunk_size: int = 1000):
+        logwrapper.info(f'EventService[{hex(id(self))}]: Adding {len(doc_ids)} documents to project {project_id}.')
+
+        projects = self._runner.get(ProjectApplication)
+        with self._locks(project_id):
+            added, duplicates = projects.add_documents(UUID(project_id), [UUID(str(doc_id)) for doc_id in doc_ids],
+                                                       chunk_size)
+        self._cache.mark_stale(UUID(project_id))
+
+        return added, duplicates
 
     # Remove a document from the project
     def remove_document(self, project_id: str, doc_id: str):
         logwrapper.info(f'EventService[{hex(id(self))}]: Removing document {doc_id} from project {project_id}.')
 
         projects = self._runner.get(ProjectApplication)
-        projects.remove_document(UUID(project_id), UUID(doc_id))
+        with self._locks(project_id):
+            projects.remove_document(UUID(project_id), UUID(doc_id))
+        self._cache.mark_stale(UUID(project_id))
 
     # Mark document as labelled
     def mark_document(self, project_id: str, doc_id: str, user_id: str, ai_stats: dict):
         logwrapper.info(f'EventService[{hex(id(self))}]: Marking document {doc_id} from project {project_id} as labelled by user {user_id}.')
 
         projects = self._runner.get(ProjectApplication)
-        projects.mark_document(UUID(project_id), UUID(doc_id), user_id, ai_stats)
+        with self._locks(project_id):
+            projects.mark_document(UUID(project_id), UUID(doc_id), user_id, ai_stats)
+        self._cache.mark_stale(UUID(project_id))
 
     # UNMark document => not labelled
     def unmark_document(self, project_id: str, doc_id: str,):
@@ -91,14 +226,16 @@ class EventService:
             f'EventService[{hex(id(self))}]: Unmarking document {doc_id} from project {project_id}.')
 
         projects = self._runner.get(ProjectApplication)
-        projects.unmark_document(UUID(project_id), UUID(doc_id))
+        with self._locks(project_id):
+            projects.unmark_document(UUID(project_id), UUID(doc_id))
+        self._cache.mark_stale(UUID(project_id))
 
     # Create a document.
     # In this case a document saves labels and relations
     # for one document, in one project for one specific user.
-    def create_document(self):
-        documents = DocumentApplication()
-        doc_id = documents.create_document()
+    # It is stored in the partition of the project (see DocumentPartitions).
+    def create_document(self, project_id: str = None):
+        doc_id = self._partitions.create_document(project_id)
 
         logwrapper.info(f'EventService[{hex(id(self))}]: Creating document {doc_id}.')
         return doc_id
@@ -107,36 +244,89 @@ class EventService:
     def update_document(self, doc_id: str, entities, sentence_entities, relations):
         logwrapper.info(f'EventService[{hex(id(self))}]: Updating document {doc_id}.')
 
-        documents = DocumentApplication()
-        documents.update(UUID(doc_id), entities, sentence_entities, relations)
+        documents = self._partitions.app(doc_id)
+        with self._locks(doc_id):
+            documents.update(UUID(doc_id), entities, sentence_entities, relations)
+        self._cache.mark_stale(UUID(doc_id))
 
     # Update recommended entities and Relations for a document
     def update_document_rec(self, doc_id: str, rec_entities, rec_sentence_entities, rec_relations):
         logwrapper.info(f'EventService[{hex(id(self))}]: Updating recommendations for document {doc_id}.')
 
-        documents = DocumentApplication()
-        documents.update_rec(UUID(doc_id), rec_entities, rec_sentence_entities, rec_relations)
+        documents = self._partitions.app(doc_id)
+        with self._locks(doc_id):
+            documents.update_rec(UUID(doc_id), rec_entities, rec_sentence_entities, rec_relations)
+        self._cache.mark_stale(UUID(doc_id))
+
+    # Apply JSON-patch style operations to a document at the expected version. Returns the new version.
+    def apply_document_operations(self, doc_id: str, operations: list, expected_version: int):
+        logwrapper.info(f'EventService[{hex(id(self))}]: Applying {len(operations)} operations to document {doc_id}.')
+
+        documents = self._partitions.app(doc_id)
+        try:
+            with self._locks(doc_id):
+                return documents.apply_operations(UUID(doc_id), operations, expected_version)
+        finally:
+            self._cache.mark_stale(UUID(doc_id))
 
     # Set recommended entities and Relations for a document
     def set_document_rec(self, doc_id: str, rec_entities, rec_sentence_entities, rec_relations):
         logwrapper.info(f'EventService[{hex(id(self))}]: Setting recommendations for document {doc_id}.')
 
-        documents = DocumentApplication()
-        documents.set_rec(UUID(doc_id), rec_entities, rec_sentence_entities, rec_relations)
+        documents = self._partitions.app(doc_id)
+        with self._locks(doc_id):
+            documents.set_rec(UUID(doc_id), rec_entities, rec_sentence_entities, rec_relations)
+        self._cache.mark_stale(UUID(doc_id))
 
     # Reset labels for a document.
     def reset_document(self, doc_id: str):
         logwrapper.info(f'EventService[{hex(id(self))}]: Reseting document {doc_id}.')
 
-        documents = DocumentApplication()
-        documents.update(UUID(doc_id), {}, [], {})
-        documents.update_rec(UUID(doc_id), {}, [], {})
+        documents = self._partitions.app(doc_id)
+        with self._locks(doc_id):
+            documents.reset_documents([UUID(doc_id)])
+        self._cache.mark_stale(UUID(doc_id))
+
+    # Reset labels for many documents and unmark them in their projects.
+    # entries are (doc register id, project id, doc id) tuples.
+    # Documents are reset in batches and each project is saved once.
+    # A batch only holds a few lock stripes, so the other requests don't wait for the whole reset.
+    def reset_documents(self, entries: list, batch_size: int = 500):
+        logwrapper.info(f'EventService[{hex(id(self))}]: Reseting {len(entries)} documents.')
+
+        register_ids = [UUID(str(register_id)) for register_id, _, _ in entries]
+        for documents, doc_register_ids in self._partitions.group(register_ids):
+            for batch in self._locks.batches(doc_register_ids, batch_size):
+                with self._locks(*batch):
+                    documents.reset_documents(batch)
+        for register_id in register_ids:
+            self._cache.mark_stale(register_id)
+
+        by_project = {}
+        for _, project_id, doc_id in entries:
+            by_project.setdefault(project_id, []).append(UUID(doc_id))
+
+        projects = self._runner.get(ProjectApplication)
+        for project_id, doc_ids in by_project.items():
+            with self._locks(project_id):
+                projects.unmark_documents(UUID(project_id), doc_ids)
+            self._cache.mark_stale(UUID(project_id))
 
     # Get one document
     def get_document(self, doc_id: str):
         logwrapper.info(f'EventService[{hex(id(self))}]: Loading document {doc_id}.')
 
         doc_id = UUID(doc_id)
-        documents = DocumentApplication()
+        documents = self._partitions.app(doc_id)
+
+        return self._cache.get(documents, doc_id)
+
+    # Get several documents at once, in the given order.
+    # Documents that are not cached are loaded in parallel.
+    def get_documents(self, doc_ids: list):
+        logwrapper.info(f'EventService[{hex(id(self))}]: Loading {len(doc_ids)} documents.')
+
+        partitions = self._partitions
 
-        return documents.get(doc_id)
\ No newline at end of file
+        return list(self._loader.map(lambda doc_id: self._cache.get(partitions.app(doc_id), UUID(str(doc_id))),
+                                     doc_ids))
@@ -0,0 +1,42 @@
+from eventsourcing.system import SingleThreadedRunner
+
+from threading import Lock, get_ident
+
+
+# Runner for a system used by several request threads at once.
+# Like the SingleThreadedRunner the followers process new events in the thread that recorded them,
+# one thread at a time. The SingleThreadedRunner returns immediately if another thread is processing,
+# so a request could read the read model before its own events were processed.
+# Here the thread waits for the processing lock and the events it recorded are processed
+# before its save returns.
+class ThreadSafeRunner(SingleThreadedRunner):
+
+    def __init__(self, system, env=None):
+        super().__init__(system, env)
+        self._processing_lock = Lock()
+        self._processing_thread = None
+
+    def receive_recording_event(self, recording_event):
+        with self._prompted_names_lock:
+            self._prompted_names.add(recording_event.application_name)
+
+        # events recorded while processing are picked up by the loop below
+        if self._processing_thread == get_ident():
+            return
+
+        with self._processing_lock:
+            self._processing_thread = get_ident()
+            try:
+                while True:
+                    with self._prompted_names_lock:
+                        prompted_names = self._prompted_names
+                        self._prompted_names = set()
+
+                    if not prompted_names:
+                        break
+
+                    for leader_name in prompted_names:
+                        for follower_name in self.system.leads[leader_name]:
+                            self.apps[follower_name].pull_and_process(leader_name)
+            finally:
+                self._processing_thread = None
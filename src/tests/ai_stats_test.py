@@ -0,0 +1,135 @@
+import random
+import unittest
+
+from src.util.ai_stats import get_ai_stats
+
+
+# The previous pairwise implementation, used as reference.
+def reference_ai_stats(ent_preds, ent_golden, rel_preds, rel_golden):
+    if len(ent_golden) == 0 and len(rel_golden) == 0:
+        return {
+            'ner_f1': -1,
+            'rel_f1': -1
+        }
+
+    ent_tp = 0
+    for _, pred in ent_preds.items():
+        for _, golden in ent_golden.items():
+            if (pred['sentenceIndex'] == golden['sentenceIndex'] and pred['type'] == golden['type'] and
+                    pred['start'] == golden['start'] and pred['end'] == golden['end']):
+                ent_tp += 1
+
+    ent_fp = len(ent_preds) - ent_tp
+    ent_fn = len(ent_golden) - ent_tp
+
+    if ent_fp == 0 and ent_tp == 0 and ent_fn == 0:
+        ent_f1_micro = 0
+    else:
+        ent_f1_micro = (2 * ent_tp) / (2 * ent_tp + ent_fp + ent_fn + 1e-6)
+
+    rel_tp = 0
+    for _, pred in rel_preds.items():
+        for _, golden in rel_golden.items():
+            p_head, p_tail = ent_preds[pred['head']], ent_preds[pred['tail']]
+            g_head, g_tail = ent_golden[golden['head']], ent_golden[golden['tail']]
+            if (pred['type'] == golden['type'] and
+                    all(p_head[k] == g_head[k] for k in ['sentenceIndex', 'start', 'end', 'type']) and
+                    all(p_tail[k] == g_tail[k] for k in ['sentenceIndex', 'start', 'end', 'type'])):
+                rel_tp += 1
+
+    rel_fp = len(rel_preds) - rel_tp
+    rel_fn = len(rel_golden) - rel_tp
+
+    if rel_fp == 0 and rel_tp == 0 and rel_fn == 0:
+        rel_f1_micro = 0
+    else:
+        rel_f1_micro = (2 * rel_tp) / (2 * rel_tp + rel_fp + rel_fn + 1e-6)
+
+    return {
+        'ner_f1': ent_f1_micro * 100,
+        'rel_f1': rel_f1_micro * 100
+    }
+
+
+# Random entities and relations without duplicate spans.
+# A share of the predictions copies golden spans and relations.
+def random_document(rng, num_entities, num_relations, overlap=0.7):
+    def span(sentence):
+        start = rng.randrange(0, 40)
+        return sentence, rng.choice(['PER', 'LOC', 'ORG']), start, start + rng.randrange(1, 5)
+
+    golden_spans = set()
+    while len(golden_spans) < num_entities:
+        golden_spans.add(span(rng.randrange(0, max(1, num_entities // 10))))
+
+    pred_spans = set(span for span in golden_spans if rng.random() < overlap)
+    while len(pred_spans) < num_entities:
+        pred_spans.add(span(rng.randrange(0, max(1, num_entities // 10))))
+
+    def entities(spans, prefix):
+        return {f'{prefix}{i}': {'sentenceIndex': s, 'type': t, 'start': b, 'end': e}
+                for i, (s, t, b, e) in enumerate(sorted(spans))}
+
+    ent_golden = entities(golden_spans, 'g')
+    ent_preds = entities(pred_spans, 'p')
+
+    pred_ids = {(e['sentenceIndex'], e['type'], e['start'], e['end']): _id for _id, e in ent_preds.items()}
+
+    # there are only so many distinct relations between few entities
+    num_relations = min(num_relations, len(ent_golden) * (len(ent_golden) - 1), len(ent_preds) * (len(ent_preds) - 1))
+
+    golden_rels = set()
+    while len(golden_rels) < num_relations and len(ent_golden) > 1:
+        head, tail = rng.sample(sorted(ent_golden), 2)
+        golden_rels.add((rng.choice(['works_for', 'lives_in']), head, tail))
+
+    pred_rels = set()
+    for rel_type, head, tail in golden_rels:
+        head_key = tuple(ent_golden[head].values())
+        tail_key = tuple(ent_golden[tail].values())
+        if rng.random() < overlap and head_key in pred_ids and tail_key in pred_ids:
+            pred_rels.add((rel_type, pred_ids[head_key], pred_ids[tail_key]))
+    while len(pred_rels) < num_relations and len(ent_preds) > 1:
+        head, tail = rng.sample(sorted(ent_preds), 2)
+        pred_rels.add((rng.choice(['works_for', 'lives_in']), head, tail))
+
+    def relations(rels, prefix):
+        return {f'{prefix}{i}': {'type': t, 'head': h, 'tail': ta} for i, (t, h, ta) in enumerate(sorted(rels))}
+
+    return ent_preds, ent_golden, relations(pred_rels, 'pr'), relations(golden_rels, 'gr')
+
+
+class TestAiStats(unittest.TestCase):
+
+    # Same numbers as the pairwise implementation on random documents
+    def test_matches_reference(self):
+        rng = random.Random(42)
+
+        for _ in range(200):
+            doc = random_document(rng, rng.randrange(0, 30), rng.randrange(0, 20), overlap=rng.random())
+
+            expected = reference_ai_stats(*doc)
+            result = get_ai_stats(*doc)
+
+            self.assertAlmostEqual(result['ner_f1'], expected['ner_f1'])
+            self.assertAlmostEqual(result['rel_f1'], expected['rel_f1'])
+
+    def test_no_golden(self):
+        self.assertEqual(get_ai_stats({}, {}, {}, {}), {'ner_f1': -1, 'rel_f1': -1})
+
+    # A duplicated prediction can only match one golden span
+    def test_duplicate_spans(self):
+        ent = {'sentenceIndex': 0, 'type': 'PER', 'start': 0, 'end': 2}
+
+        stats = get_ai_stats({'p1': dict(ent), 'p2': dict(ent)}, {'g1': dict(ent)}, {}, {})
+        self.assertAlmostEqual(stats['ner_f1'], 100 * 2 / (2 + 1 + 1e-6))
+
+        stats = get_ai_stats({'p1': dict(ent)}, {'g1': dict(ent), 'g2': dict(ent)}, {}, {})
+        self.assertAlmostEqual(stats['ner_f1'], 100 * 2 / (2 + 1 + 1e-6))
+
+        stats = get_ai_stats({'p1': dict(ent), 'p2': dict(ent)}, {'g1': dict(ent), 'g2': dict(ent)}, {}, {})
+        self.assertAlmostEqual(stats['ner_f1'], 100 * 4 / (4 + 1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from src.util.dispatcher import Dispatcher
+
+
+# Local stand-in for the document and ai service.
+# Records the requests and fails the first `failures` of them with a 503.
+class StubService:
+
+    def __init__(self, failures=0):
+        self.requests = []
+        self.failures = failures
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if stub.failures > 0:
+                    stub.failures -= 1
+                    self.send_response(503)
+                else:
+                    stub.requests.append((self.command, self.path, body))
+                    self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            do_POST = _handle
+            do_PATCH = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.address = f'http://127.0.0.1:{self.server.server_address[1]}'
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.doc_service = StubService()
+        self.ai_service = StubService(failures=2)
+        self.dispatcher = Dispatcher({
+            'doc_address': self.doc_service.address,
+            'ai_address': self.ai_service.address,
+            'dispatcher': {'backoff': 0.01}
+        })
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+        self.doc_service.stop()
+        self.ai_service.stop()
+
+    def test_dispatch(self):
+        self.dispatcher.send_update_to_document_service('doc', {'userId': 'user'})
+        self.dispatcher.send_ai_training_request({'project_id': 'p'})
+        self.dispatcher.join()
+
+        self.assertEqual(self.doc_service.requests, [('PATCH', '/api/v1/documents/doc', {'userId': 'user'})])
+        self.assertEqual(self.ai_service.requests, [('POST', '/api/v1/train', {'project_id': 'p'})])
+
+        stats = self.dispatcher.stats()
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(stats['queueDepth'], 0)
+
+    def test_give_up(self):
+        self.ai_service.failures = 10
+
+        responses = []
+        self.dispatcher.send_ai_prediction_request({'project_id': 'p'}, on_done=responses.append)
+        self.dispatcher.join()
+
+        self.assertEqual(responses, [None])
+        self.assertEqual(self.dispatcher.stats()['failed'], 1)
+        self.assertEqual(self.dispatcher.stats()['retries'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
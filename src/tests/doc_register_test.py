@@ -0,0 +1,101 @@
+import unittest
+
+from threading import Barrier, Lock, Thread
+from uuid import uuid4
+
+from pymongo.errors import DuplicateKeyError
+
+from src.util.doc_register import get_or_create_entry
+
+
+# In-memory stand-in for the doc_register collection with the unique
+# {project_id, doc_id, user_id} index.
+class UniqueCollection:
+
+    def __init__(self):
+        self.rows = {}
+        self.upserts = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(query):
+        return query['project_id'], query['doc_id'], query['user_id']
+
+    def find_one(self, query):
+        with self._lock:
+            row = self.rows.get(self._key(query))
+            return dict(row) if row else None
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        with self._lock:
+            self.upserts += 1
+            key = self._key(query)
+            if key not in self.rows:
+                self.rows[key] = {**query, **update['$setOnInsert']}
+            return dict(self.rows[key])
+
+
+# Stand-in for the event service that records the created documents.
+class DocumentCreator:
+
+    def __init__(self):
+        self.created = []
+
+    def create_document(self, project_id=None):
+        doc_id = uuid4()
+        self.created.append(doc_id)
+        return doc_id
+
+
+class TestDocRegister(unittest.TestCase):
+
+    def test_get_or_create(self):
+        doc_register = UniqueCollection()
+        creator = DocumentCreator()
+
+        entry = get_or_create_entry(doc_register, creator, 'p', 'd', 'u')
+        self.assertEqual(entry['_id'], str(creator.created[0]))
+        self.assertEqual(entry['id'], entry['_id'])
+
+        # existing entries are found without an upsert
+        self.assertEqual(get_or_create_entry(doc_register, creator, 'p', 'd', 'u'), entry)
+        self.assertEqual(doc_register.upserts, 1)
+        self.assertEqual(len(creator.created), 1)
+
+        self.assertNotEqual(get_or_create_entry(doc_register, creator, 'p', 'd', 'u2')['_id'], entry['_id'])
+
+    def test_concurrent_creation(self):
+        doc_register = UniqueCollection()
+        creator = DocumentCreator()
+        barrier = Barrier(8)
+        results = []
+
+        def create():
+            barrier.wait()
+            results.append(get_or_create_entry(doc_register, creator, 'p', 'd', 'u')['_id'])
+
+        threads = [Thread(target=create) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(doc_register.rows), 1)
+        self.assertEqual(len(set(results)), 1)
+
+    def test_duplicate_key(self):
+        # the upsert of a concurrent request can fail on the unique index instead of matching
+        doc_register = UniqueCollection()
+        existing = {'project_id': 'p', 'doc_id': 'd', 'user_id': 'u', '_id': 'x', 'id': 'x'}
+
+        def find_one_and_update(*args, **kwargs):
+            doc_register.rows[('p', 'd', 'u')] = existing
+            raise DuplicateKeyError('duplicate key')
+
+        doc_register.find_one_and_update = find_one_and_update
+
+        self.assertEqual(get_or_create_entry(doc_register, DocumentCreator(), 'p', 'd', 'u'), existing)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import queue
+import time
+import unittest
+
+from threading import Lock
+from types import SimpleNamespace
+
+from src.util.listener import ConcurrentConsumer
+
+
+# In-memory stand-in for a RabbitMQ connection and channel.
+# Delivers messages while less than `prefetch` are unacknowledged and runs
+# callbacks scheduled from other threads on the consuming thread, like pika.
+class InMemoryBroker:
+
+    def __init__(self, prefetch):
+        self.prefetch = prefetch
+        self.acked = set()
+        self.nacked = set()
+        self.ack_calls = 0
+        self._unacked = set()
+        self._callbacks = queue.Queue()
+
+    def add_callback_threadsafe(self, callback):
+        self._callbacks.put(callback)
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        assert delivery_tag in self._unacked, f'unknown delivery tag {delivery_tag}'
+        tags = [tag for tag in self._unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+        self._unacked.difference_update(tags)
+        self.acked.update(tags)
+        self.ack_calls += 1
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        assert delivery_tag in self._unacked, f'unknown delivery tag {delivery_tag}'
+        self._unacked.remove(delivery_tag)
+        self.nacked.add(delivery_tag)
+
+    # Deliver all messages ([(type, body)]) to the callback and wait until they are settled.
+    def consume(self, on_message, messages):
+        pending = list(enumerate(messages, start=1))
+
+        while len(pending) > 0 or len(self._unacked) > 0:
+            while len(pending) > 0 and len(self._unacked) < self.prefetch:
+                tag, (msg_type, body) = pending.pop(0)
+                self._unacked.add(tag)
+                on_message(self, SimpleNamespace(delivery_tag=tag), SimpleNamespace(headers={'type': msg_type}),
+                           json.dumps(body).encode())
+
+            try:
+                self._callbacks.get(timeout=5)()
+            except queue.Empty:
+                raise AssertionError('messages are not settled')
+
+
+class TestConcurrentConsumer(unittest.TestCase):
+
+    # Messages of one document are handled in order and all messages are acknowledged
+    def test_order_and_acks(self):
+        handled = []
+        lock = Lock()
+
+        def handler(msg_type, body):
+            time.sleep(0.001)
+            with lock:
+                handled.append((msg_type, body.get('document_id'), body.get('n')))
+            if body.get('fail'):
+                raise ValueError('fail')
+
+        messages = [('ai_update', {'document_id': f'd{i % 5}', 'n': i}) for i in range(100)]
+        messages.insert(50, ('document_modified', {'document_ids': ['d1', 'd2']}))
+        messages.insert(70, ('ai_update', {'document_id': 'd3', 'n': -1, 'fail': True}))
+
+        broker = InMemoryBroker(prefetch=20)
+        consumer = ConcurrentConsumer(broker, broker, handler, workers=4, ack_batch=5)
+        broker.consume(consumer.on_message, messages)
+        consumer.shutdown()
+
+        self.assertEqual(broker.nacked, {71})
+        self.assertEqual(broker.acked, set(range(1, 103)) - {71})
+        self.assertLess(broker.ack_calls, 102)
+
+        for doc in ['d0', 'd1', 'd2', 'd3', 'd4']:
+            numbers = [n for _, d, n in handled if d == doc and n != -1]
+            self.assertEqual(numbers, sorted(numbers))
+
+        # everything before the document_modified message is done before it, nothing after it
+        barrier_index = handled.index(('document_modified', None, None))
+        self.assertEqual(sorted(n for _, _, n in handled[:barrier_index]), list(range(50)))
+
+
+if __name__ == '__main__':
+    unittest.main()
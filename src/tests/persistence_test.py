@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from datetime import datetime, timezone
+from threading import Barrier, Thread, get_ident
+from uuid import UUID
+
+from eventsourcing.persistence import DatetimeAsISO, IntegrityError, UUIDAsHex
+from eventsourcing.utils import get_topic
+
+from src.application.DocumentApplication import DocumentApplication
+from src.application.ProjectApplication import ProjectApplication
+from src.tools.migrate_event_store import migrate
+from src.tools.split_event_store import split
+from src.util.partitions import DocumentRoutes, partition_db_name
+from src.util.persistence import Factory, OrjsonTranscoder, ZlibCompressor, default_pragmas
+
+
+class TestPersistence(unittest.TestCase):
+
+    def test_orjson_transcoder(self):
+        transcoder = OrjsonTranscoder()
+        transcoder.register(DatetimeAsISO())
+        transcoder.register(UUIDAsHex())
+
+        timestamp = datetime(2022, 10, 1, tzinfo=timezone.utc)
+        doc_id = UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')
+        for obj in [{'timestamp': timestamp, 'entities': {'e1': {'type': '"_type_"'}}, 'relations': {}},
+                    {'timestamp': timestamp, 'doc_ids': [doc_id], 'state': {'_created_on': timestamp}},
+                    {'value': 2 ** 70, 'names': ['a', 'b']}]:
+            self.assertEqual(transcoder.decode(transcoder.encode(obj)), obj)
+
+    def test_compression_and_migration(self):
+        db_name = os.path.join(tempfile.mkdtemp(), 'events.sqlite')
+        env = {'PERSISTENCE_MODULE': get_topic(Factory), 'SQLITE_DBNAME': db_name,
+               'TRANSCODER_TOPIC': get_topic(OrjsonTranscoder)}
+        compressed_env = dict(env, COMPRESSOR_TOPIC=get_topic(ZlibCompressor))
+
+        def states():
+            connection = sqlite3.connect(db_name)
+            rows = connection.execute('SELECT state FROM stored_events UNION ALL SELECT state FROM stored_snapshots')
+            result = [state for (state,) in rows]
+            connection.close()
+            return result
+
+        documents = DocumentApplication(env=env)
+        documents.snapshotting_intervals = {}
+        doc_id = documents.create_document()
+        documents.set_rec(doc_id, {'e1': {'type': 'PER'}}, [['e1']], {})
+        documents.update(doc_id, {'e1': {'type': 'LOC'}}, [['e1']], {})
+        documents.take_snapshot(doc_id)
+        documents.close()
+
+        # events written before compression was turned on are still read
+        documents = DocumentApplication(env=compressed_env)
+        documents.snapshotting_intervals = {}
+        doc = documents.get(doc_id)
+        self.assertEqual(doc.entities, {'e1': {'type': 'LOC'}})
+        # rec and orig share one dict
+        self.assertIs(doc.rec_entities, doc.orig_entity_preds)
+        documents.update(doc_id, {'e2': {'type': 'PER'}}, [['e2']], {})
+        documents.close()
+
+        self.assertEqual(migrate(db_name, 'zlib'), 4)
+        self.assertTrue(all(state.startswith(ZlibCompressor.prefix) for state in states()))
+        self.assertEqual(migrate(db_name, 'zlib'), 0)
+
+        documents = DocumentApplication(env=compressed_env)
+        self.assertEqual(documents.get(doc_id).entities, {'e2': {'type': 'PER'}})
+        documents.close()
+
+        self.assertEqual(migrate(db_name, None), 5)
+        self.assertTrue(all(state.startswith(b'{') for state in states()))
+
+        documents = DocumentApplication(env=env)
+        self.assertEqual(documents.get(doc_id).entities, {'e2': {'type': 'PER'}})
+        self.assertEqual(documents.get(doc_id).orig_entity_preds, {'e1': {'type': 'PER'}})
+        documents.close()
+
+        # UUIDs nested in project events and snapshots
+        projects = ProjectApplication(env=compressed_env)
+        project_id = projects.create_project('name', 'date', 'creator', UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'),
+                                             UUID('aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+        projects.add_documents(project_id, [UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')])
+        projects.take_snapshot(project_id)
+        project = projects.get_project(project_id)
+        self.assertEqual(list(project.documents), [UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')])
+        self.assertEqual(project.labelSetId, UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'))
+        projects.close()
+
+    def test_group_commit(self):
+        env = {'PERSISTENCE_MODULE': get_topic(Factory),
+               'SQLITE_DBNAME': os.path.join(tempfile.mkdtemp(), 'events.sqlite'),
+               'SQLITE_PRAGMAS': ';'.join(f'{name}={value}' for name, value in default_pragmas.items()),
+               'GROUP_COMMIT_WINDOW': '0.01'}
+        documents = DocumentApplication(env=env)
+        documents.snapshotting_intervals = {}
+        doc_ids = [documents.create_document() for _ in range(8)]
+
+        with documents.factory.datastore.transaction(commit=False) as c:
+            c.execute('PRAGMA synchronous')
+            self.assertEqual(c.fetchone()[0], 2)
+
+        # two saves of the same document version and six other saves at once
+        conflicting = [documents.get(doc_ids[0]), documents.get(doc_ids[0])]
+        errors = []
+        barrier = Barrier(8)
+
+        def save(i):
+            barrier.wait()
+            try:
+                if i < 2:
+                    conflicting[i].update({'e1': {'type': f'T{i}'}}, [], {})
+                    documents.save(conflicting[i])
+                else:
+                    documents.update(doc_ids[i], {'e1': {'type': 'PER'}}, [], {})
+            except IntegrityError as e:
+                errors.append(e)
+
+        threads = [Thread(target=save, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 1)
+        self.assertIn(documents.get(doc_ids[0]).entities, [{'e1': {'type': 'T0'}}, {'e1': {'type': 'T1'}}])
+        for doc_id in doc_ids[2:]:
+            self.assertEqual(documents.get(doc_id).entities, {'e1': {'type': 'PER'}})
+        self.assertLess(documents.recorder.group_commits, documents.recorder.grouped_saves)
+
+        # under sustained saves every leader only commits the group with its own batch:
+        # with one save per group each save commits exactly once, whatever the other threads do
+        documents.recorder.group_commit_max_events = 1
+        commits = {}
+        commit_group = documents.recorder._commit_group
+
+        def slow_commit_group(group):
+            commits[get_ident()] = commits.get(get_ident(), 0) + 1
+            time.sleep(0.002)
+            commit_group(group)
+
+        documents.recorder._commit_group = slow_commit_group
+
+        def annotate(doc_id):
+            for i in range(10):
+                documents.update(doc_id, {f'e{i}': {'type': 'PER'}}, [], {})
+
+        threads = [Thread(target=annotate, args=(doc_id,)) for doc_id in doc_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(commits.values()), [10] * 8)
+        documents.close()
+
+    def test_split_event_store(self):
+        db_name = os.path.join(tempfile.mkdtemp(), 'events.sqlite')
+        env = {'PERSISTENCE_MODULE': 'eventsourcing.sqlite', 'SQLITE_DBNAME': db_name}
+        documents = DocumentApplication(env=env)
+        documents.snapshotting_intervals = {}
+        doc_ids = [documents.create_document() for _ in range(5)]
+        for doc_id in doc_ids:
+            documents.update(doc_id, {'e1': {'type': 'PER'}}, [], {})
+        documents.take_snapshot(doc_ids[0])
+        documents.close()
+
+        # project ids in partition 0 and 1, the last document stays in the main store
+        project_ids = ['ca6733fa-d416-413c-80e9-ec00baeb2c74', 'ca6733fa-d416-413c-80e9-ec00baeb2c75']
+        routes = [(doc_id, project_ids[i % 2]) for i, doc_id in enumerate(doc_ids[:4])]
+        self.assertEqual(split(db_name, routes, 2), 4)
+        self.assertEqual(split(db_name, routes, 2), 0)
+
+        document_routes = DocumentRoutes(db_name)
+        self.assertEqual([document_routes.get(doc_id) for doc_id in doc_ids], [0, 1, 0, 1, None])
+        document_routes.close()
+
+        for i, doc_id in enumerate(doc_ids):
+            name = partition_db_name(db_name, i % 2) if i < 4 else db_name
+            documents = DocumentApplication(env=dict(env, SQLITE_DBNAME=name))
+            doc = documents.get(doc_id)
+            self.assertEqual((doc.version, doc.entities), (2, {'e1': {'type': 'PER'}}))
+            if i == 0:
+                self.assertEqual(len(list(documents.snapshots.get(doc_id))), 1)
+            documents.close()
+
+        documents = DocumentApplication(env=env)
+        self.assertEqual(len(list(documents.events.get(doc_ids[0]))), 0)
+        documents.close()
@@ -0,0 +1,76 @@
+import time
+import unittest
+
+from src.util.prediction_tracker import PredictionTracker
+
+
+# Stand-in for the dispatcher that records the prediction requests.
+class FakeDispatcher:
+
+    def __init__(self, accept=True):
+        self.requests = []
+        self.callbacks = []
+        self.accept = accept
+
+    def send_ai_prediction_request(self, req, on_done=None):
+        self.requests.append(req)
+        self.callbacks.append(on_done)
+        return self.accept
+
+
+class TestPredictionTracker(unittest.TestCase):
+
+    def test_duplicates_suppressed(self):
+        dispatcher = FakeDispatcher()
+        tracker = PredictionTracker(dispatcher, ttl=60)
+
+        for _ in range(5):
+            tracker.request('p', 'd', {'document_id': 'd'})
+        tracker.request('p', 'd2', {'document_id': 'd2'})
+
+        self.assertEqual(dispatcher.requests, [{'document_id': 'd'}, {'document_id': 'd2'}])
+        self.assertEqual(tracker.stats()['avoided'], 4)
+        self.assertEqual(tracker.stats()['inFlight'], 2)
+
+        # ai_update arrived
+        tracker.clear('p', 'd')
+        self.assertTrue(tracker.request('p', 'd', {'document_id': 'd'}))
+        self.assertEqual(len(dispatcher.requests), 3)
+
+    def test_ttl(self):
+        dispatcher = FakeDispatcher()
+        tracker = PredictionTracker(dispatcher, ttl=0.05)
+
+        self.assertTrue(tracker.request('p', 'd', {}))
+        self.assertFalse(tracker.request('p', 'd', {}))
+        time.sleep(0.1)
+        self.assertTrue(tracker.request('p', 'd', {}))
+        self.assertEqual(tracker.stats()['expired'], 1)
+
+    # the expired request fails after the next one was sent => the next one stays in flight
+    def test_late_failure(self):
+        dispatcher = FakeDispatcher()
+        tracker = PredictionTracker(dispatcher, ttl=0.05)
+
+        self.assertTrue(tracker.request('p', 'd', {}))
+        time.sleep(0.1)
+        self.assertTrue(tracker.request('p', 'd', {}))
+
+        dispatcher.callbacks[0](None)
+        self.assertFalse(tracker.request('p', 'd', {}))
+
+        dispatcher.callbacks[1](None)
+        self.assertTrue(tracker.request('p', 'd', {}))
+
+    # request couldn't be queued => not in flight
+    def test_not_queued(self):
+        dispatcher = FakeDispatcher(accept=False)
+        tracker = PredictionTracker(dispatcher, ttl=60)
+
+        tracker.request('p', 'd', {})
+        tracker.request('p', 'd', {})
+        self.assertEqual(len(dispatcher.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
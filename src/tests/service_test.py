@@ -1,9 +1,25 @@
 import unittest
 import os
+import sqlite3
+import tempfile
 
+from threading import Barrier, Thread
+
+from eventsourcing.utils import get_topic
+from unittest.mock import patch
 from uuid import UUID
 
+from src.application.DocumentApplication import DocumentApplication, DocumentVersionConflict
+from src.application.ProjectApplication import ProjectApplication
+from src.application.ProjectIndexProcessApplication import ProjectIndexProcessApplication
+from src.application.ProjectReadModelProcessApplication import ProjectReadModelProcessApplication
+from src.domain.AggregateSnapshot import AggregateSnapshot
+from src.domain.DocumentAggregate import DocumentAggregate
+from src.domain.ProjectAggregate import ProjectAggregate, DocumentRecord
+from src.domain.ProjectIndexAggregate import ProjectIndexAggregate
+from src.service.AggregateLocks import AggregateLocks
 from src.service.EventService import EventService
+from src.util.serializer import serialize_project, serialize_project_row
 
 class TestEventServie(unittest.TestCase):
 
@@ -26,7 +42,7 @@ class TestEventServie(unittest.TestCase):
         self.assertEqual(project.creator, 'creator2')
         self.assertEqual(project.date, 'date2')
         self.assertEqual(project.labelSetId, UUID('aa6733fa-d416-413c-80e9-ec00baeb2c74'))
-        self.assertEqual(project.documents, [])
+        self.assertEqual(list(project.documents), [])
         self.assertEqual(project.deleted, False)
 
         print('test_create_project finished.')
@@ -53,7 +69,7 @@ class TestEventServie(unittest.TestCase):
         self.assertEqual(project.creator, 'creator')
         self.assertEqual(project.date, 'date')
         self.assertEqual(project.labelSetId, UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'))
-        self.assertEqual(project.documents, [])
+        self.assertEqual(list(project.documents), [])
         self.assertEqual(project.deleted, True)
 
         print('test_delete_project finished.')
@@ -71,7 +87,7 @@ class TestEventServie(unittest.TestCase):
         self.assertEqual(project.creator, 'creator')
         self.assertEqual(project.date, 'date')
         self.assertEqual(project.labelSetId, UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'))
-        self.assertEqual(project.documents, [])
+        self.assertEqual(list(project.documents), [])
 
         service.update_project(project_id, 'name2', 'date2', 'creator2')
         
@@ -82,7 +98,7 @@ class TestEventServie(unittest.TestCase):
         self.assertEqual(project.creator, 'creator2')
         self.assertEqual(project.date, 'date2')
         self.assertEqual(project.labelSetId, UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'))
-        self.assertEqual(project.documents, [])
+        self.assertEqual(list(project.documents), [])
 
         print('test_update_project finished.')
 
@@ -94,18 +110,18 @@ class TestEventServie(unittest.TestCase):
         project_id = str(project_id)
 
         project = service.get_project(project_id)
-        self.assertEqual(project.documents, [])
+        self.assertEqual(list(project.documents), [])
 
         service.add_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c11')
         service.add_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c13')
 
         project = service.get_project(project_id)
-        self.assertEqual(project.documents, [UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11'), UUID('ca6733fa-d416-413c-80e9-ec00baeb2c13')])
+        self.assertEqual(list(project.documents), [UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11'), UUID('ca6733fa-d416-413c-80e9-ec00baeb2c13')])
 
         service.remove_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c13')
 
         project = service.get_project(project_id)
-        self.assertEqual(project.documents, [UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')])
+        self.assertEqual(list(project.documents), [UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')])
 
         print('test_add_remove_documents finished.')
 
@@ -120,5 +136,685 @@ class TestEventServie(unittest.TestCase):
 
         self.assertEqual(doc, {'id': doc_id, 'labels': [], 'relations': []})
 
+    # Test that document calls share one application
+    def test_update_document(self):
+        service = EventService()
+
+        doc_id = str(service.create_document())
+        service.update_document(doc_id, {'e1': {'type': 'PER'}}, [['e1']], {})
+        service.set_document_rec(doc_id, {'e2': {'type': 'LOC'}}, [['e2']], {})
+
+        doc = service.get_document(doc_id)
+        self.assertEqual(doc.entities, {'e1': {'type': 'PER'}})
+        self.assertEqual(doc.sentence_entities, [['e1']])
+        self.assertEqual(doc.rec_entities, {'e2': {'type': 'LOC'}})
+        self.assertEqual(doc.orig_entity_preds, {'e2': {'type': 'LOC'}})
+
+        service.reset_document(doc_id)
+
+        doc = service.get_document(doc_id)
+        self.assertEqual(doc.entities, {})
+        self.assertEqual(doc.rec_entities, {})
+
+        print('test_update_document finished.')
+
+    # Test that updates store the changes between full checkpoints and that full events still replay
+    def test_document_patches(self):
+        documents = DocumentApplication()
+        documents.snapshotting_intervals = {}
+
+        doc = DocumentAggregate()
+        # full events, like all updates recorded by older versions
+        doc._update({'e1': {'type': 'PER'}}, [['e1']], {})
+        doc._update_rec({'e2': {'type': 'LOC'}}, [['e2']], {})
+        documents.save(doc)
+
+        with patch.object(DocumentAggregate, 'checkpoint_interval', 3):
+            documents.update(doc.id, {'e1': {'type': 'PER'}, 'e3': {'type': 'ORG'}}, [['e1'], ['e3']], {})
+            documents.update(doc.id, {'e3': {'type': 'LOC'}}, [[], ['e3']], {'r1': {'head': 'e3'}})
+            documents.update(doc.id, {'e3': {'type': 'LOC'}}, [[], ['e3']], {'r1': {'head': 'e3'}})
+            documents.update(doc.id, {'e4': {}}, [['e4']], {})
+            documents.update_rec(doc.id, {}, [], {})
+
+        topics = [type(event).__name__ for event in documents.events.get(doc.id)]
+        self.assertEqual(topics, ['Created', 'UpdatedDocument', 'UpdatedDocumentRecommendations',
+                                  'PatchedDocument', 'PatchedDocument', 'UpdatedDocument',
+                                  'PatchedDocumentRecommendations'])
+
+        doc = documents.get(doc.id)
+        self.assertEqual(doc.entities, {'e4': {}})
+        self.assertEqual(doc.sentence_entities, [['e4']])
+        self.assertEqual(doc.relations, {})
+        self.assertEqual(doc.rec_entities, {})
+        self.assertEqual(doc.rec_sentence_entities, [])
+        self.assertEqual((doc.patches, doc.rec_patches), (0, 1))
+
+        # the state between two checkpoints
+        doc = documents.repository.get(doc.id, version=5)
+        self.assertEqual(doc.entities, {'e3': {'type': 'LOC'}})
+        self.assertEqual(doc.sentence_entities, [[], ['e3']])
+        self.assertEqual(doc.relations, {'r1': {'head': 'e3'}})
+
+        print('test_document_patches finished.')
+
+    # Test applying operations at an expected version
+    def test_document_operations(self):
+        service = EventService()
+
+        doc_id = str(service.create_document())
+        service.update_document(doc_id, {'e1': {'type': 'PER'}}, [['e1']], {})
+        version = service.get_document(doc_id).version
+
+        version = service.apply_document_operations(doc_id, [
+            {'op': 'add', 'path': '/entities/e2', 'value': {'type': 'LOC'}},
+            {'op': 'replace', 'path': '/entities/e1', 'value': {'type': 'ORG'}},
+            {'op': 'add', 'path': '/sentenceEntities/-', 'value': ['e2']},
+            {'op': 'add', 'path': '/relations/r~11', 'value': {'head': 'e1', 'tail': 'e2'}},
+            {'op': 'add', 'path': '/recEntities/e3', 'value': {'type': 'PER'}}
+        ], version)
+
+        doc = service.get_document(doc_id)
+        self.assertEqual(doc.version, version)
+        self.assertEqual(doc.entities, {'e1': {'type': 'ORG'}, 'e2': {'type': 'LOC'}})
+        self.assertEqual(doc.sentence_entities, [['e1'], ['e2']])
+        self.assertEqual(doc.relations, {'r/1': {'head': 'e1', 'tail': 'e2'}})
+        self.assertEqual(doc.rec_entities, {'e3': {'type': 'PER'}})
+
+        # stale version
+        with self.assertRaises(DocumentVersionConflict) as conflict:
+            service.apply_document_operations(doc_id, [{'op': 'remove', 'path': '/entities/e1'}], version - 1)
+        self.assertEqual(conflict.exception.version, version)
+
+        # invalid operations change nothing
+        for operations in [[{'op': 'remove', 'path': '/entities/e1'}, {'op': 'remove', 'path': '/entities/e9'}],
+                           [{'op': 'replace', 'path': '/entities/e1'}],
+                           [{'op': 'move', 'path': '/entities/e1', 'value': {}}],
+                           [{'op': 'add', 'path': '/labels/e1', 'value': {}}],
+                           [{'op': 'add', 'path': '/sentenceEntities/5', 'value': []}],
+                           [{'op': 'add', 'path': '/entities/e5', 'value': 'PER'}]]:
+            with self.assertRaises(ValueError):
+                service.apply_document_operations(doc_id, operations, version)
+
+        doc = service.get_document(doc_id)
+        self.assertEqual(doc.version, version)
+        self.assertEqual(doc.entities, {'e1': {'type': 'ORG'}, 'e2': {'type': 'LOC'}})
+
+        version = service.apply_document_operations(doc_id, [{'op': 'remove', 'path': '/sentenceEntities/0'},
+                                                             {'op': 'remove', 'path': '/entities/e1'}], version)
+        doc = service.get_document(doc_id)
+        self.assertEqual(doc.version, version)
+        self.assertEqual(doc.entities, {'e2': {'type': 'LOC'}})
+        self.assertEqual(doc.sentence_entities, [['e2']])
+
+        print('test_document_operations finished.')
+
+    # Test reading a project from a snapshot
+    def test_project_snapshots(self):
+        service = EventService({'snapshot_intervals': {'ProjectAggregate': 2}})
+
+        project_id = service.create_project('name', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                            'aa6733fa-d416-413c-80e9-ec00baeb2c74')
+        project_id = str(project_id)
+
+        service.add_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c11')
+        service.add_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c13')
+        service.mark_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c11', 'user', {'ner_f1': 50, 'rel_f1': 20})
+
+        projects = service._runner.get(ProjectApplication)
+        snapshots = list(projects.snapshots.get(UUID(project_id), desc=True, limit=1))
+        self.assertEqual(snapshots[0].originator_version, 4)
+
+        project = service.get_project(project_id)
+        doc_id = UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')
+        self.assertEqual(project.version, 4)
+        self.assertEqual(list(project.documents), [doc_id, UUID('ca6733fa-d416-413c-80e9-ec00baeb2c13')])
+        self.assertEqual(project.documents[doc_id].labelled, True)
+        self.assertEqual(project.documents[doc_id].labelled_by, ('user',))
+        self.assertEqual(project.documents[doc_id].ai_stats, {'ner_f1': 50, 'rel_f1': 20})
+
+        print('test_project_snapshots finished.')
+
+    # Test the sharded and snapshotted project index
+    def test_project_index(self):
+        service = EventService({'snapshot_intervals': {'ProjectIndexAggregate': 2}})
+        indices = service._runner.get(ProjectIndexProcessApplication)
+
+        project_ids = [service.create_project(f'name{i}', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                              'aa6733fa-d416-413c-80e9-ec00baeb2c74') for i in range(40)]
+        for project_id in project_ids[:5]:
+            service.delete_project(str(project_id))
+
+        # a project of the index before the sharding
+        legacy_id = project_ids[5]
+        shard = indices.get_index(ProjectIndexAggregate.create_id(ProjectIndexAggregate.shard_of(legacy_id)))
+        shard.remove_project_from_index(legacy_id)
+        legacy = ProjectIndexAggregate.get()
+        legacy.add_project_to_index(legacy_id)
+        indices.save(shard, legacy)
+
+        projects = service.get_all_projects()
+        self.assertEqual(sorted(project.id for project in projects), sorted(project_ids[5:]))
+        self.assertEqual({project.name for project in projects}, {f'name{i}' for i in range(5, 40)})
+
+        service.delete_project(str(legacy_id))
+        self.assertEqual(sorted(indices.get_all_project_ids()), sorted(project_ids[6:]))
+        self.assertEqual(indices.get_index(ProjectIndexAggregate.create_id()).projects, set())
+
+        shard_ids = {ProjectIndexAggregate.create_id(ProjectIndexAggregate.shard_of(project_id))
+                     for project_id in project_ids}
+        self.assertGreater(len(shard_ids), 1)
+        for shard_id in shard_ids:
+            index = indices.get_index(shard_id)
+            snapshots = list(indices.snapshots.get(shard_id, desc=True, limit=1))
+            if index.version >= 2:
+                self.assertEqual(snapshots[0].originator_version, index.version - index.version % 2)
+
+        service.shutdown()
+
+        print('test_project_index finished.')
+
+    # Test the followers catching up with a store written before the service existed
+    def test_existing_store(self):
+        env = {'PERSISTENCE_MODULE': 'eventsourcing.sqlite',
+               'SQLITE_DBNAME': os.path.join(tempfile.mkdtemp(), 'existing.sqlite')}
+        projects = ProjectApplication(env=env)
+        project_ids = [projects.create_project(f'name{i}', 'date', 'creator',
+                                               UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'),
+                                               UUID('aa6733fa-d416-413c-80e9-ec00baeb2c74')) for i in range(2)]
+        doc_id = UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')
+        projects.add_document(project_ids[0], doc_id)
+        projects.close()
+
+        # the configured snapshot interval already applies to the catch-up
+        with patch.dict(os.environ, env):
+            service = EventService({'snapshot_intervals': {'ProjectIndexAggregate': 1}})
+
+        connection = sqlite3.connect(env['SQLITE_DBNAME'])
+        snapshots = connection.execute('SELECT COUNT(*) FROM stored_snapshots WHERE topic=?',
+                                       (get_topic(AggregateSnapshot),)).fetchone()[0]
+        connection.close()
+        self.assertGreater(snapshots, 0)
+
+        self.assertEqual(sorted(project.id for project in service.get_all_projects()), sorted(project_ids))
+        self.assertEqual([project.id for project in service.get_document_projects(str(doc_id))], [project_ids[0]])
+        self.assertEqual(service.get_project_row(str(project_ids[0]))['documentCount'], 1)
+
+        service.shutdown()
+
+        print('test_existing_store finished.')
+
+    # Test reading the document ids of some projects from the SQLite read model
+    def test_read_model_document_ids(self):
+        env = {'PERSISTENCE_MODULE': 'eventsourcing.sqlite',
+               'SQLITE_DBNAME': os.path.join(tempfile.mkdtemp(), 'read_model.sqlite')}
+        with patch.dict(os.environ, env):
+            service = EventService()
+
+        project_ids = [str(service.create_project(f'name{i}', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                  'aa6733fa-d416-413c-80e9-ec00baeb2c74')) for i in range(3)]
+        doc_ids = [f'ca6733fa-d416-413c-80e9-ec00baeb2{i:03}' for i in range(6)]
+        service.add_documents(project_ids[0], doc_ids[3:] + doc_ids[:2])
+        service.add_document(project_ids[1], doc_ids[5])
+        service.add_document(project_ids[2], doc_ids[0])
+
+        self.assertEqual(service.get_project_document_ids(project_ids[:2]),
+                         {project_ids[0]: doc_ids[3:] + doc_ids[:2], project_ids[1]: [doc_ids[5]]})
+        self.assertEqual(service._read_model.recorder.select_document_ids(project_ids, batch_size=2),
+                         {project_ids[0]: doc_ids[3:] + doc_ids[:2], project_ids[1]: [doc_ids[5]],
+                          project_ids[2]: [doc_ids[0]]})
+
+        service.shutdown()
+
+        print('test_read_model_document_ids finished.')
+
+    # Test the followers tracking only the project events they handle
+    def test_followed_topics(self):
+        db_name = os.path.join(tempfile.mkdtemp(), 'topics.sqlite')
+        env = {'PERSISTENCE_MODULE': 'eventsourcing.sqlite', 'SQLITE_DBNAME': db_name}
+        with patch.dict(os.environ, env):
+            service = EventService()
+
+        project_id = str(service.create_project('name', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                'aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+        doc_id = 'ca6733fa-d416-413c-80e9-ec00baeb2c11'
+        service.add_document(project_id, doc_id)
+        register_id = str(service.create_document())
+        for i in range(5):
+            service.update_document(register_id, {f'e{i}': {'type': 'PER'}}, [], {})
+        service.mark_document(project_id, doc_id, 'user', {'ner_f1': 50, 'rel_f1': 50})
+        service.shutdown()
+
+        connection = sqlite3.connect(db_name)
+        tracked = {table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                   for table in ['tracking', 'document_index_tracking', 'project_read_model_tracking']}
+        connection.close()
+
+        # Created
+        self.assertEqual(tracked['tracking'], 1)
+        # DocumentAdded
+        self.assertEqual(tracked['document_index_tracking'], 1)
+        # Created, DocumentAdded and DocumentMarked
+        self.assertEqual(tracked['project_read_model_tracking'], 3)
+
+        print('test_followed_topics finished.')
+
+    # Test the aggregate cache
+    def test_aggregate_cache(self):
+        service = EventService()
+
+        project_id = service.create_project('name', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                            'aa6733fa-d416-413c-80e9-ec00baeb2c74')
+        project_id = str(project_id)
+
+        first = service.get_project(project_id)
+        self.assertIs(service.get_project(project_id), first)
+
+        service.add_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c11')
+
+        project = service.get_project(project_id)
+        self.assertEqual(list(project.documents), [UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')])
+        self.assertEqual(list(first.documents), [])
+
+        stats = service.get_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['advances'], 1)
+        budget = stats['bytes'] + 100
+
+        # the marked record is replaced in the new copy, the other records are shared
+        service.add_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c13')
+        before = service.get_project(project_id)
+        service.mark_document(project_id, 'ca6733fa-d416-413c-80e9-ec00baeb2c11', 'user', {'ner_f1': 1, 'rel_f1': 1})
+        after = service.get_project(project_id)
+        self.assertFalse(before.is_labelled(UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')))
+        self.assertTrue(after.is_labelled(UUID('ca6733fa-d416-413c-80e9-ec00baeb2c11')))
+        self.assertIs(after.documents[UUID('ca6733fa-d416-413c-80e9-ec00baeb2c13')],
+                      before.documents[UUID('ca6733fa-d416-413c-80e9-ec00baeb2c13')])
+
+        # budget too small for a second aggregate
+        service = EventService({'aggregate_cache': {'max_bytes': budget}})
+        for name in ['name1', 'name2']:
+            project_id = service.create_project(name, 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                'aa6733fa-d416-413c-80e9-ec00baeb2c74')
+            service.get_project(str(project_id))
+        self.assertEqual(service.get_cache_stats()['evictions'], 1)
+
+        print('test_aggregate_cache finished.')
+
+    # Test loading several documents at once
+    def test_get_documents(self):
+        service = EventService()
+
+        doc_ids = [str(service.create_document()) for _ in range(5)]
+        for i, doc_id in enumerate(doc_ids):
+            service.update_document(doc_id, {f'e{i}': {}}, [], {})
+
+        docs = service.get_documents(doc_ids)
+        self.assertEqual([doc.entities for doc in docs], [{f'e{i}': {}} for i in range(5)])
+
+        print('test_get_documents finished.')
+
+    # Test the document to projects index
+    def test_document_projects(self):
+        service = EventService()
+
+        project_ids = [str(service.create_project(f'name{i}', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                  'aa6733fa-d416-413c-80e9-ec00baeb2c74')) for i in range(3)]
+        doc_id = 'ca6733fa-d416-413c-80e9-ec00baeb2c11'
+
+        service.add_document(project_ids[0], doc_id)
+        service.add_document(project_ids[1], doc_id)
+        service.add_document(project_ids[2], doc_id)
+        service.add_document(project_ids[2], 'ca6733fa-d416-413c-80e9-ec00baeb2c13')
+
+        service.remove_document(project_ids[1], doc_id)
+        service.delete_project(project_ids[2])
+
+        projects = service.get_document_projects(doc_id)
+        self.assertEqual([str(project.id) for project in projects], [project_ids[0]])
+        self.assertEqual(service.get_document_projects('ca6733fa-d416-413c-80e9-ec00baeb2c99'), [])
+
+        print('test_document_projects finished.')
+
+    # Test resetting many documents at once
+    def test_reset_documents(self):
+        service = EventService()
+
+        project_id = str(service.create_project('name', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                'aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+        doc_ids = ['ca6733fa-d416-413c-80e9-ec00baeb2c11', 'ca6733fa-d416-413c-80e9-ec00baeb2c13']
+
+        entries = []
+        for doc_id in doc_ids:
+            service.add_document(project_id, doc_id)
+            for user in ['user1', 'user2']:
+                register_id = str(service.create_document())
+                service.update_document(register_id, {'e1': {}}, [['e1']], {})
+                service.mark_document(project_id, doc_id, user, {'ner_f1': 10, 'rel_f1': 10})
+                entries.append((register_id, project_id, doc_id))
+
+        version = service.get_project(project_id).version
+        service.reset_documents(entries)
+
+        project = service.get_project(project_id)
+        self.assertEqual(project.version, version + 2)
+        for doc_id in doc_ids:
+            self.assertEqual(project.documents[UUID(doc_id)].labelled, False)
+            self.assertEqual(project.documents[UUID(doc_id)].labelled_by, ())
+        for doc in service.get_documents([register_id for register_id, _, _ in entries]):
+            self.assertEqual(doc.entities, {})
+            self.assertEqual(doc.rec_entities, {})
+
+        print('test_reset_documents finished.')
+
+    # Test the batches of the striped locks
+    def test_aggregate_locks(self):
+        locks = AggregateLocks(stripes=16)
+        ids = [UUID(int=i) for i in range(100)]
+
+        batches = list(locks.batches(ids, batch_size=10, max_stripes=2))
+        self.assertEqual(sorted(aggregate_id for batch in batches for aggregate_id in batch), ids)
+        for batch in batches:
+            self.assertLessEqual(len(batch), 10)
+            self.assertLessEqual(len({aggregate_id.int % 16 for aggregate_id in batch}), 2)
+
+        print('test_aggregate_locks finished.')
+
+    # Test the read model rows against the project aggregates
+    def test_read_model(self):
+        tmp_dir = tempfile.mkdtemp()
+
+        for env in [{}, {'PERSISTENCE_MODULE': 'eventsourcing.sqlite',
+                         'SQLITE_DBNAME': os.path.join(tmp_dir, 'read_model.sqlite')}]:
+            with patch.dict(os.environ, env):
+                service = EventService()
+
+                project_ids = [str(service.create_project(f'name{i}', 'date', 'creator',
+                                                          'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                          'aa6733fa-d416-413c-80e9-ec00baeb2c74')) for i in range(3)]
+                doc_ids = [f'ca6733fa-d416-413c-80e9-ec00baeb2c1{i}' for i in range(4)]
+
+                for doc_id in doc_ids:
+                    service.add_document(project_ids[0], doc_id)
+                    service.add_document(project_ids[1], doc_id)
+                service.mark_document(project_ids[0], doc_ids[0], 'user1', {'ner_f1': 50, 'rel_f1': 20})
+                service.mark_document(project_ids[0], doc_ids[0], 'user2', {'ner_f1': 10, 'rel_f1': 10})
+                service.mark_document(project_ids[0], doc_ids[1], 'user1', {'ner_f1': 30, 'rel_f1': 40})
+                service.unmark_document(project_ids[0], doc_ids[1])
+                service.remove_document(project_ids[0], doc_ids[2])
+                service.add_document(project_ids[0], doc_ids[2])
+                service.update_project(project_ids[1], 'new name', 'new creator')
+                service.delete_project(project_ids[2])
+
+                def check():
+                    rows = service.get_project_rows()
+                    self.assertEqual([row['id'] for row in rows], project_ids[:2])
+
+                    doc_lists = service.get_project_document_ids(project_ids[:2])
+                    for row in rows:
+                        project = service.get_project(row['id'])
+                        self.assertEqual(serialize_project_row(row, doc_lists[row['id']]),
+                                         serialize_project(project))
+                        self.assertEqual(service.get_document_rows(row['id'])[0], [{
+                            'id': str(doc_id),
+                            'labelled': record.labelled,
+                            'labelledBy': list(record.labelled_by),
+                            'aiStats': record.ai_stats
+                        } for doc_id, record in project.documents.items()])
+
+                    self.assertEqual(service.get_project_row(project_ids[2])['deleted'], True)
+                    self.assertIsNone(service.get_project_row('ca6733fa-d416-413c-80e9-ec00baeb2c99'))
+
+                check()
+                self.assertEqual(service.get_project_row(project_ids[0])['labelledCount'], 1)
+
+                read_model = service._runner.get(ProjectReadModelProcessApplication)
+                read_model.rebuild(ProjectApplication.name)
+                check()
+
+                service.shutdown()
+
+        print('test_read_model finished.')
+
+    # Test paging and filtering the document rows
+    def test_document_row_pages(self):
+        tmp_dir = tempfile.mkdtemp()
+
+        for env in [{}, {'PERSISTENCE_MODULE': 'eventsourcing.sqlite',
+                         'SQLITE_DBNAME': os.path.join(tmp_dir, 'pages.sqlite')}]:
+            with patch.dict(os.environ, env):
+                service = EventService()
+
+                project_id = str(service.create_project('name', 'date', 'creator',
+                                                        'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                        'aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+                doc_ids = [f'ca6733fa-d416-413c-80e9-ec00baeb2{i:03}' for i in range(10)]
+                for i, doc_id in enumerate(doc_ids):
+                    service.add_document(project_id, doc_id)
+                    if i % 2 == 0:
+                        service.mark_document(project_id, doc_id, 'user1', {'ner_f1': i * 10, 'rel_f1': 50})
+                    if i % 3 == 0:
+                        service.mark_document(project_id, doc_id, 'user2', {'ner_f1': 90, 'rel_f1': 90})
+
+                def all_pages(limit, **filters):
+                    ids, cursor = [], 0
+                    while cursor is not None:
+                        rows, cursor = service.get_document_rows(project_id, cursor, limit, **filters)
+                        ids.extend(row['id'] for row in rows)
+                    return ids
+
+                self.assertEqual(all_pages(3), doc_ids)
+                self.assertEqual(all_pages(3, labelled=True), [doc_ids[i] for i in [0, 2, 3, 4, 6, 8, 9]])
+                self.assertEqual(all_pages(2, labelled=False), [doc_ids[i] for i in [1, 5, 7]])
+                self.assertEqual(all_pages(2, labelled_by='user2'), [doc_ids[i] for i in [0, 3, 6, 9]])
+                # the stats of the last user count
+                self.assertEqual(all_pages(10, labelled_by='user1', max_ner_f1=45), [doc_ids[i] for i in [2, 4]])
+                # documents without ai stats don't match
+                self.assertEqual(all_pages(10, max_ner_f1=100), [doc_ids[i] for i in [0, 2, 3, 4, 6, 8, 9]])
+
+                service.unmark_document(project_id, doc_ids[0])
+                service.remove_document(project_id, doc_ids[3])
+                self.assertEqual(all_pages(4, labelled_by='user2'), [doc_ids[i] for i in [6, 9]])
+
+                service.shutdown()
+
+        print('test_document_row_pages finished.')
+
+    # Test replaying old project histories and snapshots into the document records
+    def test_project_history(self):
+        projects = ProjectApplication()
+        doc_ids = [UUID(f'ca6733fa-d416-413c-80e9-ec00baeb2c1{i}') for i in range(3)]
+
+        project = ProjectAggregate('name', 'date', 'creator', UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'),
+                                   UUID('aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+        for doc_id in doc_ids:
+            project.add_document(doc_id)
+        project.mark_document(doc_ids[0], 'user1', {'ner_f1': 50, 'rel_f1': 20})
+        project.remove_document(doc_ids[1])
+        # the list based aggregate allowed to mark and unmark removed documents
+        project._mark_document(doc_ids[1], 'user1', {'ner_f1': 10, 'rel_f1': 10})
+        project._unmark_document(doc_ids[1])
+        project.add_document(doc_ids[1])
+        projects.save(project)
+
+        project = projects.get_project(project.id)
+        self.assertEqual(list(project.documents), [doc_ids[0], doc_ids[2], doc_ids[1]])
+        self.assertEqual(project.documents[doc_ids[0]], DocumentRecord(True, ('user1',), {'ner_f1': 50, 'rel_f1': 20}))
+        self.assertEqual(project.documents[doc_ids[1]], DocumentRecord())
+
+        # snapshot of the list based aggregate
+        snapshot = AggregateSnapshot(originator_id=project.id, originator_version=project.version,
+                                     timestamp=AggregateSnapshot.create_timestamp(),
+                                     topic=get_topic(ProjectAggregate), state={
+            'documents': [doc_ids[0], doc_ids[2]],
+            'labelled': [[doc_ids[0], True], [doc_ids[1], False], [doc_ids[2], False]],
+            'labelled_by': [[doc_ids[0], ['user1']], [doc_ids[1], []], [doc_ids[2], []]],
+            'ai_stats': [[doc_ids[0], {'ner_f1': 50, 'rel_f1': 20}], [doc_ids[1], {'ner_f1': -1, 'rel_f1': -1}],
+                         [doc_ids[2], {'ner_f1': -1, 'rel_f1': -1}]],
+            '_uuid_keyed': ['labelled', 'labelled_by', 'ai_stats'],
+            'deleted': False, 'name': 'name', 'date': 'date', 'creator': 'creator',
+            'labelSetId': UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'),
+            'relationSetId': UUID('aa6733fa-d416-413c-80e9-ec00baeb2c74'),
+            '_created_on': project.created_on, '_modified_on': project.modified_on
+        })
+        projects.snapshots.put([snapshot])
+
+        project = projects.get_project(project.id)
+        self.assertEqual(list(project.documents), [doc_ids[0], doc_ids[2]])
+        self.assertEqual(project.documents[doc_ids[0]], DocumentRecord(True, ('user1',), {'ner_f1': 50, 'rel_f1': 20}))
+
+        # snapshots of the current version
+        projects.add_document(project.id, doc_ids[1])
+        projects.take_snapshot(project.id)
+        project = projects.get_project(project.id)
+        self.assertEqual(list(project.documents), [doc_ids[0], doc_ids[2], doc_ids[1]])
+        self.assertEqual(project.documents[doc_ids[0]], DocumentRecord(True, ('user1',), {'ner_f1': 50, 'rel_f1': 20}))
+
+        print('test_project_history finished.')
+
+    # Test adding documents in bulk
+    def test_add_documents(self):
+        service = EventService()
+
+        project_id = str(service.create_project('name', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                'aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+        doc_ids = [f'ca6733fa-d416-413c-80e9-ec00baeb2{i:03}' for i in range(25)]
+
+        service.add_document(project_id, doc_ids[0])
+        self.assertEqual(service.add_documents(project_id, doc_ids + doc_ids[5:7], chunk_size=10), (24, 3))
+        self.assertEqual(service.add_documents(project_id, doc_ids[:3]), (0, 3))
+
+        project = service.get_project(project_id)
+        self.assertEqual([str(doc_id) for doc_id in project.documents], doc_ids)
+        # one event for the project, one for the single document and one per chunk with new documents
+        self.assertEqual(project.version, 5)
+
+        rows, _ = service.get_document_rows(project_id)
+        self.assertEqual([row['id'] for row in rows], doc_ids)
+        self.assertEqual(service.get_project_row(project_id)['documentCount'], 25)
+        self.assertEqual([str(pro.id) for pro in service.get_document_projects(doc_ids[20])], [project_id])
+
+        print('test_add_documents finished.')
+
+    # Test changes of one project from several threads
+    def test_concurrent_writes(self):
+        env = {'PERSISTENCE_MODULE': 'eventsourcing.sqlite',
+               'SQLITE_DBNAME': os.path.join(tempfile.mkdtemp(), 'concurrent.sqlite')}
+        with patch.dict(os.environ, env):
+            service = EventService()
+
+        project_id = str(service.create_project('name', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                'aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+        doc_ids = [f'ca6733fa-d416-413c-80e9-ec00baeb2{i:03}' for i in range(40)]
+        service.add_documents(project_id, doc_ids)
+
+        errors = []
+        labelled_counts = []
+
+        def mark(user_id, doc_ids):
+            try:
+                for doc_id in doc_ids:
+                    service.mark_document(project_id, doc_id, user_id, {'ner_f1': 50, 'rel_f1': 50})
+                    # the read model has processed the own events when mark_document returns
+                    labelled_counts.append(service.get_project_row(project_id)['labelledCount'] > 0)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=mark, args=(f'user{i}', doc_ids[i::8])) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(all(labelled_counts))
+        project = service.get_project(project_id)
+        self.assertEqual(project.version, 42)
+        self.assertTrue(all(record.labelled for record in project.documents.values()))
+        self.assertEqual(service.get_project_row(project_id)['labelledCount'], 40)
+
+        print('test_concurrent_writes finished.')
+
+    # Test documents in the partitions of the event store
+    def test_document_partitions(self):
+        db_name = os.path.join(tempfile.mkdtemp(), 'events.sqlite')
+        env = {'PERSISTENCE_MODULE': 'eventsourcing.sqlite', 'SQLITE_DBNAME': db_name}
+        with patch.dict(os.environ, env):
+            service = EventService({'event_store': {'partitions': 2}})
+
+        # project ids in partition 0 and 1
+        project_ids = ['ca6733fa-d416-413c-80e9-ec00baeb2c74', 'ca6733fa-d416-413c-80e9-ec00baeb2c75']
+        doc_ids = [str(service.create_document(project_id)) for project_id in project_ids for _ in range(3)]
+        main_doc_id = str(service.create_document())
+
+        for doc_id in doc_ids + [main_doc_id]:
+            service.update_document(doc_id, {'e1': {'type': 'PER'}}, [], {})
+        project_id = str(service.create_project('name', 'date', 'creator', 'ca6733fa-d416-413c-80e9-ec00baeb2c74',
+                                                'aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+        service.reset_documents([(doc_id, project_id, doc_id) for doc_id in doc_ids[:2] + [main_doc_id]])
+
+        documents = service.get_documents(doc_ids + [main_doc_id])
+        self.assertEqual([doc.entities for doc in documents], [{}, {}] + [{'e1': {'type': 'PER'}}] * 4 + [{}])
+
+        def stored_ids(name):
+            connection = sqlite3.connect(name)
+            ids = {UUID(originator_id) for (originator_id,) in
+                   connection.execute('SELECT DISTINCT originator_id FROM stored_events')}
+            connection.close()
+            return ids
+
+        doc_ids = [UUID(doc_id) for doc_id in doc_ids]
+        self.assertEqual(stored_ids(db_name.replace('.sqlite', '.part0.sqlite')), set(doc_ids[:3]))
+        self.assertEqual(stored_ids(db_name.replace('.sqlite', '.part1.sqlite')), set(doc_ids[3:]))
+        self.assertIn(UUID(main_doc_id), stored_ids(db_name))
+        self.assertFalse(stored_ids(db_name) & set(doc_ids))
+
+        service.shutdown()
+
+        print('test_document_partitions finished.')
+
+    # Test 32 markers in 4 applications (like 4 processes) saving the same project at once
+    def test_project_write_retries(self):
+        env = {'PERSISTENCE_MODULE': 'eventsourcing.sqlite',
+               'SQLITE_DBNAME': os.path.join(tempfile.mkdtemp(), 'retries.sqlite')}
+        apps = [ProjectApplication(env=env) for _ in range(4)]
+
+        project_id = apps[0].create_project('name', 'date', 'creator', UUID('ca6733fa-d416-413c-80e9-ec00baeb2c74'),
+                                            UUID('aa6733fa-d416-413c-80e9-ec00baeb2c74'))
+        doc_ids = [UUID(f'ca6733fa-d416-413c-80e9-ec00baeb2{i:03}') for i in range(128)]
+        apps[0].add_documents(project_id, doc_ids)
+
+        errors = []
+        barrier = Barrier(32)
+
+        def mark(app, user_id, doc_ids):
+            try:
+                barrier.wait()
+                for doc_id in doc_ids:
+                    app.mark_document(project_id, doc_id, user_id, {'ner_f1': 50, 'rel_f1': 50})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=mark, args=(apps[i % 4], f'user{i}', doc_ids[i::32])) for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        project = apps[0].get_project(project_id)
+        self.assertEqual(project.version, 2 + 128)
+        for i, doc_id in enumerate(doc_ids):
+            self.assertEqual(project.documents[doc_id].labelled_by, (f'user{i % 32}',))
+
+        stats = [app.get_write_stats() for app in apps]
+        self.assertEqual(sum(stat['failures'] for stat in stats), 0)
+        self.assertEqual(sum(stat['conflicts'] for stat in stats), sum(stat['retries'] for stat in stats))
+
+        for app in apps:
+            app.close()
+
+        print('test_project_write_retries finished.', stats)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+import time
+import unittest
+
+from threading import Event
+
+from src.util.training_scheduler import TrainingScheduler
+
+
+# Stand-in for the dispatcher, the test decides when a request finishes.
+class FakeDispatcher:
+
+    def __init__(self):
+        self.requests = []
+        self.callbacks = []
+        self.sent = Event()
+
+    def send_ai_training_request(self, req, on_done=None):
+        self.requests.append(req)
+        self.callbacks.append(on_done)
+        self.sent.set()
+        return True
+
+    def finish(self):
+        self.sent.clear()
+        self.callbacks.pop(0)(200)
+
+
+class TestTrainingScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = FakeDispatcher()
+        self.scheduler = TrainingScheduler(self.dispatcher, window=0.05)
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    # Triggers within the window are sent once with the latest state
+    def test_coalesce(self):
+        for i in range(5):
+            self.scheduler.schedule('p1', lambda i=i: {'project_id': 'p1', 'state': i})
+        self.scheduler.schedule('p2', lambda: {'project_id': 'p2'})
+
+        self.assertTrue(self.dispatcher.sent.wait(1))
+        time.sleep(0.1)
+
+        self.assertCountEqual(self.dispatcher.requests, [{'project_id': 'p1', 'state': 4}, {'project_id': 'p2'}])
+
+        self.dispatcher.finish()
+        self.dispatcher.finish()
+
+        stats = self.scheduler.stats()
+        self.assertEqual(stats['enqueued'], 6)
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(stats['coalesced'], 4)
+        self.assertEqual(stats['inFlight'], 0)
+
+    # Only one train request per project in flight
+    def test_one_in_flight(self):
+        self.scheduler.schedule('p1', lambda: {'state': 1})
+        self.assertTrue(self.dispatcher.sent.wait(1))
+
+        self.scheduler.schedule('p1', lambda: {'state': 2})
+        time.sleep(0.15)
+        self.assertEqual(self.dispatcher.requests, [{'state': 1}])
+        self.assertEqual(self.scheduler.stats()['pending'], 1)
+
+        self.dispatcher.finish()
+        self.assertTrue(self.dispatcher.sent.wait(1))
+        self.assertEqual(self.dispatcher.requests, [{'state': 1}, {'state': 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
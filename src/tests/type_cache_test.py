@@ -0,0 +1,55 @@
+import unittest
+
+from src.util.type_cache import TypeCache
+
+
+# Stand-in for a Mongo collection that counts the queries.
+class CountingCollection:
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = {row['_id']: row for row in rows}
+        self.queries = 0
+
+    def find_one(self, query, projection=None):
+        self.queries += 1
+        return self.rows.get(query['_id'])
+
+
+class TestTypeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.label_sets = CountingCollection('label_sets', [
+            {'_id': 'l1', 'name': 'labels', 'labels': [{'type': 'PER'}, {'type': 'LOC'}]}
+        ])
+        self.relation_sets = CountingCollection('relation_sets', [
+            {'_id': 'r1', 'name': 'relations', 'relationTypes': [{'type': 'lives_in'}]}
+        ])
+        self.cache = TypeCache({'label_sets': self.label_sets, 'relation_sets': self.relation_sets})
+
+    def test_read_through(self):
+        for _ in range(3):
+            self.assertEqual(self.cache.get_label_types('l1'), ('PER', 'LOC'))
+            self.assertEqual(self.cache.get_relation_types('r1'), ('lives_in',))
+
+        self.assertEqual(self.label_sets.queries, 1)
+        self.assertEqual(self.relation_sets.queries, 1)
+        self.assertEqual(self.cache.stats()['hits'], 4)
+
+    def test_missing_and_invalidate(self):
+        with self.assertRaises(KeyError):
+            self.cache.get_label_types('l2')
+
+        # missing sets are not cached, a later insert is seen
+        self.label_sets.rows['l2'] = {'_id': 'l2', 'labels': [{'type': 'ORG'}]}
+        self.cache.invalidate_label_set('l2')
+        self.assertEqual(self.cache.get_label_types('l2'), ('ORG',))
+
+        self.label_sets.rows['l2'] = {'_id': 'l2', 'labels': [{'type': 'MISC'}]}
+        self.assertEqual(self.cache.get_label_types('l2'), ('ORG',))
+        self.cache.invalidate_label_set('l2')
+        self.assertEqual(self.cache.get_label_types('l2'), ('MISC',))
+
+
+if __name__ == '__main__':
+    unittest.main()
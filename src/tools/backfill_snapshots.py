@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+
+from eventsourcing.utils import get_topic
+
+from src.application.DocumentApplication import DocumentApplication
+from src.application.ProjectApplication import ProjectApplication
+from src.application.ProjectIndexProcessApplication import ProjectIndexProcessApplication
+from src.domain.DocumentAggregate import DocumentAggregate
+from src.domain.ProjectAggregate import ProjectAggregate
+from src.domain.ProjectIndexAggregate import ProjectIndexAggregate
+from src.util import logwrapper
+from src.util.partitions import partition_db_name
+from src.util.persistence import configure_persistence
+
+
+# Take snapshots for all existing aggregates of one type that have at least
+# `interval` events, so reads of old aggregates start from a snapshot as well.
+def backfill(app, aggregate_cls, interval: int, page_size: int = 1000):
+    created_topic = get_topic(aggregate_cls.Created)
+    count = 0
+
+    start = 1
+    while True:
+        notifications = app.recorder.select_notifications(start, page_size, topics=[created_topic])
+        if len(notifications) == 0:
+            break
+
+        for notification in notifications:
+            aggregate = app.repository.get(notification.originator_id)
+            if aggregate.version >= interval:
+                app.take_snapshot(aggregate.id)
+                count += 1
+
+        start = notifications[-1].id + 1
+
+    logwrapper.info(f'Took {count} snapshots for {aggregate_cls.__name__}.')
+    return count
+
+
+# Offline command, stop the server first.
+# Run with: python -m src.tools.backfill_snapshots
+def main():
+    if not os.path.exists('./config.json'):
+        logwrapper.error('No Config File. Shutting down.')
+        sys.exit()
+
+    with open('./config.json', 'r') as f:
+        config = json.load(f)
+
+    configure_persistence(config)
+    intervals = config.get('snapshot_intervals', {})
+
+    setups = [(ProjectApplication, ProjectAggregate, None), (DocumentApplication, DocumentAggregate, None),
+              (ProjectIndexProcessApplication, ProjectIndexAggregate, None)]
+    # documents in the partitions of the event store
+    db_name = config.get('sqlite_dbname', './anno_db.sqlite')
+    setups += [(DocumentApplication, DocumentAggregate, {'SQLITE_DBNAME': partition_db_name(db_name, partition)})
+               for partition in range(int(config.get('event_store', {}).get('partitions', 0)))]
+
+    for app_cls, aggregate_cls, env in setups:
+        app = app_cls(env=env)
+        interval = int(intervals.get(aggregate_cls.__name__, app.snapshotting_intervals[aggregate_cls]))
+
+        if interval > 0:
+            backfill(app, aggregate_cls, interval)
+
+        app.close()
+
+
+if __name__ == '__main__':
+    main()
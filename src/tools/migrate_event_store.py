@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import sys
+
+from src.util import logwrapper
+from src.util.partitions import partition_db_name
+from src.util.persistence import compressors
+
+
+# Uncompressed state of a stored event or snapshot, whichever compression it was stored with.
+def decompress(data: bytes, instances: dict) -> bytes:
+    if data[:1] == b'{':
+        return data
+
+    for name, compressor_cls in compressors.items():
+        if data.startswith(compressor_cls.prefix):
+            if name not in instances:
+                instances[name] = compressor_cls()
+            return instances[name].decompress(data)
+
+    raise ValueError(f'Unknown compression of stored state {data[:4]}.')
+
+
+# Rewrite the state of all stored events and snapshots (all tables with a state column)
+# with the given compression (None for uncompressed JSON).
+# Rows already stored with it are skipped, so the migration can be stopped and run again.
+# Returns the number of rewritten rows.
+def migrate(db_name: str, compression: str = None, batch_size: int = 1000):
+    compressor_cls = compressors[compression] if compression else None
+    compressor = compressor_cls() if compressor_cls else None
+    prefix = compressor_cls.prefix if compressor_cls else b'{'
+    instances = {compression: compressor} if compressor else {}
+
+    connection = sqlite3.connect(db_name)
+    tables = [name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type='table'")
+              if 'state' in [column[1] for column in connection.execute(f'PRAGMA table_info({name})')]]
+
+    count = 0
+    for table in tables:
+        last = ('', -1)
+        while True:
+            rows = connection.execute(
+                f'SELECT originator_id, originator_version, state FROM {table} '
+                'WHERE (originator_id, originator_version) > (?, ?) '
+                'ORDER BY originator_id, originator_version LIMIT ?', (*last, batch_size)).fetchall()
+            if len(rows) == 0:
+                break
+
+            updates = []
+            for originator_id, originator_version, state in rows:
+                if state.startswith(prefix):
+                    continue
+
+                state = decompress(state, instances)
+                if compressor is not None:
+                    state = compressor.compress(state)
+                updates.append((state, originator_id, originator_version))
+
+            with connection:
+                connection.executemany(
+                    f'UPDATE {table} SET state=? WHERE originator_id=? AND originator_version=?', updates)
+
+            count += len(updates)
+            last = rows[-1][:2]
+
+        logwrapper.info(f'Migrated {table}, {count} rows rewritten so far.')
+
+    # give the space back to the file system
+    connection.execute('VACUUM')
+    connection.close()
+
+    return count
+
+
+# Offline command, stop the server first.
+# Uses the sqlite_dbname, its partitions and the compression of the event_store in the config.
+# Run with: python -m src.tools.migrate_event_store
+def main():
+    if not os.path.exists('./config.json'):
+        logwrapper.error('No Config File. Shutting down.')
+        sys.exit()
+
+    with open('./config.json', 'r') as f:
+        config = json.load(f)
+
+    db_name = config.get('sqlite_dbname', './anno_db.sqlite')
+    compression = config.get('event_store', {}).get('compression')
+    partitions = int(config.get('event_store', {}).get('partitions', 0))
+
+    for name in [db_name] + [partition_db_name(db_name, partition) for partition in range(partitions)]:
+        if not os.path.exists(name):
+            continue
+        count = migrate(name, compression)
+        logwrapper.info(f'Rewrote {count} stored events and snapshots of {name} '
+                        f'with compression {compression or "none"}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+from src.application.ProjectApplication import ProjectApplication
+from src.application.ProjectReadModelProcessApplication import ProjectReadModelProcessApplication
+from src.util import logwrapper
+from src.util.persistence import configure_persistence
+
+
+# Drop the project read model and build it again from all project events.
+def rebuild(projects, read_model):
+    read_model.follow(projects.name, projects.notification_log)
+    read_model.rebuild(projects.name)
+
+    logwrapper.info(f'Rebuilt read model with {len(read_model.get_projects())} projects.')
+
+
+# Offline command, stop the server first.
+# Run with: python -m src.tools.rebuild_read_model
+def main():
+    if not os.path.exists('./config.json'):
+        logwrapper.error('No Config File. Shutting down.')
+        sys.exit()
+
+    with open('./config.json', 'r') as f:
+        config = json.load(f)
+
+    configure_persistence(config)
+
+    projects = ProjectApplication()
+    read_model = ProjectReadModelProcessApplication()
+
+    rebuild(projects, read_model)
+
+    read_model.close()
+    projects.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+import sys
+
+from uuid import UUID
+
+import pymongo
+
+from src.application.DocumentApplication import DocumentApplication
+from src.util import logwrapper
+from src.util.partitions import DocumentRoutes, partition_db_name, partition_of
+
+
+# Move the events and snapshots of the documents from the main store to the partitions of their projects
+# and add their routes. routes are (document aggregate id, project id) pairs, e.g. from the doc register.
+# Each batch is copied, routed and then deleted from the main store. SQLite doesn't commit attached
+# WAL databases atomically, but copying ignores rows that are already there, so the split can be
+# stopped and run again. Returns the number of moved documents.
+def split(db_name: str, routes, partitions: int, batch_size: int = 1000):
+    # create the tables of the partitions
+    for partition in range(partitions):
+        DocumentApplication(env={'PERSISTENCE_MODULE': 'eventsourcing.sqlite',
+                                 'SQLITE_DBNAME': partition_db_name(db_name, partition)}).close()
+    DocumentRoutes(db_name).close()
+
+    by_partition = {}
+    for doc_id, project_id in routes:
+        by_partition.setdefault(partition_of(project_id, partitions), []).append(UUID(str(doc_id)).hex)
+
+    connection = sqlite3.connect(db_name, isolation_level=None)
+    count = 0
+    for partition, doc_ids in sorted(by_partition.items()):
+        connection.execute('ATTACH DATABASE ? AS part', (partition_db_name(db_name, partition),))
+
+        for i in range(0, len(doc_ids), batch_size):
+            batch = doc_ids[i:i + batch_size]
+            params = ','.join('?' * len(batch))
+
+            connection.execute('BEGIN')
+            for table in ['stored_events', 'stored_snapshots']:
+                connection.execute(f'INSERT OR IGNORE INTO part.{table} '
+                                   f'SELECT originator_id, originator_version, topic, state FROM main.{table} '
+                                   f'WHERE originator_id IN ({params}) '
+                                   f'ORDER BY originator_id, originator_version', batch)
+            moved = connection.execute(f'SELECT COUNT(DISTINCT originator_id) FROM main.stored_events '
+                                       f'WHERE originator_id IN ({params})', batch).fetchone()[0]
+            connection.executemany('INSERT OR REPLACE INTO main.document_partitions VALUES (?,?)',
+                                   [(doc_id, partition) for doc_id in batch])
+            for table in ['stored_events', 'stored_snapshots']:
+                connection.execute(f'DELETE FROM main.{table} WHERE originator_id IN ({params})', batch)
+            connection.execute('COMMIT')
+
+            count += moved
+
+        connection.execute('DETACH DATABASE part')
+        logwrapper.info(f'Split event store, {count} documents moved so far.')
+
+    # give the space back to the file system
+    connection.execute('VACUUM')
+    connection.close()
+
+    return count
+
+
+# Offline command, stop the server first.
+# Moves the documents in the doc register to the "partitions" of the event_store in the config.
+# Documents that are not in the doc register stay in the main store.
+# Run with: python -m src.tools.split_event_store
+def main():
+    if not os.path.exists('./config.json'):
+        logwrapper.error('No Config File. Shutting down.')
+        sys.exit()
+
+    with open('./config.json', 'r') as f:
+        config = json.load(f)
+
+    partitions = int(config.get('event_store', {}).get('partitions', 0))
+    if partitions <= 0:
+        logwrapper.error('No event_store partitions configured. Shutting down.')
+        sys.exit()
+
+    db_name = config.get('sqlite_dbname', './anno_db.sqlite')
+
+    mongo_client = pymongo.MongoClient(config['mongo_db_address'])
+    doc_register = mongo_client['anno_db']['doc_register']
+    routes = [(entry['_id'], entry['project_id']) for entry in doc_register.find({}, {'project_id': 1})]
+
+    count = split(db_name, routes, partitions)
+    logwrapper.info(f'Moved {count} documents of {db_name} to {partitions} partitions.')
+
+
+if __name__ == '__main__':
+    main()
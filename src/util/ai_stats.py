@@ -0,0 +1,66 @@
+from collections import Counter
+
+
+# Key identifying an entity span.
+def entity_key(entity):
+    return entity['sentenceIndex'], entity['type'], entity['start'], entity['end']
+
+
+# Key identifying a relation by its type and the spans of head and tail.
+# None if head or tail can't be resolved.
+def relation_key(relation, entities):
+    head = entities.get(relation['head'])
+    tail = entities.get(relation['tail'])
+
+    if head is None or tail is None:
+        return None
+
+    return relation['type'], entity_key(head), entity_key(tail)
+
+
+# Number of matches between predictions and golden keys.
+# Every golden key can match at most one prediction, so duplicate spans are counted once per pair.
+def count_matches(pred_keys, golden_keys):
+    golden_counts = Counter(key for key in golden_keys if key is not None)
+
+    matches = 0
+    for key, count in Counter(key for key in pred_keys if key is not None).items():
+        matches += min(count, golden_counts.get(key, 0))
+
+    return matches
+
+
+# micro f1 from true positives, number of predictions and number of golden annotations
+def f1_micro(tp, num_preds, num_golden):
+    fp = num_preds - tp
+    fn = num_golden - tp
+
+    if fp == 0 and tp == 0 and fn == 0:
+        return 0
+
+    return (2 * tp) / (2 * tp + fp + fn + 1e-6)
+
+
+# calculate ai stats
+def get_ai_stats(ent_preds, ent_golden, rel_preds, rel_golden):
+    # no ai prediction, no ai stats
+    if len(ent_golden) == 0 and len(rel_golden) == 0:
+        return {
+            'ner_f1': -1,
+            'rel_f1': -1
+        }
+
+    # ent f1
+    ent_tp = count_matches((entity_key(pred) for pred in ent_preds.values()),
+                           (entity_key(golden) for golden in ent_golden.values()))
+    ent_f1 = f1_micro(ent_tp, len(ent_preds), len(ent_golden))
+
+    # rel f1 with ner
+    rel_tp = count_matches((relation_key(pred, ent_preds) for pred in rel_preds.values()),
+                           (relation_key(golden, ent_golden) for golden in rel_golden.values()))
+    rel_f1 = f1_micro(rel_tp, len(rel_preds), len(rel_golden))
+
+    return {
+        'ner_f1': ent_f1 * 100,
+        'rel_f1': rel_f1 * 100
+    }
@@ -1,44 +1,157 @@
 import json
+import queue
+import time
+
+from threading import Lock, Thread
 
 import requests as requests
+from requests.adapters import HTTPAdapter
 
 from src.service.EventService import EventService
 from src.util import serializer, logwrapper
 
 
-# sends an update to the document service
-def send_update_to_document_service(doc_id: str, user_id: str, entities: dict, sentence_entities: list,
-                                    relations: dict):
-    with open('./config.json', 'r') as f:
-        config = json.load(f)
+# Sends requests to the document and ai service in the background,
+# so a slow service doesn't block the api.
+class Dispatcher:
 
-    doc_address = config['doc_address'] + '/api/v1/documents/' + doc_id
-    data = {
-        'userId': user_id,
-        'entities': entities,
-        'sentence_entities': sentence_entities,
-        'relations': relations
-    }
-    requests.patch(doc_address, json=data)
-    logwrapper.info(f'Send update to: {doc_address}')
+    def __init__(self, config: dict):
+        self._doc_address = config['doc_address']
+        self._ai_address = config['ai_address']
+
+        dispatch_config = config.get('dispatcher', {})
+        self._max_retries = int(dispatch_config.get('max_retries', 3))
+        self._backoff = float(dispatch_config.get('backoff', 0.5))
+        self._timeout = float(dispatch_config.get('timeout', 30))
+        workers = int(dispatch_config.get('workers', 2))
+
+        # one session with keep-alive connections, shared by the workers
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=workers)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        self._queue = queue.Queue(maxsize=int(dispatch_config.get('queue_size', 1000)))
+
+        self._lock = Lock()
+        self._sent = 0
+        self._failed = 0
+        self._retries = 0
+        self._dropped = 0
+        self._wait_total = 0.0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+        self._workers = [Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    # Put a request in the queue. Returns False if the queue is full.
+    # on_done is called with the response (None if all attempts failed) in the worker.
+    def dispatch(self, method: str, url: str, data, on_done=None):
+        try:
+            self._queue.put_nowait((method, url, data, on_done, time.monotonic()))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            logwrapper.error(f'Dispatch queue full. Dropping {method} request to {url}.')
+            return False
+
+    def send_update_to_document_service(self, doc_id: str, data: dict):
+        return self.dispatch('PATCH', self._doc_address + '/api/v1/documents/' + doc_id, data)
 
+    def send_ai_training_request(self, req, on_done=None):
+        return self.dispatch('POST', self._ai_address + '/api/v1/train', req, on_done)
 
-# Send a training request to the ai service
-def send_ai_training_request(req):
-    with open('./config.json', 'r') as f:
-        config = json.load(f)
+    def send_ai_prediction_request(self, req, on_done=None):
+        return self.dispatch('POST', self._ai_address + '/api/v1/pred', req, on_done)
 
-    ai_address = config['ai_address'] + '/api/v1/train'
-    requests.post(ai_address, json=req)
+    # Wait until all queued requests are handled.
+    def join(self):
+        self._queue.join()
 
-    logwrapper.info(f'Send train request to AI.')
+    # Stop the workers after the queued requests are handled.
+    def shutdown(self):
+        for _ in self._workers:
+            self._queue.put((None, None, None, None, None))
+        for worker in self._workers:
+            worker.join()
+        self._session.close()
 
+    def stats(self):
+        with self._lock:
+            handled = self._sent + self._failed
+            return {
+                'queueDepth': self._queue.qsize(),
+                'sent': self._sent,
+                'failed': self._failed,
+                'retries': self._retries,
+                'dropped': self._dropped,
+                'avgQueueWaitMs': (self._wait_total / handled * 1000) if handled else 0,
+                'avgLatencyMs': (self._latency_total / handled * 1000) if handled else 0,
+                'maxLatencyMs': self._latency_max * 1000
+            }
 
-def send_ai_prediction_request(req):
-    with open('./config.json', 'r') as f:
-        config = json.load(f)
+    def _work(self):
+        while True:
+            method, url, data, on_done, enqueued = self._queue.get()
+            if method is None:
+                self._queue.task_done()
+                return
 
-    ai_address = config['ai_address'] + '/api/v1/pred'
-    requests.post(ai_address, json=req)
+            try:
+                started = time.monotonic()
+                response = self._send(method, url, data)
+                finished = time.monotonic()
 
-    logwrapper.info(f'Send pred request to AI.')
+                with self._lock:
+                    if response is not None:
+                        self._sent += 1
+                    else:
+                        self._failed += 1
+                    self._wait_total += started - enqueued
+                    self._latency_total += finished - started
+                    self._latency_max = max(self._latency_max, finished - started)
+
+                if on_done is not None:
+                    on_done(response)
+            except Exception as e:
+                logwrapper.error(f'Dispatching {method} request to {url} failed: {e}')
+            finally:
+                self._queue.task_done()
+
+    # Send with retries and exponential backoff on connection errors and 5xx responses.
+    def _send(self, method, url, data):
+        for attempt in range(self._max_retries + 1):
+            if attempt > 0:
+                with self._lock:
+                    self._retries += 1
+                time.sleep(self._backoff * 2 ** (attempt - 1))
+
+            try:
+                response = self._session.request(method, url, json=data, timeout=self._timeout)
+            except requests.RequestException as e:
+                logwrapper.warning(f'{method} request to {url} failed (attempt {attempt + 1}): {e}')
+                continue
+
+            if response.status_code < 500:
+                logwrapper.info(f'Send {method} request to: {url}')
+                return response
+
+            logwrapper.warning(f'{method} request to {url} failed (attempt {attempt + 1}): {response.status_code}')
+
+        logwrapper.error(f'Giving up {method} request to {url} after {self._max_retries + 1} attempts.')
+        return None
+
+
+# sends an update to the document service
+def send_update_to_document_service(dispatcher: Dispatcher, doc_id: str, user_id: str, entities: dict,
+                                    sentence_entities: list, relations: dict):
+    data = {
+        'userId': user_id,
+        'entities': entities,
+        'sentence_entities': sentence_entities,
+        'relations': relations
+    }
+    dispatcher.send_update_to_document_service(doc_id, data)
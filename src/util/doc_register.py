@@ -0,0 +1,50 @@
+import pymongo
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from src.util import logwrapper
+
+
+# Create the indexes of the doc register. Called once by the server.
+# Lookups by {project_id, doc_id, user_id} and {project_id, doc_id} use the unique index,
+# lookups by {doc_id} and {doc_id, project_id} from the listener the second one.
+def create_indexes(anno_db):
+    doc_register = anno_db['doc_register']
+
+    keys = [('project_id', pymongo.ASCENDING), ('doc_id', pymongo.ASCENDING), ('user_id', pymongo.ASCENDING)]
+    try:
+        doc_register.create_index(keys, unique=True, name='project_doc_user')
+    except OperationFailure as e:
+        # registers created before the index can contain duplicate entries
+        logwrapper.warning(f'Could not create unique doc register index, creating a non unique one: {e}')
+        doc_register.create_index(keys, name='project_doc_user')
+    doc_register.create_index([('doc_id', pymongo.ASCENDING), ('project_id', pymongo.ASCENDING)],
+                              name='doc_project')
+
+    logwrapper.info('Created doc register indexes.')
+
+
+# Get the doc register entry of a user for a document in a project, create it if it doesn't exist.
+# Existing entries are found with one indexed query. A new entry is inserted with an atomic upsert,
+# so concurrent requests for the same entry all end up with the same document.
+def get_or_create_entry(doc_register, event_service, project_id: str, doc_id: str, user_id: str):
+    query = {
+        'project_id': project_id,
+        'doc_id': doc_id,
+        'user_id': user_id
+    }
+
+    db_result = doc_register.find_one(query)
+    if db_result:
+        return db_result
+
+    # the document aggregate has to exist before the entry points to it
+    new_id = str(event_service.create_document(project_id))
+
+    try:
+        return doc_register.find_one_and_update(query, {'$setOnInsert': {'_id': new_id, 'id': new_id}},
+                                                upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # a concurrent request inserted the entry first
+        return doc_register.find_one(query)
@@ -1,15 +1,191 @@
 import json
+import queue
 
 import pika
 import uuid
 
+from collections import deque
+from functools import partial
+from threading import Barrier, Lock, Thread
+
 from src.service.EventService import EventService
 from src.util import logwrapper
+from src.util.prediction_tracker import PredictionTracker
+
+
+# handle one message from the exchange
+def handle_message(event_service: EventService, mongo_db, prediction_tracker: PredictionTracker, msg_type: str,
+                   body: dict):
+    # check for possible types
+    if msg_type == 'ai_update':
+        assert isinstance(body['project_id'], str)
+        assert isinstance(body['document_id'], str)
+        assert isinstance(body['recEntities'], dict)
+        assert isinstance(body['recSentenceEntities'], list)
+        assert isinstance(body['recRelations'], dict)
+
+        query = {'doc_id': body['document_id'], 'project_id': body['project_id']}
+        results = mongo_db['doc_register'].find(query)
+
+        for ele in results:
+            # update recs if not labelled. check if predictions already exist in doc aggregate
+            if not event_service.get_project(body['project_id']).is_labelled(uuid.UUID(body['document_id'])):
+                event_service.set_document_rec(ele['_id'], body['recEntities'], body['recSentenceEntities'],
+                                               body['recRelations'])
+
+        # prediction arrived, the next request for the document goes to the ai again
+        prediction_tracker.clear(body['project_id'], body['document_id'])
+
+        logwrapper.info(f'Received updated recommendations for document {body["document_id"]} in project '
+                        f'{body["project_id"]}')
+
+    elif msg_type == 'document_deleted':
+        if 'document_ids' in body:
+            assert isinstance(body['document_ids'], list)
+
+            # only the projects containing the documents are loaded
+            for doc_id in body['document_ids']:
+                for project in event_service.get_document_projects(doc_id):
+                    if uuid.UUID(doc_id) not in project.documents:
+                        continue
+
+                    logwrapper.info(f'Removing document {doc_id} from project {str(project.id)}')
+                    event_service.remove_document(str(project.id), doc_id)
+
+    elif msg_type == 'document_modified':
+        if 'document_ids' in body:
+            assert isinstance(body['document_ids'], list)
+
+            results = mongo_db['doc_register'].find({'doc_id': {'$in': body['document_ids']}})
+
+            # clear docuemnts labels and unmark docs in project
+            entries = []
+            for ele in results:
+                logwrapper.info(f'Clearing labels from user {ele["user_id"]} from document {ele["doc_id"]} '
+                                f'in project {ele["project_id"]}')
+                entries.append((ele['_id'], ele['project_id'], ele['doc_id']))
+
+            event_service.reset_documents(entries)
+
+
+# Handles messages concurrently on a fixed number of workers and acknowledges them manually.
+# ai_update messages of the same document always go to the same worker, so they are handled in order.
+# Messages about several documents (document_deleted, document_modified) are handled once all
+# earlier messages are done and before any later one starts.
+# Successfully handled messages are acknowledged in batches, failed ones are rejected.
+class ConcurrentConsumer:
+
+    def __init__(self, connection, channel, handler, workers: int = 4, ack_batch: int = 10):
+        self._connection = connection
+        self._channel = channel
+        self._handler = handler
+        self._ack_batch = ack_batch
+
+        # delivery tags in order of delivery and which of them are done
+        self._lock = Lock()
+        self._outstanding = deque()
+        self._done = set()
+        self._failed = set()
+        self._ack_to = None
+        self._unacked = 0
+
+        self._queues = [queue.Queue() for _ in range(workers)]
+        self._workers = [Thread(target=self._work, args=(q,), daemon=True) for q in self._queues]
+        for worker in self._workers:
+            worker.start()
+
+    # pika on_message_callback, runs on the connection thread
+    def on_message(self, ch, method, properties, body):
+        tag = method.delivery_tag
+        with self._lock:
+            self._outstanding.append(tag)
+
+        try:
+            body = json.loads(body)
+            msg_type = (properties.headers or {}).get('type')
+
+            if msg_type == 'ai_update':
+                shard = hash(body['document_id']) % len(self._queues)
+                self._queues[shard].put((tag, msg_type, body, None))
+            elif msg_type in ['document_deleted', 'document_modified']:
+                # every worker waits at the barrier, the first one handles the message
+                barrier = Barrier(len(self._queues))
+                for q in self._queues:
+                    q.put((tag, msg_type, body, barrier))
+            else:
+                # nothing to do
+                self._finish(tag, True)
+        except (ValueError, TypeError, KeyError) as e:
+            logwrapper.error(f'Could not parse message {tag}: {e}')
+            self._finish(tag, False)
+
+    # Stop the workers after the queued messages are handled.
+    def shutdown(self):
+        for q in self._queues:
+            q.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _work(self, q):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+
+            tag, msg_type, body, barrier = item
+            if barrier is not None:
+                # only the first worker handles the message, the others wait until it's done
+                if q is not self._queues[0]:
+                    barrier.wait()
+                    barrier.wait()
+                    continue
+                barrier.wait()
+
+            try:
+                self._handler(msg_type, body)
+                success = True
+            except Exception as e:
+                logwrapper.error(f'Handling {msg_type} message {tag} failed: {e}')
+                success = False
+            finally:
+                if barrier is not None:
+                    barrier.wait()
+
+            self._finish(tag, success)
+
+    # Mark a message as done. Acknowledges all messages up to the oldest one still in progress.
+    def _finish(self, tag, success):
+        with self._lock:
+            if not success:
+                self._failed.add(tag)
+                self._schedule(partial(self._channel.basic_nack, delivery_tag=tag, requeue=False))
+
+            self._done.add(tag)
+
+            while len(self._outstanding) > 0 and self._outstanding[0] in self._done:
+                first = self._outstanding.popleft()
+                self._done.remove(first)
+
+                # rejected messages are settled already
+                if first in self._failed:
+                    self._failed.remove(first)
+                else:
+                    self._ack_to = first
+                    self._unacked += 1
+
+            if self._unacked > 0 and (self._unacked >= self._ack_batch or len(self._outstanding) == 0):
+                self._schedule(partial(self._channel.basic_ack, delivery_tag=self._ack_to, multiple=True))
+                self._unacked = 0
+
+    # channels are not thread safe, run on the connection thread
+    def _schedule(self, callback):
+        self._connection.add_callback_threadsafe(callback)
 
 
 # thread to listening to rabbit mq
-def listening_thread(event_service: EventService, mongo_db, config):
+def listening_thread(event_service: EventService, mongo_db, prediction_tracker: PredictionTracker, config):
     rabbit_creds = config['rabbit_creds']
+    listener_config = config.get('listener', {})
 
     # define connection parameters
     creds = pika.PlainCredentials(rabbit_creds['user'], rabbit_creds['pw'])
@@ -25,68 +201,36 @@ def listening_thread(event_service: EventService, mongo_db, config):
     channel.exchange_declare(exchange=exchange, exchange_type='fanout', durable=True)
 
     # define and bind que
-    result = channel.queue_declare(queue='', exclusive=True)
+    # a named queue is durable and keeps the messages while the backend is down
+    if listener_config.get('queue'):
+        result = channel.queue_declare(queue=listener_config['queue'], durable=True)
+    else:
+        result = channel.queue_declare(queue='', exclusive=True)
 
     queue_name = result.method.queue
     channel.queue_bind(exchange=exchange, queue=queue_name)
 
-    # defines the callback method for the basic consume
-    def backend_callback(ch, method, properties, body):
-        logwrapper.info(f'ch -> {ch}')
-        logwrapper.info(f'method -> {method}')
-        logwrapper.info(f'properties -> {properties}')
-
-        body = json.loads(body)
-
-        # check if header has type
-        if 'type' in properties.headers:
-            # check for possible types
-            if properties.headers['type'] == 'ai_update':
-                assert isinstance(body['project_id'], str)
-                assert isinstance(body['document_id'], str)
-                assert isinstance(body['recEntities'], dict)
-                assert isinstance(body['recSentenceEntities'], list)
-                assert isinstance(body['recRelations'], dict)
-
-                query = {'doc_id': body['document_id'], 'project_id': body['project_id']}
-                results = mongo_db['doc_register'].find(query)
-
-                for ele in results:
-                    # update recs if not labelled. check if predictions already exist in doc aggregate
-                    if not event_service.get_project(body['project_id']).labelled[uuid.UUID(body['document_id'])]:
-                        event_service.set_document_rec(ele['_id'], body['recEntities'], body['recSentenceEntities'],
-                                                       body['recRelations'])
-
-                logwrapper.info(f'Received updated recommendations for document {body["document_id"]} in project '
-                                f'{body["project_id"]}')
-
-            elif properties.headers['type'] == 'document_deleted':
-                if 'document_ids' in body:
-                    assert isinstance(body['document_ids'], list)
-
-                    for project in event_service.get_all_projects():
-                        for doc_id in body['document_ids']:
-                            doc_uuid = uuid.UUID(doc_id)
-                            if doc_uuid in project.documents:
-                                logwrapper.info(f'Removing document {doc_id} from project {str(project.id)}')
-                                event_service.remove_document(str(project.id), doc_id)
-
-            elif properties.headers['type'] == 'document_modified':
-                if 'document_ids' in body:
-                    assert isinstance(body['document_ids'], list)
-
-                    for doc_id in body['document_ids']:
-                        query = {'doc_id': doc_id}
-                        results = mongo_db['doc_register'].find(query)
-
-                        # clear docuemnts labels and unmark docs in project
-                        for ele in results:
-                            logwrapper.info(f'Clearing labels from user {ele["user_id"]} from document {ele["doc_id"]} '
-                                            f'in project {ele["project_id"]}')
-                            event_service.reset_document(ele['_id'])
-                            event_service.unmark_document(ele['project_id'], ele['doc_id'])
-
-    channel.basic_consume(queue=queue_name, on_message_callback=backend_callback, auto_ack=True)
+    handler = partial(handle_message, event_service, mongo_db, prediction_tracker)
+
+    if listener_config.get('mode', 'concurrent') == 'concurrent':
+        channel.basic_qos(prefetch_count=int(listener_config.get('prefetch', 50)))
+
+        consumer = ConcurrentConsumer(connection, channel, handler, workers=int(listener_config.get('workers', 4)),
+                                      ack_batch=int(listener_config.get('ack_batch', 10)))
+        channel.basic_consume(queue=queue_name, on_message_callback=consumer.on_message, auto_ack=False)
+    else:
+        # defines the callback method for the basic consume
+        def backend_callback(ch, method, properties, body):
+            logwrapper.info(f'method -> {method}')
+
+            body = json.loads(body)
+
+            # check if header has type
+            if 'type' in (properties.headers or {}):
+                handler(properties.headers['type'], body)
+
+        channel.basic_consume(queue=queue_name, on_message_callback=backend_callback, auto_ack=True)
+
     logwrapper.info(f'Start consuming for que {queue_name} on exchange {exchange}')
 
     try:
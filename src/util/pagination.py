@@ -0,0 +1,60 @@
+from flask_restful import abort
+
+
+# Read offset and limit of a list request from the query string (?offset=0&limit=100).
+# The limit is capped, so a single request can't return a whole collection.
+def get_page(args, default_limit: int = 100, max_limit: int = 1000):
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        abort(400, message='offset and limit have to be integers.')
+
+    if offset < 0 or limit < 1:
+        abort(400, message='offset has to be >= 0 and limit >= 1.')
+
+    return offset, min(limit, max_limit)
+
+
+# Read cursor and limit of a list request from the query string (?cursor=1234&limit=100).
+# The cursor is the one returned with the previous page, 0 for the first page.
+def get_cursor_page(args, default_limit: int = 100, max_limit: int = 1000):
+    try:
+        cursor = int(args.get('cursor', 0))
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        abort(400, message='cursor and limit have to be integers.')
+
+    if cursor < 0 or limit < 1:
+        abort(400, message='cursor has to be >= 0 and limit >= 1.')
+
+    return cursor, min(limit, max_limit)
+
+
+# Mongo projection for the fields requested in the query string (?fields=name,labels).
+# None returns all fields.
+def get_projection(args):
+    fields = args.get('fields')
+    if not fields:
+        return None
+
+    projection = {field: 1 for field in fields.split(',') if field}
+    projection['id'] = 1
+    return projection
+
+
+# Fields requested in the query string (?fields=labelled,aiStats) as a set, None for all fields.
+def get_fields(args):
+    fields = args.get('fields')
+    if not fields:
+        return None
+
+    return {field for field in fields.split(',') if field} | {'id'}
+
+
+# Limit the keys of a row to the requested fields.
+def select_fields(row: dict, fields):
+    if fields is None:
+        return row
+
+    return {key: val for key, val in row.items() if key in fields}
@@ -0,0 +1,58 @@
+import os
+import sqlite3
+
+from threading import Lock
+from uuid import UUID
+
+
+# Partition of the documents of a project. Stable as long as the number of partitions doesn't change.
+def partition_of(project_id, partitions: int) -> int:
+    return UUID(str(project_id)).int % partitions
+
+
+# SQLite file of a partition next to the main event store, e.g. anno_db.sqlite -> anno_db.part3.sqlite
+def partition_db_name(db_name: str, partition: int) -> str:
+    root, ext = os.path.splitext(db_name)
+    return f'{root}.part{partition}{ext}'
+
+
+# Routing table of the partitioned document store: document aggregate id -> partition.
+# Stored in the main SQLite event store (in memory for the POPO event store). Documents without
+# a route are in the main store. Routes are cached, they only change while the server is stopped
+# (python -m src.tools.split_event_store).
+class DocumentRoutes:
+    create_table_statement = ('CREATE TABLE IF NOT EXISTS document_partitions ('
+                              'doc_id TEXT PRIMARY KEY, '
+                              'partition INTEGER) '
+                              'WITHOUT ROWID')
+
+    def __init__(self, db_name: str = None):
+        self._routes = {}
+        self._lock = Lock()
+        self._connection = None
+
+        if db_name is not None:
+            self._connection = sqlite3.connect(db_name, check_same_thread=False, isolation_level=None, timeout=10)
+            self._connection.execute(self.create_table_statement)
+
+    # The partition of a document, None if it is in the main store.
+    def get(self, doc_id: UUID):
+        with self._lock:
+            if doc_id in self._routes or self._connection is None:
+                return self._routes.get(doc_id)
+
+            row = self._connection.execute('SELECT partition FROM document_partitions WHERE doc_id=?',
+                                           (doc_id.hex,)).fetchone()
+            self._routes[doc_id] = row[0] if row else None
+            return self._routes[doc_id]
+
+    def add(self, doc_id: UUID, partition: int):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.execute('INSERT OR REPLACE INTO document_partitions VALUES (?,?)',
+                                         (doc_id.hex, partition))
+            self._routes[doc_id] = partition
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
@@ -0,0 +1,343 @@
+import os
+import re
+import sqlite3
+import time
+import zlib
+
+import orjson
+
+from collections import deque
+from threading import Event, Lock
+
+from eventsourcing.persistence import Compressor, IntegrityError, JSONTranscoder
+from eventsourcing.sqlite import (Factory as SQLiteFactory, SQLiteApplicationRecorder, SQLiteConnectionPool,
+                                  SQLiteProcessRecorder)
+from eventsourcing.utils import get_topic, resolve_topic
+
+
+# Compressors of the stored event state, selected with the "compression" of the event store config.
+# The state written without compression is JSON and always starts with "{", which no compressed
+# state does, so events stored before compression was turned on are still read.
+# prefix is the start of every compressed state.
+class ZlibCompressor(Compressor):
+    prefix = b'\x78'
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        if data[:1] == b'{':
+            return data
+        return zlib.decompress(data)
+
+
+# Needs the lz4 package (pip install lz4).
+class Lz4Compressor(Compressor):
+    prefix = b'\x04\x22\x4d\x18'
+
+    def __init__(self):
+        import lz4.frame
+        self._lz4 = lz4.frame
+
+    def compress(self, data: bytes) -> bytes:
+        return self._lz4.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        if data[:1] == b'{':
+            return data
+        return self._lz4.decompress(data)
+
+
+compressors = {
+    'zlib': ZlibCompressor,
+    'lz4': Lz4Compressor
+}
+
+
+# JSON transcoder that decodes with orjson.
+# Values of registered types (datetimes, UUIDs, ...) are stored as {"_type_": ..., "_data_": ...} objects.
+# Most events only have them at the top level (e.g. the timestamp), those are decoded here.
+# Events with nested ones are decoded by the json module with the object hook, like before.
+# Encoding stays with the json module, orjson would write UUIDs as plain strings.
+class OrjsonTranscoder(JSONTranscoder):
+
+    def decode(self, data: bytes):
+        typed = data.count(b'"_type_"')
+        try:
+            obj = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN or integers beyond 64 bit, which the json module writes
+            return super().decode(data)
+        if typed == 0:
+            return obj
+        if not isinstance(obj, dict):
+            return super().decode(data)
+
+        for key, val in obj.items():
+            if isinstance(val, dict) and len(val) == 2 and '_type_' in val and '_data_' in val:
+                obj[key] = self._decode_obj(val)
+                typed -= 1
+
+        if typed > 0:
+            return super().decode(data)
+        return obj
+
+
+transcoders = {
+    'json': JSONTranscoder,
+    'orjson': OrjsonTranscoder
+}
+
+
+# Pragmas run on every new SQLite connection, as "name=value;name=value" in SQLITE_PRAGMAS.
+# The connections are already in WAL mode (eventsourcing sets it on the first connection).
+default_pragmas = {
+    # fsync on every commit, so a save that returned survives a power loss
+    'synchronous': 'FULL',
+    # 32 MiB page cache per connection
+    'cache_size': -32768,
+    'temp_store': 'MEMORY'
+}
+
+
+def parse_pragmas(value: str) -> list:
+    pragmas = []
+    for pragma in filter(None, value.split(';')):
+        name, _, val = pragma.partition('=')
+        if not re.fullmatch(r'[a-z_]+', name.strip()) or not re.fullmatch(r'-?\w+', val.strip()):
+            raise ValueError(f'Invalid SQLite pragma {pragma!r}.')
+        pragmas.append((name.strip(), val.strip()))
+    return pragmas
+
+
+class SQLitePragmaConnectionPool(SQLiteConnectionPool):
+
+    def __init__(self, pragmas: list, **kwargs):
+        super().__init__(**kwargs)
+        self.pragmas = pragmas
+
+    def _create_connection(self):
+        connection = super()._create_connection()
+        for name, value in self.pragmas:
+            connection._sqlite_conn.execute(f'PRAGMA {name}={value}')
+        return connection
+
+
+class _Batch:
+    __slots__ = ('stored_events', 'kwargs', 'result', 'error', 'committed', 'wake')
+
+    def __init__(self, stored_events, kwargs):
+        self.stored_events = stored_events
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.committed = False
+        # set when the batch is committed or its save has to lead the next group
+        self.wake = Event()
+
+
+# Application recorder that commits the events of concurrent saves in one transaction (group commit).
+# The first save waits group_commit_window seconds for others (unless no other save is running),
+# then writes every waiting batch in its own savepoint and commits once. A batch with a version
+# conflict is rolled back to its savepoint and only its save gets the IntegrityError. Every save returns
+# after the commit that contains its events, so a returned save is as durable as without grouping.
+# The leader only commits the group with its own batch, then the oldest waiting save leads the next
+# group, so a save never waits for more than the groups before it.
+# A window of 0 commits every save on its own.
+class GroupCommitApplicationRecorder(SQLiteApplicationRecorder):
+    group_commit_window = 0.0
+    group_commit_max_events = 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._group_lock = Lock()
+        self._group_pending = deque()
+        self._group_leader = False
+        self._group_saves = 0
+
+        self.group_commits = 0
+        self.grouped_saves = 0
+
+    def insert_events(self, stored_events, **kwargs):
+        if self.group_commit_window <= 0:
+            return super().insert_events(stored_events, **kwargs)
+
+        batch = _Batch(stored_events, kwargs)
+        with self._group_lock:
+            self._group_pending.append(batch)
+            self._group_saves += 1
+            leader = not self._group_leader
+            self._group_leader = True
+            alone = self._group_saves == 1
+
+        try:
+            self._insert_batch(batch, leader, alone)
+        finally:
+            with self._group_lock:
+                self._group_saves -= 1
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+
+    def _insert_batch(self, batch, leader, alone):
+        if leader:
+            if not alone:
+                time.sleep(self.group_commit_window)
+        else:
+            # a save handed the lead to this one has waited long enough, it commits right away
+            batch.wake.wait()
+            if batch.committed:
+                return
+
+        # the batch of the leader is the oldest waiting one
+        with self._group_lock:
+            group = [self._group_pending.popleft()]
+            size = len(group[0].stored_events)
+            while (len(self._group_pending) > 0 and
+                   size + len(self._group_pending[0].stored_events) <= self.group_commit_max_events):
+                group.append(self._group_pending.popleft())
+                size += len(group[-1].stored_events)
+            next_leader = self._group_pending[0] if len(self._group_pending) > 0 else None
+            self._group_leader = next_leader is not None
+        assert group[0] is batch
+
+        try:
+            self._commit_group(group)
+        finally:
+            if next_leader is not None:
+                next_leader.wake.set()
+
+    def _commit_group(self, group):
+        try:
+            with self.datastore.transaction(commit=True) as c:
+                for batch in group:
+                    c.execute('SAVEPOINT batch')
+                    try:
+                        batch.result = self._insert_events(c, batch.stored_events, **batch.kwargs)
+                    except sqlite3.IntegrityError as e:
+                        c.execute('ROLLBACK TO batch')
+                        batch.error = IntegrityError(e)
+                    c.execute('RELEASE batch')
+            self.group_commits += 1
+            self.grouped_saves += len(group)
+        except Exception as e:
+            for batch in group:
+                batch.result = None
+                batch.error = e
+        finally:
+            for batch in group:
+                batch.committed = True
+                batch.wake.set()
+
+
+# SQLite factory with the transcoder selected by the TRANSCODER_TOPIC environment variable,
+# the connection pragmas of SQLITE_PRAGMAS and the group commit window of GROUP_COMMIT_WINDOW (seconds).
+# Process applications write from the runner thread only, so their saves are not grouped.
+class Factory(SQLiteFactory):
+    TRANSCODER_TOPIC = 'TRANSCODER_TOPIC'
+    SQLITE_PRAGMAS = 'SQLITE_PRAGMAS'
+    GROUP_COMMIT_WINDOW = 'GROUP_COMMIT_WINDOW'
+    GROUP_COMMIT_MAX_EVENTS = 'GROUP_COMMIT_MAX_EVENTS'
+
+    def __init__(self, env):
+        super().__init__(env)
+        pragmas = self.env.get(self.SQLITE_PRAGMAS)
+        if pragmas:
+            pool = self.datastore.pool
+            self.datastore.pool = SQLitePragmaConnectionPool(parse_pragmas(pragmas), db_name=pool.db_name,
+                                                             lock_timeout=pool.lock_timeout)
+
+    def transcoder(self):
+        topic = self.env.get(self.TRANSCODER_TOPIC)
+        if topic:
+            return resolve_topic(topic)()
+        return super().transcoder()
+
+    def application_recorder(self):
+        recorder = GroupCommitApplicationRecorder(datastore=self.datastore)
+        recorder.group_commit_window = float(self.env.get(self.GROUP_COMMIT_WINDOW) or 0)
+        recorder.group_commit_max_events = int(self.env.get(self.GROUP_COMMIT_MAX_EVENTS) or 1000)
+        if self.env_create_table():
+            recorder.create_table()
+        return recorder
+
+
+# Event sourcing configuration.
+# Has to be called before the EventService (or any application) is created.
+# The "event_store" config selects the compression (none, "zlib" or "lz4") of the stored events
+# and the JSON codec ("json" or "orjson"). python -m src.tools.migrate_event_store compresses the
+# events stored before compression was turned on, it has to run before compression is turned off again.
+# "pragmas" are added to (or replace) the default_pragmas of the SQLite connections.
+# "group_commit_ms" > 0 groups concurrent saves into one transaction (see GroupCommitApplicationRecorder).
+def configure_persistence(config: dict):
+    #os.environ["PERSISTENCE_MODULE"] = "eventsourcing.postgres"
+    #os.environ['INFRASTRUCTURE_FACTORY'] = 'eventsourcing.postgres:Factory'
+    #os.environ['POSTGRES_DBNAME'] = 'anno_events'
+    #os.environ['POSTGRES_HOST'] = '127.0.0.1'
+    #os.environ['POSTGRES_PORT'] = '27017'
+    #os.environ['POSTGRES_USER'] = 'gnuma'
+    #os.environ['POSTGRES_PASSWORD'] = 'gnuma'
+    #os.environ['POSTGRES_CONN_MAX_AGE'] = '10'
+    #os.environ['POSTGRES_PRE_PING'] = 'y'
+    #os.environ['POSTGRES_LOCK_TIMEOUT'] = '5'
+    #os.environ['POSTGRES_IDLE_IN_TRANSACTION_SESSION_TIMEOUT'] = '5'
+
+    os.environ["PERSISTENCE_MODULE"] = get_topic(Factory)
+    os.environ["SQLITE_DBNAME"] = config.get('sqlite_dbname', './anno_db.sqlite')
+    os.environ["SQLITE_LOCK_TIMEOUT"] = "10"
+
+    event_store_config = config.get('event_store', {})
+
+    compression = event_store_config.get('compression')
+    if compression:
+        os.environ["COMPRESSOR_TOPIC"] = get_topic(compressors[compression])
+    else:
+        os.environ.pop("COMPRESSOR_TOPIC", None)
+
+    os.environ["TRANSCODER_TOPIC"] = get_topic(transcoders[event_store_config.get('codec', 'json')])
+
+    pragmas = dict(default_pragmas, **event_store_config.get('pragmas', {}))
+    os.environ["SQLITE_PRAGMAS"] = ';'.join(f'{name}={value}' for name, value in pragmas.items())
+    os.environ["GROUP_COMMIT_WINDOW"] = str(float(event_store_config.get('group_commit_ms', 0)) / 1000)
+    os.environ["GROUP_COMMIT_MAX_EVENTS"] = str(int(event_store_config.get('group_commit_max_events', 1000)))
+
+
+# SQLite process recorder with its own tracking table.
+# The default one keeps the position of all process applications in one table,
+# keyed by the name of the leader, so two followers of the same leader collide.
+class SQLiteTrackingProcessRecorder(SQLiteProcessRecorder):
+
+    def __init__(self, datastore, tracking_table_name: str):
+        self.tracking_table_name = tracking_table_name
+        super().__init__(datastore)
+        self.insert_tracking_statement = f'INSERT INTO {tracking_table_name} VALUES (?,?)'
+        self.select_max_tracking_id_statement = (
+            f'SELECT MAX(notification_id) FROM {tracking_table_name} WHERE application_name=?'
+        )
+        self.count_tracking_id_statement = (
+            f'SELECT COUNT(*) FROM {tracking_table_name} WHERE application_name=? AND notification_id=?'
+        )
+
+    def construct_create_table_statements(self):
+        statements = super().construct_create_table_statements()
+        statements.append(
+            f'CREATE TABLE IF NOT EXISTS {self.tracking_table_name} ('
+            'application_name TEXT, '
+            'notification_id INTEGER, '
+            'PRIMARY KEY '
+            '(application_name, notification_id)) '
+            'WITHOUT ROWID'
+        )
+        return statements
+
+
+# Process recorder of a process application, with its own tracking table if stored in SQLite.
+def construct_process_recorder(app, tracking_table_name: str):
+    if isinstance(app.factory, SQLiteFactory):
+        recorder = SQLiteTrackingProcessRecorder(app.factory.datastore, tracking_table_name)
+        if app.factory.env_create_table():
+            recorder.create_table()
+        return recorder
+
+    return app.factory.process_recorder()
@@ -0,0 +1,74 @@
+import time
+
+from threading import Lock
+
+from src.util import logwrapper
+
+
+# Remembers which documents are waiting for a prediction of the ai service,
+# so opening the same document again doesn't send the same prediction request.
+# An entry is cleared by the ai_update message or expires after `ttl` seconds.
+class PredictionTracker:
+
+    def __init__(self, dispatcher, ttl: float):
+        self._dispatcher = dispatcher
+        self._ttl = ttl
+
+        self._in_flight = {}
+        self._lock = Lock()
+
+        self._sent = 0
+        self._avoided = 0
+        self._expired = 0
+
+    # Send a prediction request unless one for the document is in flight.
+    # Returns True if a request was sent.
+    def request(self, project_id: str, doc_id: str, req):
+        key = (project_id, doc_id)
+        now = time.monotonic()
+
+        with self._lock:
+            expires = self._in_flight.get(key)
+            if expires is not None:
+                if expires > now:
+                    self._avoided += 1
+                    logwrapper.info(f'Prediction for document {doc_id} in project {project_id} already requested.')
+                    return False
+                self._expired += 1
+
+            # the expiry is the token of this request, a late failure of an expired request
+            # doesn't clear the entry of the request that replaced it
+            expires = now + self._ttl
+            self._in_flight[key] = expires
+            self._sent += 1
+
+            # drop old entries now and then
+            if len(self._in_flight) > 1000:
+                self._in_flight = {k: v for k, v in self._in_flight.items() if v > now}
+
+        def on_done(response):
+            # failed => allow a new request right away
+            if response is None or response.status_code >= 400:
+                self.clear(project_id, doc_id, expires)
+
+        if not self._dispatcher.send_ai_prediction_request(req, on_done=on_done):
+            self.clear(project_id, doc_id, expires)
+
+        return True
+
+    # The prediction for the document arrived, or the request with the token `expires` failed.
+    def clear(self, project_id: str, doc_id: str, expires: float = None):
+        key = (project_id, doc_id)
+        with self._lock:
+            if expires is None or self._in_flight.get(key) == expires:
+                self._in_flight.pop(key, None)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'sent': self._sent,
+                'avoided': self._avoided,
+                'expired': self._expired,
+                'inFlight': sum(1 for expires in self._in_flight.values() if expires > now)
+            }
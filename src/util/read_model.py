@@ -0,0 +1,390 @@
+import json
+
+from collections import defaultdict
+
+from eventsourcing.popo import Factory as POPOFactory, POPOProcessRecorder
+from eventsourcing.sqlite import Factory as SQLiteFactory
+
+from src.util.persistence import SQLiteTrackingProcessRecorder
+
+
+# Denormalized rows of the projects and their documents, in the shape the API returns them.
+# The process application passes its changes to the recorder as `read_model_changes`,
+# so they are stored in the same transaction as the tracking record of the processed event.
+# A change is a tuple of the operation name and its arguments:
+#   ('create_project', project_id, position, name, date, creator, label_set_id, relation_set_id)
+#   ('update_project', project_id, name, creator)
+#   ('delete_project', project_id)
+#   ('add_document', project_id, doc_id, position)
+#   ('remove_document', project_id, doc_id)
+#   ('mark_document', project_id, doc_id, user_id, ai_stats)
+#   ('unmark_document', project_id, doc_id)
+
+# Changes of document rows, the counts of their project have to be updated.
+document_changes = {'add_document', 'remove_document', 'mark_document', 'unmark_document'}
+
+
+def default_ai_stats():
+    return {
+        'ner_f1': -1,
+        'rel_f1': -1
+    }
+
+
+# Read model rows in SQLite, next to the event store.
+# Document rows are ordered by their position (derived from the notification id of the event
+# that added the document), which is the cursor of paginated reads. Indexes by position,
+# by labelled and by labelling user keep filtered pages from scanning the documents of the project.
+class SQLiteReadModelRecorder(SQLiteTrackingProcessRecorder):
+
+    read_model_tables = ['project_rows', 'project_document_rows', 'project_document_labellers']
+
+    def construct_create_table_statements(self):
+        statements = super().construct_create_table_statements()
+        statements.append(
+            'CREATE TABLE IF NOT EXISTS project_rows ('
+            'project_id TEXT PRIMARY KEY, '
+            'position INTEGER, '
+            'name TEXT, '
+            'date TEXT, '
+            'creator TEXT, '
+            'label_set_id TEXT, '
+            'relation_set_id TEXT, '
+            'deleted INTEGER, '
+            'document_count INTEGER, '
+            'labelled_count INTEGER)'
+        )
+        statements.append(
+            'CREATE TABLE IF NOT EXISTS project_document_rows ('
+            'project_id TEXT, '
+            'doc_id TEXT, '
+            'position INTEGER, '
+            'labelled INTEGER, '
+            'labelled_by TEXT, '
+            'ai_stats TEXT, '
+            'ner_f1 REAL, '
+            'rel_f1 REAL, '
+            'PRIMARY KEY (project_id, doc_id)) '
+            'WITHOUT ROWID'
+        )
+        statements.append(
+            'CREATE INDEX IF NOT EXISTS project_document_rows_position '
+            'ON project_document_rows (project_id, position)'
+        )
+        statements.append(
+            'CREATE INDEX IF NOT EXISTS project_document_rows_labelled '
+            'ON project_document_rows (project_id, labelled, position)'
+        )
+        statements.append(
+            'CREATE TABLE IF NOT EXISTS project_document_labellers ('
+            'project_id TEXT, '
+            'user_id TEXT, '
+            'position INTEGER, '
+            'doc_id TEXT, '
+            'PRIMARY KEY (project_id, user_id, position, doc_id)) '
+            'WITHOUT ROWID'
+        )
+        return statements
+
+    def _insert_events(self, c, stored_events, **kwargs):
+        returning = super()._insert_events(c, stored_events, **kwargs)
+
+        # the counts of a project are updated once, after all its document changes
+        counted = set()
+        for change in kwargs.get('read_model_changes', ()):
+            getattr(self, f'_{change[0]}')(c, *change[1:])
+            if change[0] in document_changes:
+                counted.add(change[1])
+        for project_id in counted:
+            self._count(c, project_id)
+
+        return returning
+
+    def _create_project(self, c, project_id, position, name, date, creator, label_set_id, relation_set_id):
+        c.execute('INSERT OR REPLACE INTO project_rows VALUES (?,?,?,?,?,?,?,0,0,0)',
+                  (project_id, position, name, date, creator, label_set_id, relation_set_id))
+
+    def _update_project(self, c, project_id, name, creator):
+        c.execute('UPDATE project_rows SET name=?, creator=? WHERE project_id=?', (name, creator, project_id))
+
+    def _delete_project(self, c, project_id):
+        c.execute('UPDATE project_rows SET deleted=1 WHERE project_id=?', (project_id,))
+
+    def _add_document(self, c, project_id, doc_id, position):
+        ai_stats = default_ai_stats()
+        c.execute('INSERT OR REPLACE INTO project_document_rows VALUES (?,?,?,0,?,?,?,?)',
+                  (project_id, doc_id, position, '[]', json.dumps(ai_stats), ai_stats['ner_f1'], ai_stats['rel_f1']))
+        c.execute('DELETE FROM project_document_labellers WHERE project_id=? AND doc_id=?', (project_id, doc_id))
+
+    def _remove_document(self, c, project_id, doc_id):
+        c.execute('DELETE FROM project_document_rows WHERE project_id=? AND doc_id=?', (project_id, doc_id))
+        c.execute('DELETE FROM project_document_labellers WHERE project_id=? AND doc_id=?', (project_id, doc_id))
+
+    def _mark_document(self, c, project_id, doc_id, user_id, ai_stats):
+        c.execute('SELECT labelled_by, position FROM project_document_rows WHERE project_id=? AND doc_id=?',
+                  (project_id, doc_id))
+        row = c.fetchone()
+        if row is None:
+            return
+
+        labelled_by = json.loads(row[0])
+        if user_id not in labelled_by:
+            labelled_by.append(user_id)
+            c.execute('UPDATE project_document_rows SET labelled=1, labelled_by=?, ai_stats=?, ner_f1=?, rel_f1=? '
+                      'WHERE project_id=? AND doc_id=?',
+                      (json.dumps(labelled_by), json.dumps(ai_stats), ai_stats.get('ner_f1', -1),
+                       ai_stats.get('rel_f1', -1), project_id, doc_id))
+            c.execute('INSERT OR REPLACE INTO project_document_labellers VALUES (?,?,?,?)',
+                      (project_id, user_id, row[1], doc_id))
+        else:
+            c.execute('UPDATE project_document_rows SET labelled=1 WHERE project_id=? AND doc_id=?',
+                      (project_id, doc_id))
+
+    def _unmark_document(self, c, project_id, doc_id):
+        ai_stats = default_ai_stats()
+        c.execute('UPDATE project_document_rows SET labelled=0, labelled_by=?, ai_stats=?, ner_f1=?, rel_f1=? '
+                  'WHERE project_id=? AND doc_id=?',
+                  ('[]', json.dumps(ai_stats), ai_stats['ner_f1'], ai_stats['rel_f1'], project_id, doc_id))
+        c.execute('DELETE FROM project_document_labellers WHERE project_id=? AND doc_id=?', (project_id, doc_id))
+
+    def _count(self, c, project_id):
+        c.execute('UPDATE project_rows SET '
+                  'document_count=(SELECT COUNT(*) FROM project_document_rows WHERE project_id=?), '
+                  'labelled_count=(SELECT COUNT(*) FROM project_document_rows WHERE project_id=? AND labelled=1) '
+                  'WHERE project_id=?', (project_id, project_id, project_id))
+
+    @staticmethod
+    def _project_row(row):
+        return {
+            'id': row[0],
+            'name': row[2],
+            'date': row[3],
+            'creator': row[4],
+            'labelSetId': row[5],
+            'relationSetId': row[6],
+            'deleted': bool(row[7]),
+            'documentCount': row[8],
+            'labelledCount': row[9]
+        }
+
+    @staticmethod
+    def _document_row(row):
+        return {
+            'id': row[0],
+            'labelled': bool(row[1]),
+            'labelledBy': json.loads(row[2]),
+            'aiStats': json.loads(row[3])
+        }
+
+    # All projects that are not deleted, in the order they were created.
+    def select_projects(self):
+        with self.datastore.transaction(commit=False) as c:
+            c.execute('SELECT * FROM project_rows WHERE deleted=0 ORDER BY position')
+            return [self._project_row(row) for row in c.fetchall()]
+
+    def select_project(self, project_id: str):
+        with self.datastore.transaction(commit=False) as c:
+            c.execute('SELECT * FROM project_rows WHERE project_id=?', (project_id,))
+            row = c.fetchone()
+            return self._project_row(row) if row else None
+
+    # Document rows of a project after the position `after`, in the order they were added,
+    # as a list of (position, row). Optionally filtered by labelled, by a user that labelled the
+    # document and by aiStats below a threshold (documents without stats, -1, don't match).
+    def select_documents(self, project_id: str, after: int = 0, limit: int = None, labelled: bool = None,
+                         labelled_by: str = None, max_ner_f1: float = None, max_rel_f1: float = None):
+        if labelled_by is not None:
+            statement = ('SELECT d.doc_id, d.labelled, d.labelled_by, d.ai_stats, d.position '
+                         'FROM project_document_labellers l JOIN project_document_rows d '
+                         'ON d.project_id=l.project_id AND d.doc_id=l.doc_id '
+                         'WHERE l.project_id=? AND l.user_id=? AND l.position>?')
+            params = [project_id, labelled_by, after]
+            order = 'l.position'
+        else:
+            statement = ('SELECT d.doc_id, d.labelled, d.labelled_by, d.ai_stats, d.position '
+                         'FROM project_document_rows d WHERE d.project_id=? AND d.position>?')
+            params = [project_id, after]
+            order = 'd.position'
+
+        if labelled is not None:
+            statement += ' AND d.labelled=?'
+            params.append(int(labelled))
+        if max_ner_f1 is not None:
+            statement += ' AND d.ner_f1>=0 AND d.ner_f1<?'
+            params.append(max_ner_f1)
+        if max_rel_f1 is not None:
+            statement += ' AND d.rel_f1>=0 AND d.rel_f1<?'
+            params.append(max_rel_f1)
+
+        statement += f' ORDER BY {order}'
+        if limit is not None:
+            statement += ' LIMIT ?'
+            params.append(limit)
+
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, params)
+            return [(row[4], self._document_row(row)) for row in c.fetchall()]
+
+    # Document ids of several projects at once, read with the (project_id, position) index.
+    # The project ids are passed in batches below SQLite's limit of statement parameters.
+    def select_document_ids(self, project_ids: list, batch_size: int = 500):
+        doc_ids = {project_id: [] for project_id in project_ids}
+        batches = [list(doc_ids)[i:i + batch_size] for i in range(0, len(doc_ids), batch_size)]
+        with self.datastore.transaction(commit=False) as c:
+            for batch in batches:
+                c.execute('SELECT project_id, doc_id FROM project_document_rows '
+                          f'WHERE project_id IN ({",".join("?" * len(batch))}) ORDER BY project_id, position', batch)
+                for project_id, doc_id in c.fetchall():
+                    doc_ids[project_id].append(doc_id)
+        return doc_ids
+
+    # Remove all rows and the tracking records, so the read model can be rebuilt from the start.
+    # The tables are created again, so a rebuild also brings them to the current schema.
+    def clear(self):
+        with self.datastore.transaction(commit=True) as c:
+            for table in self.read_model_tables:
+                c.execute(f'DROP TABLE IF EXISTS {table}')
+            c.execute(f'DELETE FROM {self.tracking_table_name}')
+        self.create_table()
+
+
+# Read model rows in memory, for the in-memory event store.
+class POPOReadModelRecorder(POPOProcessRecorder):
+
+    def __init__(self):
+        super().__init__()
+        self._projects = {}
+        self._documents = defaultdict(dict)
+        self._positions = defaultdict(dict)
+
+    def _update_table(self, stored_events, **kwargs):
+        notification_ids = super()._update_table(stored_events, **kwargs)
+
+        counted = set()
+        for change in kwargs.get('read_model_changes', ()):
+            getattr(self, f'_{change[0]}')(*change[1:])
+            if change[0] in document_changes:
+                counted.add(change[1])
+        for project_id in counted:
+            self._count(project_id)
+
+        return notification_ids
+
+    def _create_project(self, project_id, position, name, date, creator, label_set_id, relation_set_id):
+        self._projects[project_id] = {
+            'id': project_id,
+            'name': name,
+            'date': date,
+            'creator': creator,
+            'labelSetId': label_set_id,
+            'relationSetId': relation_set_id,
+            'deleted': False,
+            'documentCount': 0,
+            'labelledCount': 0
+        }
+
+    def _update_project(self, project_id, name, creator):
+        if project_id in self._projects:
+            self._projects[project_id].update(name=name, creator=creator)
+
+    def _delete_project(self, project_id):
+        if project_id in self._projects:
+            self._projects[project_id]['deleted'] = True
+
+    def _add_document(self, project_id, doc_id, position):
+        # re-added documents move to the end, like in the aggregate
+        self._documents[project_id].pop(doc_id, None)
+        self._documents[project_id][doc_id] = {
+            'id': doc_id,
+            'labelled': False,
+            'labelledBy': [],
+            'aiStats': default_ai_stats()
+        }
+        self._positions[project_id][doc_id] = position
+
+    def _remove_document(self, project_id, doc_id):
+        self._documents[project_id].pop(doc_id, None)
+        self._positions[project_id].pop(doc_id, None)
+
+    def _mark_document(self, project_id, doc_id, user_id, ai_stats):
+        row = self._documents[project_id].get(doc_id)
+        if row is None:
+            return
+
+        row['labelled'] = True
+        if user_id not in row['labelledBy']:
+            row['labelledBy'] = row['labelledBy'] + [user_id]
+            row['aiStats'] = ai_stats
+
+    def _unmark_document(self, project_id, doc_id):
+        if doc_id in self._documents[project_id]:
+            self._documents[project_id][doc_id] = {
+                'id': doc_id,
+                'labelled': False,
+                'labelledBy': [],
+                'aiStats': default_ai_stats()
+            }
+
+    def _count(self, project_id):
+        if project_id in self._projects:
+            rows = self._documents[project_id].values()
+            self._projects[project_id].update(documentCount=len(rows),
+                                              labelledCount=sum(1 for row in rows if row['labelled']))
+
+    # Rows are copied, so callers can't change the read model.
+    def select_projects(self):
+        with self._database_lock:
+            return [dict(row) for row in self._projects.values() if not row['deleted']]
+
+    def select_project(self, project_id: str):
+        with self._database_lock:
+            row = self._projects.get(project_id)
+            return dict(row) if row else None
+
+    # Same as the SQLite version, but scans the documents of the project.
+    def select_documents(self, project_id: str, after: int = 0, limit: int = None, labelled: bool = None,
+                         labelled_by: str = None, max_ner_f1: float = None, max_rel_f1: float = None):
+        out = []
+        with self._database_lock:
+            positions = self._positions.get(project_id, {})
+            for doc_id, row in self._documents.get(project_id, {}).items():
+                if limit is not None and len(out) >= limit:
+                    break
+                if positions[doc_id] <= after:
+                    continue
+                if labelled is not None and row['labelled'] != labelled:
+                    continue
+                if labelled_by is not None and labelled_by not in row['labelledBy']:
+                    continue
+                if max_ner_f1 is not None and not 0 <= row['aiStats'].get('ner_f1', -1) < max_ner_f1:
+                    continue
+                if max_rel_f1 is not None and not 0 <= row['aiStats'].get('rel_f1', -1) < max_rel_f1:
+                    continue
+                out.append((positions[doc_id], dict(row)))
+        return out
+
+    def select_document_ids(self, project_ids: list):
+        with self._database_lock:
+            return {project_id: list(self._documents.get(project_id, {})) for project_id in project_ids}
+
+    def clear(self):
+        with self._database_lock:
+            self._projects.clear()
+            self._documents.clear()
+            self._positions.clear()
+            self._tracking_table.clear()
+            self._max_tracking_ids.clear()
+
+
+# Recorder of the read model process application.
+def construct_read_model_recorder(app, tracking_table_name: str):
+    if isinstance(app.factory, SQLiteFactory):
+        recorder = SQLiteReadModelRecorder(app.factory.datastore, tracking_table_name)
+        if app.factory.env_create_table():
+            recorder.create_table()
+        return recorder
+
+    if isinstance(app.factory, POPOFactory):
+        return POPOReadModelRecorder()
+
+    raise NotImplementedError(f'No read model recorder for {type(app.factory).__name__}.')
@@ -11,11 +11,29 @@ def serialize_project(project):
         'creator': project.creator,
         'labelSetId': str(project.labelSetId),
         'relationSetId': str(project.relationSetId),
-        'documents': [str(doc_id) for doc_id in project.documents]
+        'documents': [str(doc_id) for doc_id in project.documents],
+        'documentCount': len(project.documents),
+        'labelledCount': sum(1 for record in project.documents.values() if record.labelled)
+    }
+
+
+# Serialize a project row of the read model, the same way as the aggregate.
+def serialize_project_row(row, doc_ids):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'date': row['date'],
+        'creator': row['creator'],
+        'labelSetId': row['labelSetId'],
+        'relationSetId': row['relationSetId'],
+        'documents': doc_ids,
+        'documentCount': row['documentCount'],
+        'labelledCount': row['labelledCount']
     }
 
 
 def serialize_document(document, doc_info, project):
+    record = project.documents[UUID(doc_info['doc_id'])]
     return {
         'id': str(doc_info['doc_id']),
         'projectId': str(doc_info['project_id']),
@@ -23,10 +41,11 @@ def serialize_document(document, doc_info, project):
         'entities': document.entities,
         'sentenceEntities': document.sentence_entities,
         'relations': document.relations,
-        'labelled': project.labelled[UUID(doc_info['doc_id'])],
-        'labelledBy': project.labelled_by[UUID(doc_info['doc_id'])],
+        'labelled': record.labelled,
+        'labelledBy': list(record.labelled_by),
         'recEntities': document.rec_entities,
         'recSentenceEntities': document.rec_sentence_entities,
         'recRelations': document.rec_relations,
-        'aiStats': project.ai_stats[UUID(doc_info['doc_id'])]
+        'aiStats': record.ai_stats,
+        'version': document.version
     }
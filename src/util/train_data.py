@@ -0,0 +1,54 @@
+import uuid
+
+from src.util import logwrapper
+
+
+# Collect the annotations of all labelled documents in the project as train data.
+# Uses one query on the doc register and loads the labelled documents in bulk,
+# so the number of round trips doesn't grow with the project.
+def build_train_data(event_service, doc_register, project_id: str, project):
+    labelled = [str(doc_id) for doc_id, record in project.documents.items() if record.labelled]
+
+    if len(labelled) == 0:
+        return []
+
+    results = doc_register.find({
+        'project_id': project_id,
+        'doc_id': {'$in': labelled}
+    }, {'_id': 1, 'doc_id': 1, 'user_id': 1})
+
+    # the annotations of the first user that labelled the document are used
+    register_ids = {}
+    for ele in results:
+        if ele['user_id'] == project.documents[uuid.UUID(ele['doc_id'])].labelled_by[0]:
+            register_ids[ele['doc_id']] = ele['_id']
+
+    train_ids = []
+    for doc_id in labelled:
+        if doc_id in register_ids:
+            train_ids.append(doc_id)
+        else:
+            logwrapper.warning(f'No registered document for labelled document {doc_id} in project {project_id}.')
+
+    train_docs = event_service.get_documents([register_ids[doc_id] for doc_id in train_ids])
+
+    return [{
+        'doc_id': doc_id,
+        'entities': lab_doc.entities,
+        'sentence_entities': lab_doc.sentence_entities,
+        'relations': lab_doc.relations
+    } for doc_id, lab_doc in zip(train_ids, train_docs)]
+
+
+# Build the train request for a project with its current state.
+def build_train_request(event_service, doc_register, type_cache, project_id: str):
+    project = event_service.get_project(project_id)
+
+    train_data = build_train_data(event_service, doc_register, project_id, project)
+
+    return {
+        'project_id': str(project_id),
+        'train_data': train_data,
+        'entity_types': list(type_cache.get_label_types(str(project.labelSetId))),
+        'relation_types': list(type_cache.get_relation_types(str(project.relationSetId)))
+    }
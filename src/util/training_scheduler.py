@@ -0,0 +1,126 @@
+import time
+
+from threading import Condition, Lock, Thread
+
+from src.util import logwrapper
+
+
+class _ProjectState:
+    __slots__ = ('build', 'due', 'in_flight')
+
+    def __init__(self):
+        self.build = None
+        self.due = None
+        self.in_flight = False
+
+
+# Coalesces training triggers per project.
+# All triggers of a project within `window` seconds result in one train request,
+# which is built when it is sent, so it contains the latest state of the project.
+# There is at most one train request per project in flight, triggers arriving
+# meanwhile are sent after it finished.
+class TrainingScheduler:
+
+    def __init__(self, dispatcher, window: float):
+        self._dispatcher = dispatcher
+        self._window = window
+
+        self._projects = {}
+        self._condition = Condition(Lock())
+        self._stopped = False
+
+        self._enqueued = 0
+        self._coalesced = 0
+        self._sent = 0
+        self._failed = 0
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Trigger training of a project. build returns the train request.
+    def schedule(self, project_id: str, build):
+        with self._condition:
+            self._enqueued += 1
+
+            state = self._projects.setdefault(project_id, _ProjectState())
+            state.build = build
+            if state.due is None:
+                state.due = time.monotonic() + self._window
+            else:
+                self._coalesced += 1
+
+            self._condition.notify()
+
+    def shutdown(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'enqueued': self._enqueued,
+                'sent': self._sent,
+                'failed': self._failed,
+                'coalesced': self._coalesced,
+                'pending': sum(1 for state in self._projects.values() if state.due is not None),
+                'inFlight': sum(1 for state in self._projects.values() if state.in_flight)
+            }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                ready = self._wait_for_ready()
+                if ready is None:
+                    return
+
+                project_id, state = ready
+                build = state.build
+                state.build = None
+                state.due = None
+                state.in_flight = True
+
+            self._send(project_id, build)
+
+    # Wait for a project that is due and has no train request in flight.
+    def _wait_for_ready(self):
+        while not self._stopped:
+            now = time.monotonic()
+            timeout = None
+
+            for project_id, state in self._projects.items():
+                if state.due is None or state.in_flight:
+                    continue
+                if state.due <= now:
+                    return project_id, state
+                timeout = state.due - now if timeout is None else min(timeout, state.due - now)
+
+            self._condition.wait(timeout)
+
+        return None
+
+    def _send(self, project_id, build):
+        try:
+            req = build()
+            queued = self._dispatcher.send_ai_training_request(req, on_done=lambda res: self._done(project_id, res))
+        except Exception as e:
+            logwrapper.error(f'Building train request for project {project_id} failed: {e}')
+            queued = False
+
+        if not queued:
+            self._done(project_id, None)
+
+    def _done(self, project_id, response):
+        with self._condition:
+            if response is not None:
+                self._sent += 1
+            else:
+                self._failed += 1
+
+            state = self._projects[project_id]
+            state.in_flight = False
+            if state.due is None:
+                del self._projects[project_id]
+
+            self._condition.notify()
@@ -0,0 +1,61 @@
+from threading import Lock
+
+
+# Read through cache of the entity and relation type lists of the label and relation sets.
+# Sets are not changed after they are created, so cached lists stay valid.
+# Entries are dropped when a set with the same id is inserted.
+class TypeCache:
+
+    def __init__(self, anno_db):
+        self._label_set_col = anno_db['label_sets']
+        self._relation_set_col = anno_db['relation_sets']
+        self._label_types = {}
+        self._relation_types = {}
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, types, col, field, set_id: str):
+        with self._lock:
+            cached = types.get(set_id)
+            if cached is not None:
+                self.hits += 1
+                return cached
+
+        result = col.find_one({'_id': set_id}, {field: 1})
+        if not result:
+            raise KeyError(f'No {col.name} entry with id {set_id} exists.')
+
+        # tuples, so callers can't change the cached lists
+        type_list = tuple(ele['type'] for ele in result[field])
+
+        with self._lock:
+            self.misses += 1
+            types[set_id] = type_list
+        return type_list
+
+    # Entity types of a label set.
+    def get_label_types(self, set_id: str):
+        return self._get(self._label_types, self._label_set_col, 'labels', set_id)
+
+    # Relation types of a relation set.
+    def get_relation_types(self, set_id: str):
+        return self._get(self._relation_types, self._relation_set_col, 'relationTypes', set_id)
+
+    def invalidate_label_set(self, set_id: str):
+        with self._lock:
+            self._label_types.pop(set_id, None)
+
+    def invalidate_relation_set(self, set_id: str):
+        with self._lock:
+            self._relation_types.pop(set_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'labelSets': len(self._label_types),
+                'relationSets': len(self._relation_types)
+            }